@@ -6,6 +6,7 @@ DATA_DIR = os.path.join(BASE_DIR, 'data')
 DOWNLOAD_DIR = os.path.join(DATA_DIR, 'downloads')
 LOG_DIR = os.path.join(DATA_DIR, 'logs')
 DB_DIR = os.path.join(DATA_DIR, 'db')
+FRONTIER_DIR = os.path.join(DATA_DIR, 'frontier')
 
 # Ensure directories exist
 os.makedirs(DOWNLOAD_DIR, exist_ok=True)
@@ -16,24 +17,115 @@ os.makedirs(DB_DIR, exist_ok=True)
 TOR_SOCKS_PORT = 9050
 TOR_CONTROL_PORT = 9051
 TOR_PASSWORD = None  # Set if using hashed password
+TOR_INSTANCES = 1              # Tor processes to run; >1 spreads traffic across them
+TOR_PORT_STRIDE = 10           # port offset between consecutive Tor instances
+TOR_ISOLATE_STREAMS = False    # give each session its own circuit via SOCKS auth
+TOR_CIRCUITS_PER_INSTANCE = 4  # isolated circuits per instance when isolating
+TOR_RENEW_TIMEOUT = 60         # seconds renew_identity(wait=True) waits for fresh circuits
 
 # Crawler settings
 DEFAULT_RENDERING_ENGINE = 'playwright'  # 'playwright', 'selenium', 'requests'
 REQUEST_TIMEOUT = 10
 MAX_RETRIES = 3
 CRAWL_DELAY = 1  # seconds between requests to same domain
+MAX_CONCURRENT_REQUESTS = 32  # pages in flight at once for crawl_many
+MAX_CONCURRENT_PER_HOST = 4   # pages in flight per host for crawl_many
+RETRY_BACKOFF_BASE = 1        # seconds; first retry waits about this long
+RETRY_BACKOFF_MAX = 60        # seconds; cap on the exponential backoff
+AUTOTHROTTLE_MIN_DELAY = CRAWL_DELAY  # lower bound for the adaptive per-host delay; CRAWL_DELAY is always honoured
+AUTOTHROTTLE_MAX_DELAY = 60   # upper bound for the adaptive per-host delay
+AUTOTHROTTLE_TARGET_CONCURRENCY = 2.0  # average requests in flight to aim for per host
+
+# robots.txt cache
+ROBOTS_CACHE_SIZE = 10000     # hosts kept in memory (LRU)
+ROBOTS_CACHE_TTL = 24 * 3600  # seconds a fetched robots.txt stays fresh
+ROBOTS_ERROR_TTL = 600        # seconds before retrying a host whose robots.txt failed
+ROBOTS_CACHE_FILE = None      # set to a path to persist the cache across runs
+PARSE_PROCESSES = 0           # worker processes for HTML parsing; 0 parses in the crawling thread
+PARSE_BATCH_SIZE = 8          # pages sent to a parse worker at once
+PARSE_FLUSH_INTERVAL = 0.05   # seconds before a partial batch is sent anyway
+PARSE_MAX_BACKLOG = 256       # pages queued for parsing before fetchers block
+
+# HTTP cache (conditional re-fetches)
+HTTP_CACHE_ENABLED = True
+HTTP_CACHE_FILE = os.path.join(DATA_DIR, 'http_cache.db')
+HTTP_CACHE_MAX_BYTES = 512 * 1024 * 1024  # compressed bodies kept before LRU eviction
+HTTP_CACHE_ACCESS_BATCH = 256             # cache hits whose access times are written at once
+
+# Browser pools
+PLAYWRIGHT_POOL_SIZE = 2            # long-lived Chromium instances
+BROWSER_MAX_PAGES_PER_CONTEXT = 50  # recycle a context after this many pages
+BROWSER_MAX_MEMORY_MB = 512         # recycle a context once a page's JS heap exceeds this
+SELENIUM_POOL_SIZE = 2              # warm headless Chrome drivers
+SELENIUM_READY_TIMEOUT = 10         # max seconds to wait for a page to settle
+SELENIUM_DOM_STABLE_INTERVAL = 0.25 # DOM is stable once unchanged across one interval
+
+# Recursive crawl
+CRAWL_JOB_WORKERS = 8              # pages crawled in parallel by a CrawlJob
+FRONTIER_MAX_DEPTH = 3             # links deeper than this are not followed
+FRONTIER_MEMORY_LIMIT = 100000     # URLs held in memory before spilling to disk
+FRONTIER_BLOOM_CAPACITY = 10000000 # most URLs the seen filter is sized for (about 12 MB); past it the disk index does more work
+FRONTIER_BLOOM_INITIAL = 100000    # starting size of the seen filter when the crawl size is unknown; it doubles as needed
+FRONTIER_URLS_PER_PAGE = 20        # distinct new URLs expected per crawled page, for sizing from max_pages
+CRAWL_CHECKPOINT_INTERVAL = 30     # seconds between CrawlJob checkpoints when checkpointing
 
 # Proxy pool
 PROXY_TEST_URL = 'http://httpbin.org/ip'
 PROXY_TEST_TIMEOUT = 5
 PROXY_REFRESH_INTERVAL = 300  # seconds
+PROXY_VALIDATION_CONCURRENCY = 200  # candidates checked at once
+PROXY_RECHECK_INTERVAL = 600  # seconds between revalidations of active proxies
+PROXY_STORE_FILE = os.path.join(DATA_DIR, 'proxies.json')  # warm-start store; None disables
+PROXY_STORE_TTL = 6 * 3600    # stored proxies older than this are not loaded
+PROXY_STORE_INTERVAL = 60     # seconds between store writes
+PROXY_LATENCY_EWMA = 0.3      # weight of the newest latency sample
+PROXY_QUARANTINE_STREAK = 3   # consecutive failures before a proxy is benched
+PROXY_QUARANTINE_TIME = 600   # seconds before a benched proxy is revalidated
+PROXY_EVICT_FAILS = 10        # benched proxies with this many failures (and more failures than successes) are dropped
 
 # Database
 DATABASE_URL = f'sqlite:///{os.path.join(DB_DIR, "spider.db")}'
+DB_BATCH_SIZE = 500           # rows written per transaction by the background writer
+DB_FLUSH_INTERVAL = 0.2       # seconds a partial batch waits before it is written
+DB_WRITE_QUEUE_SIZE = 10000   # queued writes before callers block
+CONTENT_ZLIB_LEVEL = 6        # page body compression when zstandard is not installed
+CONTENT_ZSTD_LEVEL = 10       # page body compression with zstandard
+NEAR_DUP_MODE = 'flag'        # 'flag', 'skip' or 'off' for pages whose text nearly matches another URL's
+NEAR_DUP_DISTANCE = 3         # max SimHash bit difference that counts as a near-duplicate
+NEAR_DUP_EXPAND_LINKS = True  # follow outlinks of near-duplicate pages in recursive crawls
+RESULT_SINK_MAX_PENDING = 1000   # worker results buffered before workers block
+RESULT_SINK_BATCH_SIZE = 100     # results stored per database flush
+RESULT_SINK_FLUSH_INTERVAL = 0.5 # seconds a partial batch waits before it is stored
+
+# Downloads
+DOWNLOAD_MIN_CHUNK = 256 * 1024         # smallest Range request; smaller files use one stream
+DOWNLOAD_MAX_CHUNK = 16 * 1024 * 1024   # largest Range request
+DOWNLOAD_TARGET_CHUNK_SECONDS = 2.0     # chunk size tracks throughput so a request takes about this long
+MEDIA_DOWNLOAD_WORKERS = 8              # media files downloaded at once
+MEDIA_DOWNLOAD_PER_HOST = 4             # media files downloaded at once from one host
+MEDIA_BANDWIDTH_LIMIT = 0               # bytes/sec across all media downloads, 0 = unlimited
+MEDIA_PROGRESS_INTERVAL = 0.25          # min seconds between progress events per file
 
 # RabbitMQ
 RABBITMQ_HOST = 'localhost'
 RABBITMQ_QUEUE = 'crawl_tasks'
+RABBITMQ_MAX_PRIORITY = 10        # x-max-priority of the task queue
+RABBITMQ_PUBLISH_BATCH = 500      # messages per transaction in add_tasks()
+RABBITMQ_WORKER_CONCURRENCY = 8   # tasks a worker runs at once (also its prefetch)
+
+# Local (broker-less) scheduler
+SCHEDULER_BACKEND = 'rabbitmq'    # 'rabbitmq' or 'local'
+LOCAL_QUEUE_FILE = os.path.join(DATA_DIR, 'queue.db')
+LOCAL_WORKER_PROCESSES = 0        # worker processes; 0 uses one per CPU
+LOCAL_LEASE_TIME = 300            # seconds without a renewal before a task is handed to another worker
+LOCAL_LEASE_RENEW_INTERVAL = 60   # seconds between renewals of a lease still being worked on
+LOCAL_MAX_ATTEMPTS = 5            # deliveries before a task is parked as dead
+LOCAL_POLL_INTERVAL = 0.5         # seconds an idle worker waits before polling again
+
+# Metrics
+METRICS_PORT = 9464               # local /metrics and /metrics.json endpoint; 0 disables it
+METRICS_FILE = os.path.join(LOG_DIR, 'metrics.prom')  # '.json' suffix writes JSON instead; '' disables it
+METRICS_WRITE_INTERVAL = 15       # seconds between metrics file writes
 
 # Logging
 LOG_LEVEL = 'INFO'
@@ -3,7 +3,11 @@ from .crawler_engine import DynamicCrawler
 from .proxy_pool import ProxyPool
 from .downloader import ResumableDownloader
 from .scheduler import DistributedScheduler
+from .local_scheduler import LocalScheduler, create_scheduler
 from .robots_checker import RobotsChecker
+from .async_engine import AsyncCrawlEngine
+from .frontier import URLFrontier
+from .crawl_job import CrawlJob
 
 __all__ = [
     'TorManager',
@@ -11,5 +15,10 @@ __all__ = [
     'ProxyPool',
     'ResumableDownloader',
     'DistributedScheduler',
-    'RobotsChecker'
+    'LocalScheduler',
+    'create_scheduler',
+    'RobotsChecker',
+    'AsyncCrawlEngine',
+    'URLFrontier',
+    'CrawlJob'
 ]
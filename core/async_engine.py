@@ -0,0 +1,165 @@
+import asyncio
+import time
+from collections import defaultdict
+from typing import Optional, Dict, Any, List, Callable
+from urllib.parse import urlparse
+
+import aiohttp
+from tenacity import AsyncRetrying, stop_after_attempt, wait_exponential_jitter, retry_if_exception_type
+
+from config import settings
+from core.throttle import get_throttle, parse_retry_after, RetryableResponse, RETRY_STATUSES
+from core.http_cache import HTTPCache, get_http_cache
+from utils.user_agent import get_random_ua
+from utils.logger import get_logger
+from utils.metrics import timer, route_label, STAGE_SECONDS, REQUESTS_TOTAL
+
+logger = get_logger(__name__)
+
+def _trace_config() -> aiohttp.TraceConfig:
+    """Time DNS resolution and connection setup into the stage histogram."""
+    trace = aiohttp.TraceConfig()
+
+    def stage_timer(stage: str):
+        async def on_start(session, ctx, params):
+            setattr(ctx, stage, time.perf_counter())
+
+        async def on_end(session, ctx, params):
+            started = getattr(ctx, stage, None)
+            if started is not None:
+                STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage, engine='aiohttp')
+        return on_start, on_end
+
+    dns_start, dns_end = stage_timer('dns')
+    trace.on_dns_resolvehost_start.append(dns_start)
+    trace.on_dns_resolvehost_end.append(dns_end)
+    connect_start, connect_end = stage_timer('connect')
+    trace.on_connection_create_start.append(connect_start)
+    trace.on_connection_create_end.append(connect_end)
+    return trace
+
+class AsyncCrawlEngine:
+    """
+    aiohttp-based fetcher that keeps many pages in flight at once.
+    Concurrency is capped globally and per host; each page is parsed with
+    the same parser DynamicCrawler uses, so results have the same shape.
+    """
+
+    def __init__(self, parser: Callable[[str, str], Dict[str, Any]], proxy_pool=None,
+                 robots_checker=None, max_concurrency: int = None, per_host: int = None, throttle=None,
+                 parse_pool=None, http_cache: HTTPCache = None):
+        self.parser = parser
+        self.parse_pool = parse_pool
+        self.http_cache = http_cache or get_http_cache()
+        self.proxy_pool = proxy_pool
+        self.robots_checker = robots_checker
+        self.throttle = throttle or get_throttle()
+        self.max_concurrency = max_concurrency or settings.MAX_CONCURRENT_REQUESTS
+        self.per_host = per_host or settings.MAX_CONCURRENT_PER_HOST
+
+    def crawl_many(self, urls: List[str], force: bool = False) -> Dict[str, Any]:
+        """
+        Crawl all urls and return {url: result}.
+        Each result is what DynamicCrawler.crawl() would return for that url.
+        """
+        return asyncio.run(self.crawl_many_async(urls, force=force))
+
+    async def crawl_many_async(self, urls: List[str], force: bool = False) -> Dict[str, Any]:
+        urls = list(dict.fromkeys(urls))  # drop duplicates, keep order
+        global_sem = asyncio.Semaphore(self.max_concurrency)
+        host_sems = defaultdict(lambda: asyncio.Semaphore(self.per_host))
+        timeout = aiohttp.ClientTimeout(total=settings.REQUEST_TIMEOUT)
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency, limit_per_host=self.per_host)
+
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector,
+                                         trace_configs=[_trace_config()]) as session:
+            async def bounded(url):
+                host = urlparse(url).netloc
+                async with host_sems[host]:
+                    return await self._crawl_one(session, global_sem, url, force)
+
+            results = await asyncio.gather(*(bounded(u) for u in urls))
+        return dict(zip(urls, results))
+
+    async def _crawl_one(self, session: aiohttp.ClientSession, global_sem: asyncio.Semaphore,
+                         url: str, force: bool):
+        loop = asyncio.get_running_loop()
+        if not force and self.robots_checker:
+            with timer('robots', engine='aiohttp'):
+                allowed = await loop.run_in_executor(None, self.robots_checker.check, url, '*')
+            if not allowed:
+                logger.info(f"robots.txt blocks {url}")
+                return 'robots_blocked'
+
+        html = await self._fetch(session, global_sem, url)
+        if html is None:
+            return None
+        # Parsing is CPU-bound; keep it off the event loop
+        if self.parse_pool:
+            # submit() may block on the pool's backlog, so call it from a thread
+            future = await loop.run_in_executor(None, self.parse_pool.submit, html, url)
+            return await asyncio.wrap_future(future)
+        with timer('parse', engine='inline'):
+            return await loop.run_in_executor(None, self.parser, html, url)
+
+    async def _fetch(self, session: aiohttp.ClientSession, global_sem: asyncio.Semaphore,
+                     url: str) -> Optional[str]:
+        retrying = AsyncRetrying(
+            stop=stop_after_attempt(settings.MAX_RETRIES + 1),
+            wait=wait_exponential_jitter(initial=settings.RETRY_BACKOFF_BASE, max=settings.RETRY_BACKOFF_MAX),
+            retry=retry_if_exception_type(
+                (aiohttp.ClientConnectionError, asyncio.TimeoutError, RetryableResponse)
+            ),
+            reraise=True
+        )
+        try:
+            return await retrying(self._fetch_once, session, global_sem, url)
+        except (aiohttp.ClientError, asyncio.TimeoutError, RetryableResponse) as e:
+            logger.error(f"Request failed for {url}: {e}")
+            return None
+
+    async def _fetch_once(self, session: aiohttp.ClientSession, global_sem: asyncio.Semaphore,
+                          url: str) -> str:
+        """
+        One throttled GET. Raises RetryableResponse for 429/5xx.
+        A cached page is revalidated and its body reused on 304.
+        """
+        loop = asyncio.get_running_loop()
+        # The cache decompresses and commits to SQLite; keep that off the event loop
+        cached = await loop.run_in_executor(None, self.http_cache.get, url) if self.http_cache else None
+        headers = {'User-Agent': get_random_ua()}
+        headers.update(HTTPCache.conditional_headers(cached))
+        proxy = self.proxy_pool.get_proxy() if self.proxy_pool else None
+        # Wait out the host's politeness delay before taking a global slot
+        await self.throttle.acquire_async(url)
+        start = time.monotonic()
+        status = retry_after = None
+        try:
+            async with global_sem:
+                async with session.get(url, headers=headers,
+                                       proxy=f'http://{proxy}' if proxy else None) as resp:
+                    status = resp.status
+                    retry_after = parse_retry_after(resp.headers.get('Retry-After'))
+                    if proxy:
+                        # Any HTTP response means the proxy itself did its job
+                        self.proxy_pool.report(proxy, status != 407, time.monotonic() - start)
+                    if status in RETRY_STATUSES:
+                        raise RetryableResponse(url, status, retry_after)
+                    if status == 304 and cached:
+                        await loop.run_in_executor(None, self.http_cache.refresh, url, resp.headers)
+                        return cached['body']
+                    resp.raise_for_status()
+                    text = await resp.text(errors='replace')
+                    if self.http_cache:
+                        await loop.run_in_executor(None, self.http_cache.store, url, text, resp.headers)
+                    return text
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if proxy and status is None:
+                self.proxy_pool.report(proxy, False)
+            raise
+        finally:
+            elapsed = time.monotonic() - start
+            self.throttle.release(url, latency=elapsed, status=status, retry_after=retry_after)
+            route = route_label(proxy)
+            STAGE_SECONDS.observe(elapsed, stage='fetch', engine='aiohttp', route=route)
+            REQUESTS_TOTAL.inc(engine='aiohttp', route=route, status=status or 'error')
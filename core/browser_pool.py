@@ -0,0 +1,316 @@
+import atexit
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from queue import Queue, Empty
+from typing import Optional, Callable, Dict, Any
+
+from playwright.sync_api import sync_playwright
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.support.ui import WebDriverWait
+from webdriver_manager.chrome import ChromeDriverManager
+
+from config import settings
+from utils.user_agent import get_random_ua
+from utils.fingerprint import randomize_fingerprint
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+_STOP = object()
+
+class _PlaywrightWorker(threading.Thread):
+    """
+    Owns one Playwright instance, one Chromium browser and the context it
+    currently leases out. The sync API is bound to the thread that started
+    it, so all page work for this browser happens on this thread.
+    """
+
+    def __init__(self, pool: 'PlaywrightPool', index: int):
+        super().__init__(name=f'playwright-{index}', daemon=True)
+        self.pool = pool
+        self.playwright = None
+        self.browser = None
+        self.context = None
+        self.pages_served = 0
+
+    def run(self):
+        try:
+            while True:
+                job = self.pool.jobs.get()
+                if job is _STOP:
+                    break
+                url, future = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(self._render(url))
+                except Exception as e:
+                    # A failed page may leave the context wedged; start fresh
+                    self._close_context()
+                    future.set_exception(e)
+        finally:
+            self._close_browser()
+
+    def _ensure_context(self):
+        if self.browser is None or not self.browser.is_connected():
+            self._close_browser()
+            self.playwright = sync_playwright().start()
+            self.browser = self.playwright.chromium.launch(headless=True)
+        if self.context is None:
+            self.context = self.browser.new_context(
+                user_agent=get_random_ua(),
+                viewport=randomize_fingerprint()['viewport'],
+                device_scale_factor=1,
+                has_touch=False,
+                is_mobile=False
+            )
+            self.pages_served = 0
+        return self.context
+
+    def _render(self, url: str) -> str:
+        context = self._ensure_context()
+        page = context.new_page()
+        try:
+            page.goto(url, wait_until='networkidle')
+            html = page.content()
+            heap = page.evaluate('() => performance.memory ? performance.memory.usedJSHeapSize : 0')
+        finally:
+            page.close()
+
+        self.pages_served += 1
+        if self.pages_served >= self.pool.max_pages_per_context:
+            self._close_context()
+        elif heap > self.pool.max_memory_mb * 1024 * 1024:
+            logger.debug(f"Recycling Playwright context after {heap} bytes of JS heap")
+            self._close_context()
+        return html
+
+    def _close_context(self):
+        if self.context is not None:
+            try:
+                self.context.close()
+            except Exception:
+                pass
+            self.context = None
+
+    def _close_browser(self):
+        self._close_context()
+        if self.browser is not None:
+            try:
+                self.browser.close()
+            except Exception:
+                pass
+            self.browser = None
+        if self.playwright is not None:
+            try:
+                self.playwright.stop()
+            except Exception:
+                pass
+            self.playwright = None
+
+class PlaywrightPool:
+    """
+    Long-lived set of Chromium browsers shared by all crawls in the process.
+    Each browser keeps a context that is reused across pages and recycled
+    after max_pages_per_context pages or once a page's JS heap passes
+    max_memory_mb.
+    """
+
+    def __init__(self, size: int = None, max_pages_per_context: int = None, max_memory_mb: int = None):
+        self.size = size or settings.PLAYWRIGHT_POOL_SIZE
+        self.max_pages_per_context = max_pages_per_context or settings.BROWSER_MAX_PAGES_PER_CONTEXT
+        self.max_memory_mb = max_memory_mb or settings.BROWSER_MAX_MEMORY_MB
+        self.jobs = Queue()
+        self.closed = False
+        self.lock = threading.Lock()  # orders render() submissions against shutdown()
+        self.workers = [_PlaywrightWorker(self, i) for i in range(self.size)]
+        for worker in self.workers:
+            worker.start()
+
+    def render(self, url: str, timeout: float = None) -> Optional[str]:
+        """Render url on a pooled browser and return the page HTML."""
+        future = Future()
+        with self.lock:
+            if self.closed:
+                raise RuntimeError('PlaywrightPool is shut down')
+            self.jobs.put((url, future))
+        return future.result(timeout=timeout)
+
+    def shutdown(self):
+        """Close every context and browser, waiting for pages in progress."""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            # Queued after every accepted job, so those still get rendered
+            for _ in self.workers:
+                self.jobs.put(_STOP)
+        for worker in self.workers:
+            worker.join()
+        logger.info("Playwright pool shut down.")
+
+_playwright_pool = None
+_pool_lock = threading.Lock()
+
+def get_playwright_pool() -> PlaywrightPool:
+    """Return the process-wide Playwright pool, starting it on first use."""
+    global _playwright_pool
+    with _pool_lock:
+        if _playwright_pool is None:
+            _playwright_pool = PlaywrightPool()
+            atexit.register(_playwright_pool.shutdown)
+        return _playwright_pool
+
+
+_chromedriver_path = None
+_chromedriver_lock = threading.Lock()
+
+def get_chromedriver_path() -> str:
+    """Resolve the chromedriver binary once per process."""
+    global _chromedriver_path
+    with _chromedriver_lock:
+        if _chromedriver_path is None:
+            _chromedriver_path = ChromeDriverManager().install()
+        return _chromedriver_path
+
+def wait_for_dom_stable(driver, timeout: float = None, interval: float = None):
+    """
+    Block until the document has loaded and its markup stops changing
+    between two polls, or until timeout expires. Pages that never finish
+    loading (a hung subresource) are not an error: the caller gets the DOM
+    as it is at the deadline.
+    """
+    timeout = timeout or settings.SELENIUM_READY_TIMEOUT
+    interval = interval or settings.SELENIUM_DOM_STABLE_INTERVAL
+    deadline = time.monotonic() + timeout
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=interval).until(
+            lambda d: d.execute_script('return document.readyState') == 'complete'
+        )
+    except TimeoutException:
+        logger.debug(f"Page did not finish loading within {timeout}s; using the current DOM")
+        return
+    last_size = None
+    while time.monotonic() < deadline:
+        size = driver.execute_script('return document.documentElement.innerHTML.length')
+        if size == last_size:
+            return
+        last_size = size
+        time.sleep(interval)
+
+class _PooledDriver:
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages_served = 0
+
+    def is_healthy(self) -> bool:
+        try:
+            return self.driver.execute_script('return 1') == 1
+        except Exception:
+            return False
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception:
+            pass
+
+class SeleniumPool:
+    """
+    Warm headless Chrome drivers that crawls lease and return.
+    Drivers are health-checked on lease and replaced after
+    max_pages_per_driver pages. A driver's proxy is chosen when it is
+    created, so proxies rotate as drivers are recycled.
+    """
+
+    def __init__(self, size: int = None, max_pages_per_driver: int = None,
+                 proxy_provider: Callable[[], Optional[str]] = None):
+        self.size = size or settings.SELENIUM_POOL_SIZE
+        self.max_pages_per_driver = max_pages_per_driver or settings.BROWSER_MAX_PAGES_PER_CONTEXT
+        self.proxy_provider = proxy_provider
+        self.idle = Queue()
+        self.slots = threading.BoundedSemaphore(self.size)
+        self.closed = False
+
+    def _create_driver(self) -> _PooledDriver:
+        options = Options()
+        options.add_argument('--headless')
+        options.add_argument('--no-sandbox')
+        options.add_argument('--disable-dev-shm-usage')
+        options.add_argument(f'user-agent={get_random_ua()}')
+        # Anti-detection
+        options.add_experimental_option('excludeSwitches', ['enable-automation'])
+        options.add_experimental_option('useAutomationExtension', False)
+
+        proxy = self.proxy_provider() if self.proxy_provider else None
+        if proxy:
+            options.add_argument(f'--proxy-server={proxy}')
+
+        driver = webdriver.Chrome(service=Service(get_chromedriver_path()), options=options)
+        driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {
+            'source': 'Object.defineProperty(navigator, "webdriver", {get: () => undefined})'
+        })
+        return _PooledDriver(driver)
+
+    @contextmanager
+    def lease(self):
+        """Yield a healthy driver and return it to the pool afterwards."""
+        self.slots.acquire()
+        pooled = None
+        try:
+            while pooled is None:
+                try:
+                    candidate = self.idle.get_nowait()
+                except Empty:
+                    pooled = self._create_driver()
+                    break
+                if candidate.is_healthy():
+                    pooled = candidate
+                else:
+                    candidate.quit()
+            try:
+                yield pooled.driver
+            except Exception:
+                pooled.quit()
+                pooled = None
+                raise
+            pooled.pages_served += 1
+            if self.closed or pooled.pages_served >= self.max_pages_per_driver:
+                pooled.quit()
+            else:
+                self.idle.put(pooled)
+        finally:
+            self.slots.release()
+
+    def render(self, url: str) -> str:
+        """Load url on a pooled driver and return the HTML once the DOM settles."""
+        with self.lease() as driver:
+            driver.get(url)
+            wait_for_dom_stable(driver)
+            return driver.page_source
+
+    def shutdown(self):
+        """Quit idle drivers; leased ones are quit when they are returned."""
+        self.closed = True
+        while True:
+            try:
+                self.idle.get_nowait().quit()
+            except Empty:
+                break
+
+_selenium_pools: Dict[Any, SeleniumPool] = {}
+
+def get_selenium_pool(proxy_pool=None) -> SeleniumPool:
+    """Return the process-wide Selenium pool for a proxy pool (or direct)."""
+    with _pool_lock:
+        pool = _selenium_pools.get(proxy_pool)
+        if pool is None:
+            pool = SeleniumPool(proxy_provider=proxy_pool.get_proxy if proxy_pool else None)
+            _selenium_pools[proxy_pool] = pool
+            atexit.register(pool.shutdown)
+        return pool
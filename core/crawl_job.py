@@ -0,0 +1,204 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import List, Optional, Dict, Any, Tuple
+from urllib.parse import urlparse
+
+from config import settings
+from core.frontier import URLFrontier
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class CrawlJob:
+    """
+    Recursive crawl driven by a URLFrontier.
+    Every URL goes through DynamicCrawler.crawl_deferred() and gets a row in the
+    tasks table; extracted links are fed back into the frontier.
+    With a checkpoint_file the job saves its state every checkpoint_interval
+    seconds: the frontier (queue, seen URLs and pages in flight), the page
+    count and the learned per-host throttle. Running a job again with the
+    same checkpoint_file (and frontier_path, if one was given) resumes where
+    the last checkpoint left off; pages finished before it are not fetched
+    again, and pages that were in flight reuse their tasks rows.
+    Otherwise every run() starts from an empty frontier, which without a
+    frontier_path is a temporary file removed when run() returns.
+    """
+
+    def __init__(self, crawler, db, seeds: List[str], max_depth: int = None,
+                 allowed_domains: List[str] = None, same_domain: bool = True,
+                 max_pages: int = None, workers: int = None, frontier_path: str = None,
+                 force: bool = False, dynamic: bool = None, priority: int = 5,
+                 checkpoint_file: str = None, checkpoint_interval: float = None):
+        self.crawler = crawler
+        self.db = db
+        self.seeds = seeds
+        self.max_pages = max_pages
+        self.workers = workers or settings.CRAWL_JOB_WORKERS
+        self.force = force
+        self.dynamic = dynamic
+        self.priority = priority
+        if allowed_domains is None and same_domain:
+            allowed_domains = [urlparse(url).hostname for url in seeds]
+        self.checkpoint_file = checkpoint_file
+        self.checkpoint_interval = checkpoint_interval or settings.CRAWL_CHECKPOINT_INTERVAL
+        resuming = bool(checkpoint_file) and os.path.exists(checkpoint_file)
+        if checkpoint_file and frontier_path is None:
+            frontier_path = f"{checkpoint_file}.frontier.db"
+        self._frontier_args = {
+            'path': frontier_path,
+            'max_depth': max_depth,
+            'allowed_domains': allowed_domains,
+            'autocommit': checkpoint_file is None,
+            'expected_urls': max_pages * settings.FRONTIER_URLS_PER_PAGE if max_pages else None
+        }
+        # Seen URLs are only carried over when resuming a checkpoint
+        self.frontier = URLFrontier(fresh=not resuming, **self._frontier_args)
+        self.pages_crawled = 0
+        self.resumed_tasks: Dict[str, int] = {}  # url -> tasks row of a page in flight at the last checkpoint
+        self.running = False
+        if checkpoint_file:
+            self._load_checkpoint()
+
+    def stop(self):
+        """Ask run() to stop after the pages in flight."""
+        self.running = False
+
+    def run(self):
+        """Crawl until the frontier is empty, max_pages is reached or stop() is called."""
+        self.running = True
+        if self.frontier.closed:
+            self.frontier = URLFrontier(fresh=True, **self._frontier_args)
+        self.frontier.add_many(self.seeds, depth=0, priority=self.priority)
+        fetching = {}  # fetch future -> (task_id, url, depth)
+        parsing = {}   # parse future -> (task_id, url, depth)
+        last_checkpoint = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while self.running:
+                while len(fetching) < self.workers and not self._page_budget_spent(len(fetching) + len(parsing)):
+                    item = self.frontier.pop()
+                    if item is None:
+                        break
+                    url, depth = item
+                    task_id = self.resumed_tasks.pop(url, None) or self.db.add_task(url, self.priority)
+                    fetching[executor.submit(self._fetch, task_id, url)] = (task_id, url, depth)
+                if not fetching and not parsing:
+                    break
+                if self.checkpoint_file and time.monotonic() - last_checkpoint >= self.checkpoint_interval:
+                    self.checkpoint(list(fetching.values()) + list(parsing.values()))
+                    last_checkpoint = time.monotonic()
+                done, _ = wait(list(fetching) + list(parsing), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in fetching:
+                        task_id, url, depth = fetching.pop(future)
+                        try:
+                            parsed = future.result()
+                        except Exception as e:
+                            logger.error(f"Crawl job failed on {url}: {e}")
+                            self.pages_crawled += 1
+                            continue
+                        # Fetch workers move on while the page is parsed
+                        parsing[parsed] = (task_id, url, depth)
+                    else:
+                        self._complete(future, *parsing.pop(future))
+            # Let pages already in flight finish; their links are queued so a resumed job follows them
+            for future in wait(fetching).done:
+                try:
+                    parsed = future.result()
+                except Exception as e:
+                    logger.error(f"Crawl job failed on {fetching[future][1]}: {e}")
+                    self.pages_crawled += 1
+                    continue
+                parsing[parsed] = fetching[future]
+            for future, (task_id, url, depth) in parsing.items():
+                wait([future])
+                self._complete(future, task_id, url, depth)
+        self.running = False
+        if self.checkpoint_file:
+            self.checkpoint()
+        else:
+            self.frontier.close()  # nothing to resume; the next run() starts afresh
+        logger.info(f"Crawl job finished: {self.pages_crawled} pages")
+
+    def _page_budget_spent(self, in_flight: int) -> bool:
+        return self.max_pages is not None and self.pages_crawled + in_flight >= self.max_pages
+
+    def _fetch(self, task_id: int, url: str) -> Future:
+        """Mark the task running and fetch url; returns the parse future."""
+        self.db.update_task_status(task_id, 'running')
+        try:
+            return self.crawler.crawl_deferred(url, force=self.force, dynamic=self.dynamic)
+        except Exception as e:
+            self.db.update_task_status(task_id, 'failed', str(e))
+            raise
+
+    def _complete(self, parsed: Future, task_id: int, url: str, depth: int):
+        """Count a parsed page, store it and queue its links."""
+        self.pages_crawled += 1
+        links = self._finish(task_id, url, parsed)
+        if links:
+            self.frontier.add_many(links, depth=depth + 1, priority=self.priority - depth - 1)
+
+    def _finish(self, task_id: int, url: str, parsed: Future) -> Optional[List[str]]:
+        """Store a crawled page, set its final task status and return its links."""
+        try:
+            result = parsed.result()
+        except Exception as e:
+            self.db.update_task_status(task_id, 'failed', str(e))
+            return None
+
+        if result is None:
+            self.db.update_task_status(task_id, 'failed', 'fetch failed')
+            return None
+        if isinstance(result, str):
+            self.db.update_task_status(task_id, result)  # e.g. robots_blocked
+            return None
+
+        near_dup_of = self._save(task_id, url, result)
+        self.db.update_task_status(task_id, 'completed')
+        if near_dup_of and not settings.NEAR_DUP_EXPAND_LINKS:
+            return None
+        return result.get('links')
+
+    def _save(self, task_id: int, url: str, result: Dict[str, Any]) -> Optional[str]:
+        """Store the page; returns the URL it near-duplicates, if any."""
+        return self.db.save_content(task_id, url, result.get('title'), result.get('text'), None,
+                                    result.get('simhash'))
+
+    def checkpoint(self, in_flight: List[Tuple[int, str, int]] = ()):
+        """
+        Save the job state. in_flight holds the (task_id, url, depth) of pages
+        started but not finished; they are crawled again on resume.
+        """
+        # Statuses of finished pages must be on disk before the frontier forgets them
+        self.db.flush()
+        state = {
+            'seeds': self.seeds,
+            'pages_crawled': self.pages_crawled,
+            'in_flight': {url: task_id for task_id, url, _ in in_flight},
+            'throttle': self.crawler.throttle.export_state(),
+            'saved_at': time.time()
+        }
+        tmp_file = f"{self.checkpoint_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_file, self.checkpoint_file)
+        self.frontier.checkpoint(
+            (url, depth, self.priority - depth) for _, url, depth in in_flight
+        )
+
+    def _load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_file):
+            return
+        try:
+            with open(self.checkpoint_file, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable checkpoint {self.checkpoint_file}: {e}")
+            return
+        self.pages_crawled = state.get('pages_crawled', 0)
+        self.resumed_tasks = state.get('in_flight', {})
+        self.crawler.throttle.load_state(state.get('throttle', {}))
+        logger.info(f"Resuming crawl job from {self.checkpoint_file}: {self.pages_crawled} pages done, "
+                    f"{len(self.resumed_tasks)} in flight")
@@ -1,178 +1,240 @@
 import time
 import random
-from typing import Optional, Dict, Any
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Optional, Dict, Any, List
 from urllib.parse import urljoin, urlparse
 
 import requests
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
-from playwright.sync_api import sync_playwright
+from tenacity import Retrying, stop_after_attempt, wait_exponential_jitter, retry_if_exception_type
 
 from config import settings
 from utils.user_agent import get_random_ua
-from utils.fingerprint import randomize_fingerprint
 from utils.logger import get_logger
+from utils.metrics import timer, route_label, STAGE_SECONDS, REQUESTS_TOTAL
 from core.proxy_pool import ProxyPool
 from core.robots_checker import RobotsChecker
+from core.async_engine import AsyncCrawlEngine
+from core.extractor import extract
+from core.parse_pool import ParsePool, get_parse_pool
+from core.browser_pool import get_playwright_pool, get_selenium_pool
+from core.http_cache import HTTPCache, get_http_cache
+from core.throttle import get_throttle, parse_retry_after, RetryableResponse, RETRY_STATUSES
 
 logger = get_logger(__name__)
 
 class DynamicCrawler:
-    def __init__(self, engine: str = None, proxy_pool: ProxyPool = None, tor_manager=None):
+    def __init__(self, engine: str = None, proxy_pool: ProxyPool = None, tor_manager=None, throttle=None,
+                 parse_pool: ParsePool = None, http_cache: HTTPCache = None):
         self.engine = engine or settings.DEFAULT_RENDERING_ENGINE
         self.proxy_pool = proxy_pool
         self.tor_manager = tor_manager
-        self.robots_checker = RobotsChecker()
+        self.throttle = throttle or get_throttle()
+        self.parse_pool = parse_pool or get_parse_pool()
+        self.http_cache = http_cache or get_http_cache()
+        self.robots_checker = RobotsChecker(fetcher=self._fetch_robots)
         self.session = requests.Session()
+        self.local = threading.local()  # .route: proxies of this thread's last page fetch
 
-    def _get_proxy_dict(self):
-        """Return a proxy dict for requests or Selenium."""
-        if self.tor_manager:
-            # Tor already configured via session
+    def _next_proxy(self) -> Optional[str]:
+        """Pick a proxy from the pool; None when using Tor or a direct connection."""
+        if self.tor_manager or not self.proxy_pool:
             return None
-        if self.proxy_pool:
-            proxy = self.proxy_pool.get_proxy()
-            if proxy:
-                return {'http': f'http://{proxy}', 'https': f'http://{proxy}'}
+        return self.proxy_pool.get_proxy()
+
+    def _get_proxy_dict(self, proxy: Optional[str]):
+        """Return a proxy dict for requests."""
+        if proxy:
+            return {'http': f'http://{proxy}', 'https': f'http://{proxy}'}
         return None
 
+    def media_proxies(self) -> Optional[Dict[str, str]]:
+        """
+        Proxies dict that routes media downloads the way the page this thread
+        last crawled was fetched: the same Tor session or pool proxy. After a
+        browser render the route is not known, so a Tor session or pool proxy
+        is picked. None means a direct connection, which is only the
+        crawler's own route when it has neither.
+        """
+        route = getattr(self.local, 'route', None)
+        if route:
+            return dict(route)
+        if self.tor_manager:
+            return dict(self.tor_manager.get_tor_session().proxies)
+        return self._get_proxy_dict(self._next_proxy())
+
+    def _fetch_robots(self, robots_url: str) -> requests.Response:
+        """Fetch robots.txt over the same route (Tor, proxy or direct) as the crawl."""
+        headers = {'User-Agent': get_random_ua()}
+        if self.tor_manager:
+            return self.tor_manager.get_tor_session().get(
+                robots_url, headers=headers, timeout=settings.REQUEST_TIMEOUT
+            )
+        return self.session.get(
+            robots_url, headers=headers, proxies=self._get_proxy_dict(self._next_proxy()),
+            timeout=settings.REQUEST_TIMEOUT
+        )
+
+    def _report_proxy(self, proxy: Optional[str], success: bool, latency: float = None):
+        """Feed the outcome of a proxied request back into the pool's scores."""
+        if proxy and self.proxy_pool:
+            self.proxy_pool.report(proxy, success, latency)
+
     def crawl(self, url: str, force: bool = False, dynamic: bool = None) -> Optional[Dict[str, Any]]:
         """
         Main crawl method.
         Returns a dict with 'text', 'images', 'videos' or None on failure.
         If robots.txt blocks and force=False, returns a string like 'robots_blocked'.
         """
+        result = self.crawl_deferred(url, force=force, dynamic=dynamic)
+        return result.result()
+
+    def crawl_deferred(self, url: str, force: bool = False, dynamic: bool = None) -> Future:
+        """
+        Fetch url on the calling thread and hand parsing off.
+        Returns a Future for what crawl() would return; with a parse pool it
+        resolves once a worker process has parsed the page, so the caller
+        can move on to its next fetch.
+        """
         if not force:
-            allowed = self.robots_checker.check(url, user_agent='*')
+            with timer('robots', engine=self.engine):
+                allowed = self.robots_checker.check(url, user_agent='*')
             if not allowed:
                 logger.info(f"robots.txt blocks {url}")
-                return 'robots_blocked'
+                return self._resolved('robots_blocked')
 
         use_dynamic = dynamic if dynamic is not None else (self.engine != 'requests')
+        self.local.route = None
 
-        if use_dynamic:
-            if self.engine == 'selenium':
-                html = self._crawl_selenium(url)
-            elif self.engine == 'playwright':
-                html = self._crawl_playwright(url)
-            else:
-                html = self._crawl_requests(url)
+        if use_dynamic and self.engine in ('selenium', 'playwright'):
+            self.throttle.acquire(url)
+            start = time.monotonic()
+            try:
+                with timer('render', engine=self.engine):
+                    if self.engine == 'selenium':
+                        html = self._crawl_selenium(url)
+                    else:
+                        html = self._crawl_playwright(url)
+            finally:
+                self.throttle.release(url, latency=time.monotonic() - start)
+            REQUESTS_TOTAL.inc(engine=self.engine, route='browser', status='ok' if html is not None else 'error')
         else:
             html = self._crawl_requests(url)
 
         if html is None:
-            return None
+            return self._resolved(None)
+
+        if self.parse_pool:
+            return self.parse_pool.submit(html, url)
+        with timer('parse', engine='inline'):
+            return self._resolved(self._parse_html(html, url))
 
-        return self._parse_html(html, url)
+    @staticmethod
+    def _resolved(value) -> Future:
+        future = Future()
+        future.set_result(value)
+        return future
+
+    def crawl_many(self, urls: List[str], force: bool = False) -> Dict[str, Any]:
+        """
+        Crawl many URLs concurrently with plain HTTP (no rendering).
+        Returns {url: result}, where each result is what crawl() returns.
+        """
+        if self.tor_manager:
+            # aiohttp cannot speak SOCKS, so Tor traffic goes through a thread pool
+            with ThreadPoolExecutor(max_workers=settings.MAX_CONCURRENT_REQUESTS) as executor:
+                results = executor.map(lambda u: self.crawl(u, force=force, dynamic=False), urls)
+                return dict(zip(urls, results))
+        engine = AsyncCrawlEngine(
+            parser=self._parse_html,
+            proxy_pool=self.proxy_pool,
+            robots_checker=self.robots_checker,
+            parse_pool=self.parse_pool,
+            http_cache=self.http_cache
+        )
+        return engine.crawl_many(urls, force=force)
 
     def _crawl_requests(self, url: str) -> Optional[str]:
-        """Simple requests-based crawl."""
+        """Simple requests-based crawl, retried with backoff on transient errors."""
+        retrying = Retrying(
+            stop=stop_after_attempt(settings.MAX_RETRIES + 1),
+            wait=wait_exponential_jitter(initial=settings.RETRY_BACKOFF_BASE, max=settings.RETRY_BACKOFF_MAX),
+            retry=retry_if_exception_type((requests.ConnectionError, requests.Timeout, RetryableResponse)),
+            reraise=True
+        )
+        try:
+            return retrying(self._fetch_once, url)
+        except (requests.RequestException, RetryableResponse) as e:
+            logger.error(f"Request failed for {url}: {e}")
+            return None
+
+    def _fetch_once(self, url: str) -> str:
+        """
+        One throttled GET. Raises RetryableResponse for 429/5xx.
+        A cached page is revalidated and its body reused on 304.
+        """
+        proxy = self._next_proxy()
+        route = route_label(proxy)
+        cached = self.http_cache.get(url) if self.http_cache else None
+        self.throttle.acquire(url)
+        start = time.monotonic()
+        status = retry_after = None
         try:
             headers = {'User-Agent': get_random_ua()}
-            proxies = self._get_proxy_dict()
+            headers.update(HTTPCache.conditional_headers(cached))
             if self.tor_manager:
-                resp = self.tor_manager.get_tor_session().get(
-                    url, headers=headers, timeout=settings.REQUEST_TIMEOUT
-                )
+                tor_session = self.tor_manager.get_tor_session()
+                proxies = tor_session.proxies
+                route = route_label((proxies or {}).get('https'))
+                resp = tor_session.get(url, headers=headers, timeout=settings.REQUEST_TIMEOUT)
             else:
+                proxies = self._get_proxy_dict(proxy)
                 resp = self.session.get(
-                    url, headers=headers, proxies=proxies, timeout=settings.REQUEST_TIMEOUT
+                    url, headers=headers, proxies=proxies,
+                    timeout=settings.REQUEST_TIMEOUT
                 )
-            resp.raise_for_status()
-            return resp.text
-        except requests.RequestException as e:
-            logger.error(f"Request failed for {url}: {e}")
-            return None
+            self.local.route = proxies
+            status = resp.status_code
+            retry_after = parse_retry_after(resp.headers.get('Retry-After'))
+        except requests.RequestException:
+            self._report_proxy(proxy, False)
+            raise
+        finally:
+            elapsed = time.monotonic() - start
+            # Retry-After is honoured by the throttle, which holds back the whole host
+            self.throttle.release(url, latency=elapsed, status=status, retry_after=retry_after)
+            STAGE_SECONDS.observe(elapsed, stage='fetch', engine='requests', route=route)
+            REQUESTS_TOTAL.inc(engine='requests', route=route, status=status or 'error')
+
+        # Any HTTP response means the proxy itself did its job
+        self._report_proxy(proxy, status != 407, time.monotonic() - start)
+        if status in RETRY_STATUSES:
+            raise RetryableResponse(url, status, retry_after)
+        if status == 304 and cached:
+            self.http_cache.refresh(url, resp.headers)
+            return cached['body']
+        resp.raise_for_status()
+        if self.http_cache:
+            self.http_cache.store(url, resp.text, resp.headers)
+        return resp.text
 
     def _crawl_selenium(self, url: str) -> Optional[str]:
-        """Selenium with headless Chrome."""
-        options = Options()
-        options.add_argument('--headless')
-        options.add_argument('--no-sandbox')
-        options.add_argument('--disable-dev-shm-usage')
-        options.add_argument(f'user-agent={get_random_ua()}')
-        # Anti-detection
-        options.add_experimental_option('excludeSwitches', ['enable-automation'])
-        options.add_experimental_option('useAutomationExtension', False)
-
-        # Proxy
-        proxy_dict = self._get_proxy_dict()
-        if proxy_dict:
-            proxy = proxy_dict['http'].replace('http://', '')
-            options.add_argument(f'--proxy-server={proxy}')
-
-        driver = webdriver.Chrome(
-            service=Service(ChromeDriverManager().install()),
-            options=options
-        )
-        driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {
-            'source': 'Object.defineProperty(navigator, "webdriver", {get: () => undefined})'
-        })
+        """Selenium with headless Chrome, on a pooled driver."""
         try:
-            driver.get(url)
-            time.sleep(2)  # basic wait
-            html = driver.page_source
-            return html
+            # In Tor mode the free-proxy pool must not carry browser traffic
+            return get_selenium_pool(None if self.tor_manager else self.proxy_pool).render(url)
         except Exception as e:
             logger.error(f"Selenium crawl failed for {url}: {e}")
             return None
-        finally:
-            driver.quit()
 
     def _crawl_playwright(self, url: str) -> Optional[str]:
-        """Playwright with anti-detection."""
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            context = browser.new_context(
-                user_agent=get_random_ua(),
-                viewport=randomize_fingerprint()['viewport'],
-                device_scale_factor=1,
-                has_touch=False,
-                is_mobile=False
-            )
-            page = context.new_page()
-            try:
-                page.goto(url, wait_until='networkidle')
-                html = page.content()
-                return html
-            except Exception as e:
-                logger.error(f"Playwright crawl failed for {url}: {e}")
-                return None
-            finally:
-                browser.close()
+        """Playwright with anti-detection, on a pooled browser."""
+        try:
+            return get_playwright_pool().render(url)
+        except Exception as e:
+            logger.error(f"Playwright crawl failed for {url}: {e}")
+            return None
 
     def _parse_html(self, html: str, base_url: str) -> Dict[str, Any]:
-        """Extract text, image URLs, video URLs."""
-        soup = BeautifulSoup(html, 'lxml')
-        for script in soup(['script', 'style']):
-            script.decompose()
-        text = soup.get_text(separator='\n', strip=True)
-
-        images = []
-        for img in soup.find_all('img'):
-            src = img.get('src')
-            if src:
-                images.append(urljoin(base_url, src))
-
-        videos = []
-        for video in soup.find_all('video'):
-            src = video.get('src')
-            if src:
-                videos.append(urljoin(base_url, src))
-            for source in video.find_all('source'):
-                src = source.get('src')
-                if src:
-                    videos.append(urljoin(base_url, src))
-        for source in soup.find_all('source'):
-            src = source.get('src')
-            if src and source.parent.name != 'video':
-                videos.append(urljoin(base_url, src))
-
-        return {
-            'text': text,
-            'images': list(set(images)),
-            'videos': list(set(videos))
-        }
+        """Extract title, text, image URLs, video URLs and outgoing links."""
+        return extract(html, base_url)
@@ -1,94 +1,383 @@
 import os
 import json
+import hashlib
+import itertools
+import time
+import threading
 import requests
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
-from typing import List, Optional
+from typing import List, Optional, Dict, Tuple, Callable
 from utils.logger import get_logger
+from utils.metrics import DOWNLOAD_BYTES, DOWNLOAD_RATE
 from config import settings
 
 logger = get_logger(__name__)
 
+class RangeNotSupported(Exception):
+    """The server answered a Range request with the whole body."""
+
+def merge_ranges(ranges: List[Tuple[int, int]]) -> List[List[int]]:
+    """Merge half-open [start, end) byte ranges into a sorted, disjoint list."""
+    merged: List[List[int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+def missing_ranges(done: List[List[int]], total: int) -> List[Tuple[int, int]]:
+    """Return the gaps in [0, total) not covered by the merged ranges in done."""
+    gaps, cursor = [], 0
+    for start, end in done:
+        if start > cursor:
+            gaps.append((cursor, start))
+        cursor = max(cursor, end)
+    if cursor < total:
+        gaps.append((cursor, total))
+    return gaps
+
+class _ChunkPlanner:
+    """
+    Hands out the next byte range to fetch. Chunk size starts from the file
+    size and then follows measured throughput, so each request takes about
+    DOWNLOAD_TARGET_CHUNK_SECONDS.
+    """
+
+    def __init__(self, gaps: List[Tuple[int, int]], total: int, workers: int):
+        self.gaps = list(gaps)
+        self.lock = threading.Lock()
+        self.chunk_size = self._clamp(total // (workers * 4))
+        self.throughput = None  # bytes/sec, EWMA
+
+    @staticmethod
+    def _clamp(size: int) -> int:
+        return max(settings.DOWNLOAD_MIN_CHUNK, min(settings.DOWNLOAD_MAX_CHUNK, int(size)))
+
+    def next_range(self) -> Optional[Tuple[int, int]]:
+        with self.lock:
+            if not self.gaps:
+                return None
+            start, end = self.gaps[0]
+            stop = min(end, start + self.chunk_size)
+            if stop == end:
+                self.gaps.pop(0)
+            else:
+                self.gaps[0] = (stop, end)
+            return start, stop
+
+    def record(self, nbytes: int, elapsed: float):
+        if elapsed <= 0:
+            return
+        with self.lock:
+            rate = nbytes / elapsed
+            self.throughput = rate if self.throughput is None else 0.3 * rate + 0.7 * self.throughput
+            self.chunk_size = self._clamp(self.throughput * settings.DOWNLOAD_TARGET_CHUNK_SECONDS)
+
+def sha256_file(filepath: str) -> Tuple[str, int]:
+    """Return (hex SHA-256, size) of a file."""
+    digest, size = hashlib.sha256(), 0
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+            size += len(block)
+    return digest.hexdigest(), size
+
 class ResumableDownloader:
-    def __init__(self, download_dir: str = settings.DOWNLOAD_DIR, max_workers: int = 5):
+    """
+    With a Database, finished downloads are indexed by URL and SHA-256:
+    known URLs are revalidated with If-None-Match/If-Modified-Since, and a
+    file whose content is already stored is hard-linked to the existing copy.
+    """
+
+    def __init__(self, download_dir: str = settings.DOWNLOAD_DIR, max_workers: int = 5, db=None):
         self.download_dir = download_dir
         self.max_workers = max_workers
+        self.db = db
+        self._sessions: Dict[str, requests.Session] = {}
+        self._sessions_lock = threading.Lock()
+        self._checkpoint_lock = threading.Lock()
+        self._reserved = set()  # paths being written by downloads in progress
+        self._paths_lock = threading.Lock()
         os.makedirs(download_dir, exist_ok=True)
 
-    def download(self, url: str, filename: Optional[str] = None, resume: bool = True) -> Optional[str]:
-        """Download a file with resume support."""
+    def _session(self, url: str) -> requests.Session:
+        """Return the pooled Session for url's host."""
+        parsed = urlparse(url)
+        key = f"{parsed.scheme}://{parsed.netloc}"
+        with self._sessions_lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._sessions[key] = session
+            return session
+
+    def download(self, url: str, filename: Optional[str] = None, resume: bool = True,
+                 progress: Optional[Callable[[int, int], None]] = None,
+                 proxies: Optional[Dict[str, str]] = None) -> Optional[str]:
+        """
+        Download a file with resume support.
+        progress(nbytes, total) is called from the download threads after each
+        block is written; it may block to rate-limit the download.
+        proxies (a requests proxies dict) routes every request of the download,
+        e.g. through the Tor circuit or proxy the page was crawled over.
+        """
         if not filename:
             parsed = urlparse(url)
             filename = os.path.basename(parsed.path) or 'index.html'
 
         filepath = os.path.join(self.download_dir, filename)
+
+        known = self.db.get_media_file(url) if self.db else None
+        if known and not os.path.exists(known['local_path']):
+            known = None
+        headers = {}
+        if known and known['etag']:
+            headers['If-None-Match'] = known['etag']
+        if known and known['last_modified']:
+            headers['If-Modified-Since'] = known['last_modified']
+
+        # Probe size and range support
+        body = None
+        try:
+            head = self._session(url).head(url, headers=headers, allow_redirects=True, proxies=proxies,
+                                           timeout=settings.REQUEST_TIMEOUT)
+            head.raise_for_status()
+        except Exception as e:
+            # Some servers refuse HEAD (405/403); a plain GET tells us the same and carries the body
+            logger.info(f"HEAD failed for {url} ({e}); falling back to a single-stream GET")
+            try:
+                head = body = self._session(url).get(url, headers=headers, stream=True, proxies=proxies,
+                                                     timeout=settings.REQUEST_TIMEOUT)
+                body.raise_for_status()
+            except Exception as e:
+                if body is not None:
+                    body.close()
+                logger.error(f"Failed to download {url}: {e}")
+                return None
+        if known and (head.status_code == 304 or (known['etag'] and head.headers.get('etag') == known['etag'])):
+            if body is not None:
+                body.close()
+            logger.info(f"{url} not modified; reusing {known['local_path']}")
+            return known['local_path']
+
+        filepath = self._claim_path(url, filepath)
+        try:
+            return self._download_to(url, filepath, head, resume, progress, proxies, body)
+        finally:
+            with self._paths_lock:
+                self._reserved.discard(filepath)
+
+    def _download_to(self, url: str, filepath: str, head, resume: bool,
+                     progress: Optional[Callable[[int, int], None]],
+                     proxies: Optional[Dict[str, str]], body=None) -> Optional[str]:
+        """
+        Fetch url into filepath, which _claim_path() reserved for it. body is
+        an open GET response to stream from when the HEAD probe failed.
+        """
+        # A deduplicated file shares its inode with other downloads; never write through it
+        if os.path.exists(filepath) and os.stat(filepath).st_nlink > 1:
+            os.remove(filepath)
         checkpoint_file = f"{filepath}.ckpt"
+        total_size = int(head.headers.get('content-length', 0) or 0)
+        progress, received = self._metered(progress)
+        started = time.monotonic()
+        ranged = head.headers.get('accept-ranges', '').lower() == 'bytes'
+        validator = head.headers.get('etag') or head.headers.get('last-modified')
 
-        # Get total size
         try:
-            head = requests.head(url, timeout=settings.REQUEST_TIMEOUT)
-            total_size = int(head.headers.get('content-length', 0))
+            if body is not None or not ranged or total_size < settings.DOWNLOAD_MIN_CHUNK:
+                filepath = self._download_single(url, filepath, total_size, progress, proxies, body)
+            else:
+                try:
+                    filepath = self._download_ranged(url, filepath, checkpoint_file, total_size, validator,
+                                                     resume, progress, proxies)
+                except RangeNotSupported:
+                    logger.info(f"{url} ignores Range; falling back to a single stream")
+                    filepath = self._download_single(url, filepath, total_size, progress, proxies)
+            elapsed = time.monotonic() - started
+            if received[0] and elapsed > 0:
+                DOWNLOAD_RATE.observe(received[0] / elapsed)
+            if self.db:
+                filepath = self._index(url, filepath, head.headers)
+            return filepath
         except Exception as e:
-            logger.error(f"Failed to get file size for {url}: {e}")
+            logger.error(f"Download failed for {url}: {e}")
             return None
+        finally:
+            if body is not None:
+                body.close()
 
-        # Read checkpoint
-        downloaded = 0
-        if resume and os.path.exists(checkpoint_file):
-            with open(checkpoint_file, 'r') as f:
-                checkpoint = json.load(f)
-                downloaded = checkpoint.get('downloaded', 0)
+    @staticmethod
+    def _metered(progress: Optional[Callable[[int, int], None]]) -> Tuple[Callable[[int, int], None], List[int]]:
+        """Wrap progress to count downloaded bytes; the list holds the running total."""
+        received = [0]
+        lock = threading.Lock()
+
+        def metered(nbytes: int, total: int):
+            with lock:
+                received[0] += nbytes
+            DOWNLOAD_BYTES.inc(nbytes)
+            if progress:
+                progress(nbytes, total)
+        return metered, received
+
+    def _claim_path(self, url: str, filepath: str) -> str:
+        """
+        Reserve a path for url's download. url gets its own file name when
+        filepath is being written by another download in progress, or is
+        indexed for another URL. download() releases the reservation.
+        """
+        root, ext = os.path.splitext(filepath)
+        digest = hashlib.sha1(url.encode('utf-8')).hexdigest()[:8]
+        with self._paths_lock:
+            owner = self.db.media_url_for_path(filepath) if self.db else None
+            if filepath in self._reserved or (owner is not None and owner != url):
+                filepath = f"{root}-{digest}{ext}"
+                suffix = itertools.count(1)
+                while filepath in self._reserved:
+                    filepath = f"{root}-{digest}-{next(suffix)}{ext}"
+            self._reserved.add(filepath)
+        return filepath
 
-        if downloaded >= total_size:
+    def _index(self, url: str, filepath: str, headers) -> str:
+        """Record a finished download; replace it by a link if the content is already stored."""
+        digest, size = sha256_file(filepath)
+        for existing in self.db.find_media_by_hash(digest):
+            if not os.path.exists(existing) or os.path.samefile(existing, filepath):
+                continue
+            os.remove(filepath)
+            try:
+                os.link(existing, filepath)
+            except OSError:
+                filepath = existing  # no hard links on this filesystem; point at the stored copy
+            logger.info(f"{url} has the same content as {existing}; deduplicated")
+            break
+        self.db.record_media_file(url, digest, filepath, size, headers.get('etag'), headers.get('last-modified'))
+        return filepath
+
+    def _download_single(self, url: str, filepath: str, total_size: int,
+                         progress: Optional[Callable[[int, int], None]],
+                         proxies: Optional[Dict[str, str]] = None, resp=None) -> str:
+        """Stream the whole body in one request (no resume possible), or from resp if already open."""
+        if resp is None:
+            resp = self._session(url).get(url, stream=True, proxies=proxies, timeout=settings.REQUEST_TIMEOUT)
+        with resp:
+            resp.raise_for_status()
+            with open(filepath, 'wb') as f:
+                for chunk in resp.iter_content(chunk_size=65536):
+                    if chunk:
+                        f.write(chunk)
+                        if progress:
+                            progress(len(chunk), total_size)
+        if os.path.exists(f"{filepath}.ckpt"):
+            os.remove(f"{filepath}.ckpt")
+        return filepath
+
+    def _download_ranged(self, url: str, filepath: str, checkpoint_file: str, total_size: int,
+                         validator: Optional[str], resume: bool,
+                         progress: Optional[Callable[[int, int], None]],
+                         proxies: Optional[Dict[str, str]] = None) -> str:
+        done: List[List[int]] = []
+        if resume and os.path.exists(filepath):
+            checkpoint = self._read_checkpoint(checkpoint_file)
+            # Only trust a checkpoint written for this exact version of the file
+            if checkpoint and checkpoint.get('total') == total_size and checkpoint.get('validator') == validator:
+                done = merge_ranges([tuple(r) for r in checkpoint.get('done', [])])
+            elif not checkpoint:
+                logger.info(f"No usable checkpoint for {filepath}; downloading from scratch")
+
+        gaps = missing_ranges(done, total_size)
+        if not gaps:
             logger.info(f"File already fully downloaded: {filepath}")
+            if os.path.exists(checkpoint_file):
+                os.remove(checkpoint_file)
             return filepath
 
-        # Download chunks in parallel
-        chunk_size = 1024 * 1024  # 1 MB
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            futures = []
-            for start in range(downloaded, total_size, chunk_size):
-                end = min(start + chunk_size - 1, total_size - 1)
-                future = executor.submit(self._download_chunk, url, filepath, start, end)
-                futures.append(future)
+        # Preallocate so every worker can seek to its offset
+        mode = 'r+b' if done and os.path.exists(filepath) else 'wb'
+        with open(filepath, mode) as f:
+            f.truncate(total_size)
 
-            for future in as_completed(futures):
+        state = {'total': total_size, 'validator': validator, 'done': done}
+        self._write_checkpoint(checkpoint_file, state)
+        planner = _ChunkPlanner(gaps, total_size, self.max_workers)
+
+        def worker():
+            while True:
+                byte_range = planner.next_range()
+                if byte_range is None:
+                    return
+                self._fetch_range(url, filepath, checkpoint_file, state, planner, progress, proxies, *byte_range)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(worker) for _ in range(self.max_workers)]
+            for future in futures:
                 future.result()  # propagate exceptions
 
-        if os.path.exists(checkpoint_file):
-            os.remove(checkpoint_file)
+        if missing_ranges(state['done'], total_size):
+            raise IOError(f"Incomplete download of {url}")
+        os.remove(checkpoint_file)
         return filepath
 
-    def _download_chunk(self, url: str, filepath: str, start: int, end: int):
-        """Download a single byte range."""
-        headers = {'Range': f'bytes={start}-{end}'}
-        try:
-            resp = requests.get(url, headers=headers, stream=True, timeout=settings.REQUEST_TIMEOUT)
-            resp.raise_for_status()
-            mode = 'r+b' if os.path.exists(filepath) else 'wb'
-            with open(filepath, mode) as f:
-                f.seek(start)
-                for chunk in resp.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-            # Update checkpoint
-            self._update_checkpoint(filepath, end + 1)
-        except Exception as e:
-            logger.error(f"Chunk download failed {url} bytes {start}-{end}: {e}")
-            raise
+    def _fetch_range(self, url: str, filepath: str, checkpoint_file: str, state: Dict,
+                     planner: _ChunkPlanner, progress: Optional[Callable[[int, int], None]],
+                     proxies: Optional[Dict[str, str]], start: int, end: int):
+        """Download bytes [start, end) and record them in the checkpoint."""
+        headers = {'Range': f'bytes={start}-{end - 1}'}
+        reported = 0  # bytes of this range already passed to progress; a retry reads them again
+        for attempt in range(settings.MAX_RETRIES + 1):
+            began = time.monotonic()
+            try:
+                with self._session(url).get(url, headers=headers, stream=True, proxies=proxies,
+                                            timeout=settings.REQUEST_TIMEOUT) as resp:
+                    resp.raise_for_status()
+                    if resp.status_code != 206:
+                        raise RangeNotSupported(url)
+                    written = 0
+                    with open(filepath, 'r+b') as f:
+                        f.seek(start)
+                        for chunk in resp.iter_content(chunk_size=65536):
+                            if chunk:
+                                f.write(chunk)
+                                written += len(chunk)
+                                if progress and written > reported:
+                                    progress(written - reported, state['total'])
+                                    reported = written
+                    if written != end - start:
+                        raise IOError(f"Short read for bytes {start}-{end - 1}: got {written}")
+                break
+            except RangeNotSupported:
+                raise
+            except Exception as e:
+                if attempt == settings.MAX_RETRIES:
+                    logger.error(f"Chunk download failed {url} bytes {start}-{end - 1}: {e}")
+                    raise
+        planner.record(end - start, time.monotonic() - began)
+        with self._checkpoint_lock:
+            state['done'] = merge_ranges([tuple(r) for r in state['done']] + [(start, end)])
+            self._write_checkpoint(checkpoint_file, state)
 
-    def _update_checkpoint(self, filepath: str, downloaded: int):
-        checkpoint_file = f"{filepath}.ckpt"
-        with open(checkpoint_file, 'w') as f:
-            json.dump({'downloaded': downloaded}, f)
+    @staticmethod
+    def _read_checkpoint(checkpoint_file: str) -> Optional[Dict]:
+        if not os.path.exists(checkpoint_file):
+            return None
+        try:
+            with open(checkpoint_file, 'r') as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Checkpoints from older versions only kept a single offset and can't be trusted
+        return checkpoint if 'done' in checkpoint else None
 
-    def download_many(self, urls: List[str], file_type: str) -> List[str]:
-        """Download multiple files (images, videos)."""
-        results = []
-        for url in urls:
-            parsed = urlparse(url)
-            filename = os.path.basename(parsed.path) or f"{file_type}_{len(results)}"
-            filepath = self.download(url, filename)
-            if filepath:
-                results.append(filepath)
-        return results
+    @staticmethod
+    def _write_checkpoint(checkpoint_file: str, state: Dict):
+        tmp_file = f"{checkpoint_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_file, checkpoint_file)
@@ -0,0 +1,138 @@
+from typing import Dict, Any, List, Optional
+from urllib.parse import urljoin, urlparse, urldefrag
+
+from bs4 import BeautifulSoup
+from lxml import etree
+from lxml import html as lxml_html
+
+from storage.near_duplicate import simhash
+
+# Text inside these never shows up in BeautifulSoup's get_text() either
+_NO_TEXT_TAGS = frozenset(['script', 'style', 'template', 'rt', 'rp'])
+
+def _empty_result() -> Dict[str, Any]:
+    return {'title': None, 'text': '', 'images': [], 'videos': [], 'links': [], 'simhash': None}
+
+def _page_link(base_url: str, href: str) -> Optional[str]:
+    link, _ = urldefrag(urljoin(base_url, href))
+    return link if urlparse(link).scheme in ('http', 'https') else None
+
+def extract(html: str, base_url: str) -> Dict[str, Any]:
+    """
+    Extract title, text, image URLs, video URLs and outgoing links in a
+    single walk over an lxml tree. Produces the same dict as extract_bs4().
+    """
+    try:
+        root = lxml_html.document_fromstring(html)
+    except ValueError:
+        # lxml refuses str input that carries an XML encoding declaration
+        try:
+            root = lxml_html.document_fromstring(html.encode('utf-8'))
+        except etree.ParserError:
+            return _empty_result()
+    except etree.ParserError:
+        return _empty_result()
+
+    texts: List[str] = []
+    images, videos, links = set(), set(), []
+    title = None
+    skip_depth = 0  # > 0 while inside a _NO_TEXT_TAGS element
+
+    # Iterative depth-first walk; a (node, True) entry marks leaving node
+    stack = [(root, False)]
+    while stack:
+        el, leaving = stack.pop()
+        tag = el.tag
+        if not isinstance(tag, str):
+            # Comments and processing instructions: only their tail is page text
+            if not skip_depth and el.tail:
+                piece = el.tail.strip()
+                if piece:
+                    texts.append(piece)
+            continue
+
+        if leaving:
+            if tag in _NO_TEXT_TAGS:
+                skip_depth -= 1
+            if not skip_depth and el.tail:
+                piece = el.tail.strip()
+                if piece:
+                    texts.append(piece)
+            continue
+
+        if tag in _NO_TEXT_TAGS:
+            skip_depth += 1
+        elif not skip_depth and el.text:
+            piece = el.text.strip()
+            if piece:
+                texts.append(piece)
+
+        if tag == 'img':
+            src = el.get('src')
+            if src:
+                images.add(urljoin(base_url, src))
+        elif tag == 'video' or tag == 'source':
+            src = el.get('src')
+            if src:
+                videos.add(urljoin(base_url, src))
+        elif tag == 'a':
+            href = el.get('href')
+            if href is not None:
+                link = _page_link(base_url, href)
+                if link:
+                    links.append(link)
+        elif tag == 'title' and title is None:
+            title = ''.join(s.strip() for s in el.itertext())
+
+        stack.append((el, True))
+        stack.extend((child, False) for child in reversed(el))
+
+    text = '\n'.join(texts)
+    return {
+        'title': title,
+        'text': text,
+        'images': list(images),
+        'videos': list(videos),
+        'links': list(dict.fromkeys(links)),
+        # Near-duplicate fingerprint, computed here so it runs on the parse workers
+        'simhash': simhash(text) if text else None
+    }
+
+def extract_bs4(html: str, base_url: str) -> Dict[str, Any]:
+    """Reference BeautifulSoup implementation of extract(); slower, kept for comparison."""
+    soup = BeautifulSoup(html, 'lxml')
+    title = soup.title.get_text(strip=True) if soup.title else None
+    for script in soup(['script', 'style']):
+        script.decompose()
+    text = soup.get_text(separator='\n', strip=True)
+
+    images = []
+    for img in soup.find_all('img'):
+        src = img.get('src')
+        if src:
+            images.append(urljoin(base_url, src))
+
+    videos = []
+    for video in soup.find_all('video'):
+        src = video.get('src')
+        if src:
+            videos.append(urljoin(base_url, src))
+    for source in soup.find_all('source'):
+        src = source.get('src')
+        if src:
+            videos.append(urljoin(base_url, src))
+
+    links = []
+    for anchor in soup.find_all('a', href=True):
+        link = _page_link(base_url, anchor['href'])
+        if link:
+            links.append(link)
+
+    return {
+        'title': title,
+        'text': text,
+        'images': list(set(images)),
+        'videos': list(set(videos)),
+        'links': list(dict.fromkeys(links)),
+        'simhash': simhash(text) if text else None
+    }
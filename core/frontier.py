@@ -0,0 +1,250 @@
+import hashlib
+import heapq
+import itertools
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+from collections import deque
+from typing import Optional, Dict, List, Tuple, Iterable
+from urllib.parse import urlparse
+
+from config import settings
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+def url_fingerprint(url: str) -> bytes:
+    """Stable 8-byte fingerprint of a URL."""
+    return hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest()
+
+class BloomFilter:
+    """Fixed-size Bloom filter over byte strings (bytearray-backed)."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: bytes) -> Iterable[int]:
+        digest = hashlib.blake2b(item, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: bytes):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: bytes) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+class URLFrontier:
+    """
+    Queue of URLs still to crawl, backed by a SQLite file.
+    URLs wait in per-host priority heaps, and hosts are served round-robin.
+    Once memory_limit URLs are held in memory, new URLs spill to disk and
+    are paged back in as the heaps drain. Seen URLs go through a Bloom
+    filter first and an on-disk index second, so memory stays bounded on
+    very large crawls. The filter starts at expected_urls (or
+    FRONTIER_BLOOM_INITIAL) and is rebuilt twice as large from the index
+    whenever it fills up, up to FRONTIER_BLOOM_CAPACITY.
+    With autocommit off, nothing is committed until checkpoint(), which also
+    saves the in-memory queue; after a crash the frontier reopens exactly as
+    it was at the last checkpoint.
+    Without a path the frontier lives in a temporary file that close()
+    removes. fresh=True empties an existing file instead of resuming from it.
+    """
+
+    def __init__(self, path: str = None, max_depth: int = None, allowed_domains: List[str] = None,
+                 memory_limit: int = None, autocommit: bool = True, fresh: bool = False,
+                 expected_urls: int = None):
+        self.temporary = path is None
+        if self.temporary:
+            os.makedirs(settings.FRONTIER_DIR, exist_ok=True)
+            fd, path = tempfile.mkstemp(prefix='frontier-', suffix='.db', dir=settings.FRONTIER_DIR)
+            os.close(fd)
+        self.path = path
+        self.closed = False
+        self.max_depth = settings.FRONTIER_MAX_DEPTH if max_depth is None else max_depth
+        self.allowed_domains = [d.lower().lstrip('.') for d in (allowed_domains or [])]
+        self.memory_limit = memory_limit or settings.FRONTIER_MEMORY_LIMIT
+        self.autocommit = autocommit
+        self.lock = threading.Lock()
+        self.host_queues: Dict[str, list] = {}  # host -> heap of (-priority, seq, url, depth)
+        self.hosts = deque()                    # hosts with queued URLs, in serving order
+        self.in_memory = 0
+        self._seq = itertools.count()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS spill (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL,
+                depth INTEGER NOT NULL,
+                priority INTEGER NOT NULL
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_spill_priority ON spill (priority DESC, id)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS seen (fp BLOB PRIMARY KEY) WITHOUT ROWID')
+        # In-memory queue as of the last checkpoint()
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS queued (
+                url TEXT NOT NULL,
+                depth INTEGER NOT NULL,
+                priority INTEGER NOT NULL
+            )
+        ''')
+        if fresh:
+            for table in ('spill', 'seen', 'queued'):
+                self.conn.execute(f'DELETE FROM {table}')
+        self.conn.commit()
+
+        self.seen_count = self.conn.execute('SELECT COUNT(*) FROM seen').fetchone()[0]
+        self._build_bloom(max(expected_urls or settings.FRONTIER_BLOOM_INITIAL, self.seen_count * 2))
+        self._restore_queued()
+
+    def _build_bloom(self, capacity: int):
+        """(Re)build the seen filter from the on-disk index. Caller holds the lock."""
+        self.bloom = BloomFilter(min(capacity, settings.FRONTIER_BLOOM_CAPACITY))
+        for (fp,) in self.conn.execute('SELECT fp FROM seen'):
+            self.bloom.add(fp)
+
+    def _restore_queued(self):
+        """Queue again what was in memory at the last checkpoint."""
+        rows = self.conn.execute('SELECT url, depth, priority FROM queued').fetchall()
+        if not rows:
+            return
+        spill = []
+        for url, depth, priority in rows:
+            if self.in_memory < self.memory_limit:
+                self._push_memory(url, depth, priority)
+            else:
+                spill.append((url, depth, priority))
+        self.conn.executemany('INSERT INTO spill (url, depth, priority) VALUES (?, ?, ?)', spill)
+        self.conn.execute('DELETE FROM queued')
+        self._commit()
+        logger.info(f"Frontier restored {len(rows)} queued URLs from {self.path}")
+
+    def _commit(self):
+        if self.autocommit:
+            self.conn.commit()
+
+    def _allowed(self, url: str, depth: int) -> bool:
+        if self.max_depth is not None and depth > self.max_depth:
+            return False
+        if not self.allowed_domains:
+            return True
+        host = (urlparse(url).hostname or '').lower()
+        return any(host == d or host.endswith('.' + d) for d in self.allowed_domains)
+
+    def _mark_seen(self, url: str) -> bool:
+        """Record url as seen; False if it was already. Caller holds the lock."""
+        fp = url_fingerprint(url)
+        if fp in self.bloom:
+            # Possibly seen; the on-disk index settles Bloom false positives
+            if self.conn.execute('SELECT 1 FROM seen WHERE fp=?', (fp,)).fetchone():
+                return False
+        self.conn.execute('INSERT INTO seen (fp) VALUES (?)', (fp,))
+        self.bloom.add(fp)
+        self.seen_count += 1
+        if self.seen_count > self.bloom.capacity and self.bloom.capacity < settings.FRONTIER_BLOOM_CAPACITY:
+            self._build_bloom(self.bloom.capacity * 2)
+        return True
+
+    def _push_memory(self, url: str, depth: int, priority: int):
+        """Caller holds the lock."""
+        host = urlparse(url).netloc
+        heap = self.host_queues.get(host)
+        if heap is None:
+            heap = self.host_queues[host] = []
+            self.hosts.append(host)
+        heapq.heappush(heap, (-priority, next(self._seq), url, depth))
+        self.in_memory += 1
+
+    def add(self, url: str, depth: int = 0, priority: int = 5) -> bool:
+        """Queue url unless it was seen before or is outside the limits."""
+        return self.add_many([url], depth, priority) == 1
+
+    def add_many(self, urls: Iterable[str], depth: int = 0, priority: int = 5) -> int:
+        """Queue several URLs found at the same depth; returns how many were new."""
+        added = 0
+        with self.lock:
+            spill = []
+            for url in urls:
+                if not self._allowed(url, depth) or not self._mark_seen(url):
+                    continue
+                if self.in_memory < self.memory_limit:
+                    self._push_memory(url, depth, priority)
+                else:
+                    spill.append((url, depth, priority))
+                added += 1
+            if spill:
+                self.conn.executemany('INSERT INTO spill (url, depth, priority) VALUES (?, ?, ?)', spill)
+            self._commit()
+        return added
+
+    def _refill(self):
+        """Page spilled URLs back into memory, best priority first. Caller holds the lock."""
+        rows = self.conn.execute(
+            'SELECT id, url, depth, priority FROM spill ORDER BY priority DESC, id LIMIT ?',
+            (max(1, self.memory_limit // 2),)
+        ).fetchall()
+        if not rows:
+            return
+        self.conn.executemany('DELETE FROM spill WHERE id=?', [(row[0],) for row in rows])
+        self._commit()
+        for _, url, depth, priority in rows:
+            self._push_memory(url, depth, priority)
+
+    def pop(self) -> Optional[Tuple[str, int]]:
+        """Return the next (url, depth), rotating across hosts, or None when empty."""
+        with self.lock:
+            if self.in_memory == 0:
+                self._refill()
+            while self.hosts:
+                host = self.hosts.popleft()
+                heap = self.host_queues[host]
+                _, _, url, depth = heapq.heappop(heap)
+                self.in_memory -= 1
+                if heap:
+                    self.hosts.append(host)
+                else:
+                    del self.host_queues[host]
+                return url, depth
+            return None
+
+    def checkpoint(self, in_flight: Iterable[Tuple[str, int, int]] = ()):
+        """
+        Save the in-memory queue plus in_flight (url, depth, priority) items,
+        popped but not finished, and commit. On reopening they are queued again.
+        """
+        with self.lock:
+            rows = [(url, depth, -neg_priority)
+                    for heap in self.host_queues.values() for neg_priority, _, url, depth in heap]
+            rows.extend(in_flight)
+            self.conn.execute('DELETE FROM queued')
+            self.conn.executemany('INSERT INTO queued (url, depth, priority) VALUES (?, ?, ?)', rows)
+            self.conn.commit()
+
+    def __len__(self) -> int:
+        with self.lock:
+            spilled = self.conn.execute('SELECT COUNT(*) FROM spill').fetchone()[0]
+            return self.in_memory + spilled
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.conn.close()
+            if self.temporary:
+                for suffix in ('', '-wal', '-shm'):
+                    if os.path.exists(self.path + suffix):
+                        os.remove(self.path + suffix)
@@ -0,0 +1,155 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Optional, Dict
+from config import settings
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class HTTPCache:
+    """
+    On-disk cache of page bodies and their validators (ETag, Last-Modified).
+    Only responses that carry a validator are stored, since nothing else can
+    be revalidated. Bodies are zlib-compressed; once the stored bytes exceed
+    max_bytes the least recently used entries are evicted. Access times of
+    cache hits are kept in memory and written in batches.
+    """
+
+    def __init__(self, path: str = None, max_bytes: int = None):
+        self.path = path or settings.HTTP_CACHE_FILE
+        self.max_bytes = max_bytes or settings.HTTP_CACHE_MAX_BYTES
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.accessed: Dict[str, float] = {}  # url -> last hit not yet written
+        self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS entries (
+                    url TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    date TEXT,
+                    body BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            ''')
+            if 'date' not in {row[1] for row in self.conn.execute('PRAGMA table_info(entries)')}:
+                self.conn.execute('ALTER TABLE entries ADD COLUMN date TEXT')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_entries_access ON entries (last_access)')
+            self.total = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    def get(self, url: str) -> Optional[Dict[str, str]]:
+        """Return {'etag', 'last_modified', 'date', 'body'} for url, or None."""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT etag, last_modified, date, body FROM entries WHERE url=?', (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.accessed[url] = time.time()
+            if len(self.accessed) >= settings.HTTP_CACHE_ACCESS_BATCH:
+                self._write_access()
+        etag, last_modified, date, body = row
+        return {'etag': etag, 'last_modified': last_modified, 'date': date,
+                'body': zlib.decompress(body).decode('utf-8')}
+
+    def _write_access(self):
+        """Write pending access times. Caller holds the lock."""
+        pending = [(accessed, url) for url, accessed in self.accessed.items()]
+        self.accessed.clear()
+        try:
+            with self.conn:
+                self.conn.executemany('UPDATE entries SET last_access=? WHERE url=?', pending)
+        except sqlite3.Error as e:
+            logger.error(f"HTTP cache access update failed: {e}")
+
+    @staticmethod
+    def conditional_headers(entry: Optional[Dict[str, str]]) -> Dict[str, str]:
+        """Request headers that revalidate a cached entry."""
+        headers = {}
+        if entry and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, url: str, body: str, headers):
+        """Cache a 200 response body if it has a validator."""
+        etag, last_modified = headers.get('ETag'), headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+        payload = zlib.compress(body.encode('utf-8'), settings.CONTENT_ZLIB_LEVEL)
+        with self.lock:
+            self.accessed.pop(url, None)
+            try:
+                with self.conn:
+                    old = self.conn.execute('SELECT size FROM entries WHERE url=?', (url,)).fetchone()
+                    self.conn.execute('''
+                        INSERT OR REPLACE INTO entries (url, etag, last_modified, date, body, size, last_access)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ''', (url, etag, last_modified, headers.get('Date'), payload, len(payload), time.time()))
+                    self.total += len(payload) - (old[0] if old else 0)
+                    if self.total > self.max_bytes:
+                        self._evict()
+            except sqlite3.Error as e:
+                logger.error(f"HTTP cache write failed for {url}: {e}")
+
+    def refresh(self, url: str, headers):
+        """
+        Update a cached entry from a 304 response: a 304 may carry a new ETag,
+        Last-Modified or Date, which later revalidations must send.
+        """
+        etag, last_modified, date = headers.get('ETag'), headers.get('Last-Modified'), headers.get('Date')
+        if not etag and not last_modified and not date:
+            return
+        with self.lock:
+            try:
+                with self.conn:
+                    self.conn.execute('''
+                        UPDATE entries SET etag=COALESCE(?, etag), last_modified=COALESCE(?, last_modified),
+                                           date=COALESCE(?, date)
+                        WHERE url=?
+                    ''', (etag, last_modified, date, url))
+            except sqlite3.Error as e:
+                logger.error(f"HTTP cache refresh failed for {url}: {e}")
+
+    def _evict(self):
+        """Drop least recently used entries until under 90% of max_bytes. Caller holds the lock."""
+        if self.accessed:
+            self._write_access()  # recent hits must count before choosing victims
+        target = self.max_bytes * 0.9
+        rows = self.conn.execute('SELECT url, size FROM entries ORDER BY last_access')
+        victims = []
+        for url, size in rows:
+            if self.total <= target:
+                break
+            victims.append((url,))
+            self.total -= size
+        self.conn.executemany('DELETE FROM entries WHERE url=?', victims)
+
+    def close(self):
+        with self.lock:
+            if self.accessed:
+                self._write_access()
+            self.conn.close()
+
+_http_cache = None
+_http_cache_lock = threading.Lock()
+
+def get_http_cache() -> Optional[HTTPCache]:
+    """Return the process-wide HTTP cache, or None when HTTP_CACHE_ENABLED is off."""
+    global _http_cache
+    if not settings.HTTP_CACHE_ENABLED:
+        return None
+    with _http_cache_lock:
+        if _http_cache is None:
+            _http_cache = HTTPCache()
+            atexit.register(_http_cache.close)
+        return _http_cache
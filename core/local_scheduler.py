@@ -0,0 +1,327 @@
+import functools
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from multiprocessing.connection import Connection, wait
+from queue import Queue, Empty
+from typing import Callable, Dict, Any, List, Optional
+from config import settings
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)  # transactions are explicit
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+def _claim(conn: sqlite3.Connection, queue_name: str, owner: str) -> Optional[tuple]:
+    """
+    Lease the highest-priority ready task to owner. Leases that have expired
+    (their worker died or hung) are returned to the queue first, and tasks
+    that have used up LOCAL_MAX_ATTEMPTS are parked as 'dead'.
+    """
+    now = time.time()
+    conn.execute('BEGIN IMMEDIATE')  # one claimer at a time across processes
+    try:
+        conn.execute(
+            "UPDATE queue SET state='ready', lease_owner=NULL WHERE queue=? AND state='leased' AND lease_expires<?",
+            (queue_name, now)
+        )
+        conn.execute(
+            "UPDATE queue SET state='dead' WHERE queue=? AND state='ready' AND attempts>=?",
+            (queue_name, settings.LOCAL_MAX_ATTEMPTS)
+        )
+        row = conn.execute(
+            "SELECT id, body FROM queue WHERE queue=? AND state='ready' ORDER BY priority DESC, id LIMIT 1",
+            (queue_name,)
+        ).fetchone()
+        if row:
+            conn.execute(
+                "UPDATE queue SET state='leased', lease_owner=?, lease_expires=?, attempts=attempts+1 WHERE id=?",
+                (owner, now + settings.LOCAL_LEASE_TIME, row[0])
+            )
+        conn.execute('COMMIT')
+        return row
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+def _renew_leases(conn: sqlite3.Connection, leases: List[tuple]):
+    """Push back the expiry of (row id, lease owner) leases that are still being worked on."""
+    expires = time.time() + settings.LOCAL_LEASE_TIME
+    try:
+        conn.executemany("UPDATE queue SET lease_expires=? WHERE id=? AND lease_owner=? AND state='leased'",
+                         [(expires, row_id, owner) for row_id, owner in leases])
+    except sqlite3.Error as e:
+        logger.warning(f"Could not renew leases: {e}")
+
+def _heartbeat(path: str, lease: tuple, done: threading.Event):
+    """Renew lease every LOCAL_LEASE_RENEW_INTERVAL until done is set."""
+    conn = _connect(path)
+    try:
+        while not done.wait(settings.LOCAL_LEASE_RENEW_INTERVAL):
+            _renew_leases(conn, [lease])
+    finally:
+        conn.close()
+
+def _worker_main(path: str, queue_name: str, worker_id: str, crawl_func: Callable, results: Connection,
+                 stop_event):
+    """
+    Runs in a worker process: claim a task, crawl it and send the outcome
+    to the parent over results, this worker's own pipe. The lease is
+    renewed while the crawl runs. A failed task is released here; a
+    finished one stays leased until the parent acks it, once its result
+    has been stored.
+    """
+    conn = _connect(path)
+    while not stop_event.is_set():
+        row = _claim(conn, queue_name, worker_id)
+        if row is None:
+            stop_event.wait(settings.LOCAL_POLL_INTERVAL)
+            continue
+        row_id, body = row
+        task = json.loads(body)
+        logger.info(f"Worker {worker_id} processing: {task['url']}")
+        results.send(('started', task, None, None))
+        done = threading.Event()
+        heartbeat = threading.Thread(target=_heartbeat, args=(path, (row_id, worker_id), done), daemon=True)
+        heartbeat.start()
+        try:
+            result = crawl_func(task['url'], **task.get('kwargs', {}))
+        except Exception as e:
+            logger.error(f"Worker {worker_id} failed: {e}")
+            conn.execute("UPDATE queue SET state='ready', lease_owner=NULL WHERE id=? AND lease_owner=?",
+                         (row_id, worker_id))
+            results.send(('failed', task, str(e), None))
+            continue
+        finally:
+            done.set()
+            heartbeat.join()
+        # Blocks while the parent is behind; from here on the parent renews the lease
+        results.send(('finished', task, result, (row_id, worker_id)))
+    results.close()
+    conn.close()
+
+class LocalScheduler:
+    """
+    Broker-less drop-in for DistributedScheduler. Tasks live in a SQLite
+    queue and are leased to worker processes; a task is released when it
+    fails and deleted (acked) once it is finished and its result stored.
+    Leases are renewed while a task is crawled or its result is being
+    stored; one left unrenewed for LOCAL_LEASE_TIME (its worker crashed) is
+    handed out again, so delivery is at-least-once, as with RabbitMQ. A
+    worker process that dies is replaced.
+    crawl_func must be picklable (a module-level function): it runs in
+    spawned processes. Results travel back to this process over one pipe
+    per worker and into result_sink; a worker blocks while its pipe is
+    full. Separate pipes keep a worker killed mid-send from wedging the
+    others, as it would a shared multiprocessing.Queue.
+    """
+
+    def __init__(self, path: str = None, queue_name: str = settings.RABBITMQ_QUEUE, result_sink=None):
+        self.path = path or settings.LOCAL_QUEUE_FILE
+        self.queue_name = queue_name
+        self.conn = None
+        self.result_sink = result_sink  # storage.ResultSink; without one, results are not stored
+        self.processes: List[multiprocessing.Process] = []
+        self._ctx = multiprocessing.get_context('spawn')
+        self._stop = self._ctx.Event()
+        # Process name (its lease owner) -> read end of its pipe of (kind, task, result or error, lease)
+        self.results: Dict[str, Connection] = {}
+        self._spawned = 0
+
+    def connect(self):
+        """Open the queue database, creating it if needed."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = _connect(self.path)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS queue (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                queue TEXT NOT NULL,
+                body TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                state TEXT NOT NULL DEFAULT 'ready',
+                lease_owner TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_queue_ready ON queue (queue, state, priority DESC, id)')
+
+    def _row(self, url: str, priority: int, kwargs: Dict[str, Any], task_id: Optional[int]) -> tuple:
+        task = {
+            'url': url,
+            'task_id': task_id,
+            'priority': priority,
+            'kwargs': kwargs,
+            'timestamp': time.time()
+        }
+        return self.queue_name, json.dumps(task), priority
+
+    def add_task(self, url: str, priority: int = 5, task_id: int = None, **kwargs):
+        """Submit a crawl task. task_id is its tasks-table row."""
+        self.conn.execute('INSERT INTO queue (queue, body, priority) VALUES (?, ?, ?)',
+                          self._row(url, priority, kwargs, task_id))
+        logger.info(f"Task added: {url}")
+
+    def add_tasks(self, urls: List[str], priority: int = 5, task_ids: List[int] = None, **kwargs):
+        """Submit many crawl tasks in one transaction."""
+        task_ids = task_ids or [None] * len(urls)
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            self.conn.executemany('INSERT INTO queue (queue, body, priority) VALUES (?, ?, ?)',
+                                  [self._row(url, priority, kwargs, task_id) for url, task_id in zip(urls, task_ids)])
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        logger.info(f"{len(urls)} tasks added")
+
+    def start_worker(self, worker_id: str, crawl_func: Callable, concurrency: int = None):
+        """
+        Run `concurrency` worker processes and block until stop() is called.
+        Processes that die are replaced.
+        """
+        concurrency = concurrency or settings.LOCAL_WORKER_PROCESSES or os.cpu_count()
+        self._stop.clear()
+        spawn = functools.partial(self._spawn, worker_id, crawl_func)
+        self.processes = [spawn() for _ in range(concurrency)]
+        logger.info(f"Worker {worker_id} started with {concurrency} processes, waiting for tasks...")
+        try:
+            self._drain_events(spawn)
+        finally:
+            self.stop()
+            for reader in self.results.values():
+                reader.close()
+            self.results = {}
+
+    def _spawn(self, worker_id: str, crawl_func: Callable) -> multiprocessing.Process:
+        # Every process gets its own lease owner (its name), so a replacement never inherits leases
+        owner = f"{worker_id}-{self._spawned}"
+        reader, writer = self._ctx.Pipe(duplex=False)
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(self.path, self.queue_name, owner, crawl_func, writer, self._stop),
+            name=owner,
+            daemon=True
+        )
+        self._spawned += 1
+        process.start()
+        writer.close()  # the worker holds the only write end, so its exit shows up here as EOF
+        self.results[owner] = reader
+        return process
+
+    def _worker_exited(self, owner: str, spawn: Callable[[], multiprocessing.Process], conn: sqlite3.Connection,
+                       storing: set):
+        """
+        Called once everything a worker sent has been read. Unless the
+        scheduler is stopping, the worker died: release the task it was
+        crawling rather than wait for the lease to expire, and start a new
+        process. Results it finished that are still being stored (storing)
+        keep their leases.
+        """
+        self.results.pop(owner).close()
+        processes = self.processes  # stop() may swap the list from another thread
+        process = next((p for p in processes if p.name == owner), None)
+        if process is None or self._stop.is_set():
+            return
+        process.join(settings.LOCAL_POLL_INTERVAL)
+        logger.warning(f"Worker process {owner} died (exit code {process.exitcode}); replacing it")
+        keep = [row_id for row_id, lease_owner in storing if lease_owner == owner]
+        conn.execute(
+            f"UPDATE queue SET state='ready', lease_owner=NULL WHERE lease_owner=? AND state='leased' "
+            f"AND id NOT IN ({','.join('?' * len(keep))})",
+            [owner] + keep
+        )
+        processes[processes.index(process)] = spawn()
+
+    def _drain_events(self, spawn: Callable[[], multiprocessing.Process]):
+        """
+        Pass worker events to the result sink and ack stored results, until
+        stop() is called and every worker has exited.
+        """
+        conn = _connect(self.path)
+        # (stored, (row id, lease owner)), filled by the sink once a result is stored or given up on
+        settled = Queue()
+        storing = set()  # leases of finished tasks whose results the sink has not settled yet
+        renewed = time.monotonic()
+
+        def ack_pending():
+            while True:
+                try:
+                    stored, lease = settled.get_nowait()
+                except Empty:
+                    return
+                storing.discard(lease)
+                if stored:
+                    conn.execute('DELETE FROM queue WHERE id=? AND lease_owner=?', lease)
+                else:
+                    # Hand the task out again; LOCAL_MAX_ATTEMPTS bounds the retries
+                    conn.execute("UPDATE queue SET state='ready', lease_owner=NULL WHERE id=? AND lease_owner=?",
+                                 lease)
+
+        def handle(kind, task, payload, lease):
+            if self.result_sink is None:
+                if lease:
+                    settled.put((True, lease))
+            elif kind == 'started':
+                self.result_sink.started(task)
+            elif kind == 'failed':
+                self.result_sink.failed(task, payload)
+            else:
+                storing.add(lease)
+                self.result_sink.finished(task, payload,
+                                          on_persisted=functools.partial(settled.put, (True, lease)),
+                                          on_not_persisted=functools.partial(settled.put, (False, lease)))
+
+        while self.results or not self._stop.is_set():
+            readers = {reader: owner for owner, reader in self.results.items()}
+            for reader in wait(list(readers), timeout=settings.LOCAL_POLL_INTERVAL):
+                try:
+                    event = reader.recv()
+                except (EOFError, OSError):
+                    # The worker exited, or died partway through a message
+                    self._worker_exited(readers[reader], spawn, conn, storing)
+                    continue
+                handle(*event)
+            for process in list(self.processes):
+                # A dead worker's pipe normally reads EOF, unless a child it started still holds it open
+                reader = self.results.get(process.name)
+                if reader is not None and not process.is_alive() and not reader.poll():
+                    self._worker_exited(process.name, spawn, conn, storing)
+            ack_pending()
+            if storing and time.monotonic() - renewed >= settings.LOCAL_LEASE_RENEW_INTERVAL:
+                _renew_leases(conn, list(storing))
+                renewed = time.monotonic()
+        if self.result_sink:
+            self.result_sink.flush()
+        ack_pending()
+        conn.close()
+
+    def stop(self):
+        """Let worker processes finish their current task and exit."""
+        self._stop.set()
+        for process in self.processes:
+            process.join()
+        self.processes = []
+
+    def close(self):
+        self.stop()
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+def create_scheduler(backend: str = None, **kwargs):
+    """Return a DistributedScheduler ('rabbitmq') or LocalScheduler ('local') per SCHEDULER_BACKEND."""
+    backend = backend or settings.SCHEDULER_BACKEND
+    if backend == 'local':
+        return LocalScheduler(**kwargs)
+    if backend == 'rabbitmq':
+        from core.scheduler import DistributedScheduler  # pika is only needed for this backend
+        return DistributedScheduler(**kwargs)
+    raise ValueError(f"Unknown scheduler backend: {backend}")
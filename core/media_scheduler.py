@@ -0,0 +1,181 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Any
+from urllib.parse import urlparse
+
+from config import settings
+from core.downloader import ResumableDownloader
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Lower runs first: thumbnails and images before large videos
+MEDIA_PRIORITIES = {'image': 0, 'video': 10}
+
+class TokenBucket:
+    """
+    Bandwidth limiter shared by all downloads. consume() may take the bucket
+    into debt; the caller then sleeps until the debt is paid off, so the
+    aggregate rate stays at `rate` bytes/sec however many threads write.
+    """
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount: int):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            debt = -self.tokens
+        if debt > 0:
+            time.sleep(debt / self.rate)
+
+class _MediaJob:
+    def __init__(self, url: str, file_type: str, filename: Optional[str], proxies: Optional[Dict[str, str]]):
+        self.url = url
+        self.file_type = file_type
+        self.filename = filename
+        self.proxies = proxies
+        self.host = urlparse(url).netloc
+        self.future = Future()
+        self.downloaded = 0
+        self.total = 0
+        self.last_event = 0.0
+        self.lock = threading.Lock()
+
+class MediaScheduler:
+    """
+    Downloads media files concurrently through a ResumableDownloader.
+    Jobs run in priority order (images before videos, smaller size hints
+    first) on `workers` threads, with at most `per_host` files per host and
+    an optional global bandwidth limit in bytes/sec. Subscribers receive
+    dict events: state is one of queued, started, progress, finished, failed.
+    """
+
+    def __init__(self, downloader: ResumableDownloader = None, workers: int = None,
+                 per_host: int = None, bandwidth: float = None):
+        self.downloader = downloader or ResumableDownloader()
+        self.workers = workers or settings.MEDIA_DOWNLOAD_WORKERS
+        self.per_host = per_host or settings.MEDIA_DOWNLOAD_PER_HOST
+        bandwidth = settings.MEDIA_BANDWIDTH_LIMIT if bandwidth is None else bandwidth
+        self.bucket = TokenBucket(bandwidth) if bandwidth else None
+        self.heap: List[list] = []  # [priority, size_hint, seq, job]
+        self.counter = itertools.count()
+        self.active_hosts: Dict[str, int] = defaultdict(int)
+        self.cond = threading.Condition()
+        self.subscribers: List[Callable[[Dict[str, Any]], None]] = []
+        self.closed = False
+        self.threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def subscribe(self, callback: Callable[[Dict[str, Any]], None]):
+        """Register callback(event); it is called from download threads."""
+        self.subscribers.append(callback)
+
+    def submit(self, url: str, file_type: str = 'image', filename: str = None,
+               priority: int = None, size_hint: int = None, proxies: Dict[str, str] = None) -> Future:
+        """
+        Queue a download; the Future resolves to the file path or None.
+        proxies is passed to ResumableDownloader.download() to pick the route.
+        """
+        job = _MediaJob(url, file_type, filename, proxies)
+        if priority is None:
+            priority = MEDIA_PRIORITIES.get(file_type, 5)
+        with self.cond:
+            if self.closed:
+                raise RuntimeError('MediaScheduler is shut down')
+            heapq.heappush(self.heap, [priority, size_hint if size_hint is not None else float('inf'),
+                                       next(self.counter), job])
+            self.cond.notify()
+        self._emit(job, 'queued')
+        return job.future
+
+    def submit_many(self, urls: List[str], file_type: str, proxies: Dict[str, str] = None) -> List[Future]:
+        return [self.submit(url, file_type, proxies=proxies) for url in urls]
+
+    def _next_job(self) -> Optional[_MediaJob]:
+        """Pop the best job whose host is under its cap; None once shut down."""
+        with self.cond:
+            while True:
+                if self.closed and not self.heap:
+                    return None
+                skipped, job = [], None
+                while self.heap:
+                    entry = heapq.heappop(self.heap)
+                    if self.active_hosts[entry[-1].host] < self.per_host:
+                        job = entry[-1]
+                        break
+                    skipped.append(entry)
+                for entry in skipped:
+                    heapq.heappush(self.heap, entry)
+                if job is not None:
+                    self.active_hosts[job.host] += 1
+                    return job
+                self.cond.wait()
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            try:
+                self._emit(job, 'started')
+                path = self.downloader.download(job.url, job.filename,
+                                                progress=lambda n, total, job=job: self._on_progress(job, n, total),
+                                                proxies=job.proxies)
+                job.future.set_result(path)
+                self._emit(job, 'finished' if path else 'failed', path=path)
+            except Exception as e:
+                logger.error(f"Media download failed for {job.url}: {e}")
+                job.future.set_exception(e)
+                self._emit(job, 'failed', error=str(e))
+            finally:
+                with self.cond:
+                    self.active_hosts[job.host] -= 1
+                    self.cond.notify_all()
+
+    def _on_progress(self, job: _MediaJob, nbytes: int, total: int):
+        if self.bucket:
+            self.bucket.consume(nbytes)
+        now = time.monotonic()
+        with job.lock:
+            job.downloaded = min(job.downloaded + nbytes, total) if total else job.downloaded + nbytes
+            job.total = total
+            if now - job.last_event < settings.MEDIA_PROGRESS_INTERVAL:
+                return
+            job.last_event = now
+        self._emit(job, 'progress')
+
+    def _emit(self, job: _MediaJob, state: str, **extra):
+        event = {'url': job.url, 'type': job.file_type, 'state': state,
+                 'downloaded': job.downloaded, 'total': job.total}
+        event.update(extra)
+        for callback in list(self.subscribers):
+            try:
+                callback(event)
+            except Exception as e:
+                logger.error(f"Media event subscriber failed: {e}")
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting jobs; finish the queue when wait is True, otherwise drop it."""
+        with self.cond:
+            self.closed = True
+            if not wait:
+                for entry in self.heap:
+                    entry[-1].future.cancel()
+                self.heap.clear()
+            self.cond.notify_all()
+        if wait:
+            for thread in self.threads:
+                thread.join()
@@ -0,0 +1,137 @@
+import atexit
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Tuple, Dict, Any, Optional
+
+from config import settings
+from core.extractor import extract
+from utils.logger import get_logger
+from utils.metrics import STAGE_SECONDS
+
+logger = get_logger(__name__)
+
+def _parse_batch(batch: List[Tuple[str, str]]) -> List[Tuple[Dict[str, Any], float]]:
+    """Runs in a worker process; returns each page's result with its parse time."""
+    results = []
+    for html, url in batch:
+        start = time.perf_counter()
+        results.append((extract(html, url), time.perf_counter() - start))
+    return results
+
+class ParsePool:
+    """
+    Parses HTML on a pool of worker processes so parsing scales past the GIL.
+    Pages are sent in batches of batch_size (or whatever has accumulated
+    after flush_interval seconds) to amortise pickling overhead. At most
+    max_backlog pages may be queued or in progress; submit() blocks beyond
+    that, which pushes back on the fetchers.
+    If a worker process dies (e.g. killed for memory on a huge page), the
+    affected pages fail and the next batch goes to a fresh executor.
+    """
+
+    def __init__(self, processes: int = None, batch_size: int = None, max_backlog: int = None,
+                 flush_interval: float = None):
+        self.processes = processes or settings.PARSE_PROCESSES
+        self.batch_size = batch_size or settings.PARSE_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.PARSE_FLUSH_INTERVAL
+        self.backlog = threading.BoundedSemaphore(max_backlog or settings.PARSE_MAX_BACKLOG)
+        self.executor = self._new_executor()
+        self.broken = False
+        self.lock = threading.Lock()
+        self.batch: List[Tuple[str, str, Future]] = []
+        self.closed = threading.Event()
+        threading.Thread(target=self._flusher, daemon=True).start()
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # spawn: forking a process full of browser and network threads is unsafe
+        return ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context('spawn'))
+
+    def _rebuild_locked(self):
+        """Replace a broken executor. Caller holds the lock."""
+        logger.warning("Parse worker died; restarting the parse pool")
+        self.executor.shutdown(wait=False)
+        self.executor = self._new_executor()
+        self.broken = False
+
+    def submit(self, html: str, url: str) -> Future:
+        """Queue a page for parsing; the Future resolves to the extract() dict."""
+        if self.closed.is_set():
+            raise RuntimeError('ParsePool is shut down')
+        self.backlog.acquire()
+        future = Future()
+        with self.lock:
+            self.batch.append((html, url, future))
+            if len(self.batch) >= self.batch_size:
+                self._flush_locked()
+        return future
+
+    def parse(self, html: str, url: str) -> Dict[str, Any]:
+        """Parse a page on the pool and wait for the result."""
+        return self.submit(html, url).result()
+
+    def _flush_locked(self):
+        """Send the pending batch to a worker. Caller holds the lock."""
+        if not self.batch:
+            return
+        batch, self.batch = self.batch, []
+        if self.broken:
+            self._rebuild_locked()
+        try:
+            job = self.executor.submit(_parse_batch, [(html, url) for html, url, _ in batch])
+        except Exception as e:
+            # Fail the batch rather than orphan its futures and backlog permits
+            self.broken = isinstance(e, BrokenProcessPool)
+            self._fail(batch, e)
+            return
+        job.add_done_callback(lambda done: self._distribute(batch, done))
+
+    def _fail(self, batch: List[Tuple[str, str, Future]], error: BaseException):
+        for _, url, future in batch:
+            logger.error(f"Parse failed for {url}: {error}")
+            future.set_exception(error)
+            self.backlog.release()
+
+    def _distribute(self, batch: List[Tuple[str, str, Future]], done: Future):
+        error = done.exception()
+        if error:
+            if isinstance(error, BrokenProcessPool):
+                self.broken = True  # rebuilt on the next flush; the lock may be held here
+            self._fail(batch, error)
+            return
+        for (_, url, future), (result, elapsed) in zip(batch, done.result()):
+            # Worker-side time only; queueing and pickling are not included
+            STAGE_SECONDS.observe(elapsed, stage='parse', engine='parse_pool')
+            future.set_result(result)
+            self.backlog.release()
+
+    def _flusher(self):
+        while not self.closed.wait(self.flush_interval):
+            try:
+                with self.lock:
+                    self._flush_locked()
+            except Exception as e:
+                logger.error(f"Parse pool flush failed: {e}")
+
+    def shutdown(self):
+        """Parse whatever is queued, then stop the worker processes."""
+        self.closed.set()
+        with self.lock:
+            self._flush_locked()
+        self.executor.shutdown(wait=True)
+
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+def get_parse_pool() -> Optional[ParsePool]:
+    """Return the process-wide parse pool, or None when PARSE_PROCESSES is 0."""
+    global _parse_pool
+    if not settings.PARSE_PROCESSES:
+        return None
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ParsePool()
+            atexit.register(_parse_pool.shutdown)
+        return _parse_pool
@@ -1,7 +1,15 @@
+import asyncio
+import atexit
+import heapq
+import itertools
+import json
+import os
+import aiohttp
 import requests
 import threading
 import time
-from queue import Queue
+from bs4 import BeautifulSoup
+from queue import Queue, Empty
 from datetime import datetime
 from typing import Optional, List, Dict
 from utils.logger import get_logger
@@ -10,13 +18,115 @@ from config import settings
 logger = get_logger(__name__)
 
 class ProxyPool:
+    """
+    Collects, validates and serves proxies.
+    Selection uses stride scheduling over a heap: every proxy advances by
+    1/weight each time it is handed out, so proxies are served in
+    proportion to their weight at O(log n) per pick. The weight grows with
+    the success rate and shrinks with latency, both fed back via report().
+    Counters outlive a proxy's time in the active set, so a benched proxy
+    that comes back keeps its record, and evicted proxies are never
+    re-admitted during this run.
+    """
+
     def __init__(self):
-        self.proxies: List[Dict] = []  # active proxies
-        self.pending = Queue()         # proxies to validate
+        self.proxies: Dict[str, Dict] = {}     # active proxies by address
+        self.stats: Dict[str, Dict] = {}       # every proxy ever activated, active or not
+        self.quarantine: Dict[str, float] = {}  # address -> release time
+        self.evicted = set()                    # addresses dropped for good
+        self.pending = Queue()                  # proxies to validate
+        self._queued = set()                    # addresses in pending or being validated
+        self._pending_lock = threading.Lock()
         self.lock = threading.Lock()
         self.running = True
+        self._heap: List[list] = []             # [pass, seq, address or None]
+        self._seq = itertools.count()
+        self._pass = 0.0                        # virtual time of the last pick
+        self._next_release = float('inf')       # earliest quarantine expiry
+        self.store_file = settings.PROXY_STORE_FILE
+        self._load_store()
         self._start_fetchers()
         self._start_validators()
+        self._start_store_writer()
+        atexit.register(self.stop)  # keep the latest scores, not just the last periodic save
+
+    def _load_store(self):
+        """Warm-start from proxies validated by a previous run, then recheck them in the background."""
+        if not self.store_file or not os.path.exists(self.store_file):
+            return
+        try:
+            with open(self.store_file, 'r') as f:
+                records = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable proxy store {self.store_file}: {e}")
+            return
+        if not isinstance(records, list):
+            logger.warning(f"Ignoring malformed proxy store {self.store_file}")
+            return
+
+        cutoff = time.time() - settings.PROXY_STORE_TTL
+        loaded, skipped = [], 0
+        with self.lock:
+            for record in records:
+                try:
+                    if record['last_verified'] < cutoff:
+                        continue
+                    info = {
+                        'proxy': str(record['proxy']),
+                        'last_verified': datetime.fromtimestamp(record['last_verified']),
+                        'success_count': int(record['success_count']),
+                        'fail_count': int(record['fail_count']),
+                        'fail_streak': 0,
+                        'latency': float(record['latency'])
+                    }
+                except (KeyError, TypeError, ValueError, OverflowError, OSError):
+                    skipped += 1
+                    continue
+                self.proxies[info['proxy']] = info
+                self.stats[info['proxy']] = info
+                self._schedule(info['proxy'], info, self._pass)
+                loaded.append(info['proxy'])
+        if skipped:
+            logger.warning(f"Skipped {skipped} malformed records in {self.store_file}")
+        logger.info(f"Loaded {len(loaded)} proxies from {self.store_file}")
+        self.add_candidates(loaded, recheck=True)
+
+    def save(self):
+        """Write active proxies and their scores to the store file."""
+        if not self.store_file:
+            return
+        with self.lock:
+            records = [{
+                'proxy': info['proxy'],
+                'last_verified': info['last_verified'].timestamp(),
+                'success_count': info['success_count'],
+                'fail_count': info['fail_count'],
+                'latency': info['latency']
+            } for info in self.proxies.values()]
+        tmp_file = f"{self.store_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(records, f)
+        os.replace(tmp_file, self.store_file)  # never leave a half-written store behind
+
+    def _start_store_writer(self):
+        def writer():
+            while self.running:
+                time.sleep(settings.PROXY_STORE_INTERVAL)
+                try:
+                    self.save()
+                except OSError as e:
+                    logger.error(f"Failed to save proxy store: {e}")
+        threading.Thread(target=writer, daemon=True).start()
+
+    def stop(self):
+        """Stop background threads and persist the pool. Runs at exit as well."""
+        if not self.running:
+            return
+        self.running = False
+        try:
+            self.save()
+        except OSError as e:
+            logger.error(f"Failed to save proxy store: {e}")
 
     def _fetch_from_free_proxy_list(self) -> List[str]:
         """Fetch from https://free-proxy-list.net/"""
@@ -55,46 +165,210 @@ class ProxyPool:
                 for source in sources:
                     try:
                         proxies = source()
-                        for proxy in proxies:
-                            self.pending.put(proxy)
+                        self.add_candidates(proxies)
                     except Exception as e:
                         logger.error(f"Proxy fetcher error: {e}")
                 time.sleep(settings.PROXY_REFRESH_INTERVAL)
         threading.Thread(target=fetcher, daemon=True).start()
 
+    def add_candidates(self, proxies: List[str], recheck: bool = False):
+        """
+        Queue proxies for validation, skipping ones already queued, benched
+        or evicted. Active proxies are skipped too unless recheck is set.
+        """
+        with self._pending_lock:
+            for proxy in proxies:
+                if proxy in self._queued or proxy in self.quarantine or proxy in self.evicted:
+                    continue
+                if not recheck and proxy in self.proxies:
+                    continue
+                self._queued.add(proxy)
+                self.pending.put(proxy)
+
+    def _drain_pending(self, limit: int, timeout: float) -> List[str]:
+        """Block up to timeout for one candidate, then take whatever else is queued."""
+        try:
+            batch = [self.pending.get(timeout=timeout)]
+        except Empty:
+            return []
+        while len(batch) < limit:
+            try:
+                batch.append(self.pending.get_nowait())
+            except Empty:
+                break
+        return batch
+
     def _start_validators(self):
-        def validator():
+        threading.Thread(target=lambda: asyncio.run(self._validation_loop()), daemon=True).start()
+
+    async def _validation_loop(self):
+        """Validate candidates concurrently and periodically recheck active proxies."""
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(settings.PROXY_VALIDATION_CONCURRENCY)
+        timeout = aiohttp.ClientTimeout(total=settings.PROXY_TEST_TIMEOUT)
+        # Every check goes through a different proxy, so there is nothing to keep alive
+        connector = aiohttp.TCPConnector(limit=0, force_close=True)
+        last_recheck = time.monotonic()
+        tasks = set()
+
+        async def run(proxy):
+            try:
+                await self._validate_proxy(session, proxy)
+            finally:
+                with self._pending_lock:
+                    self._queued.discard(proxy)
+                slots.release()
+
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
             while self.running:
-                if not self.pending.empty():
-                    proxy = self.pending.get()
-                    if self._validate_proxy(proxy):
-                        with self.lock:
-                            self.proxies.append({
-                                'proxy': proxy,
-                                'last_verified': datetime.now(),
-                                'success_count': 0,
-                                'fail_count': 0
-                            })
-                time.sleep(1)
-        for _ in range(5):
-            threading.Thread(target=validator, daemon=True).start()
-
-    def _validate_proxy(self, proxy: str) -> bool:
+                if time.monotonic() - last_recheck >= settings.PROXY_RECHECK_INTERVAL:
+                    last_recheck = time.monotonic()
+                    with self.lock:
+                        active = list(self.proxies)
+                    self.add_candidates(active, recheck=True)
+
+                batch = await loop.run_in_executor(
+                    None, self._drain_pending, settings.PROXY_VALIDATION_CONCURRENCY, 1.0
+                )
+                for proxy in batch:
+                    await slots.acquire()
+                    task = asyncio.create_task(run(proxy))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+
+            for task in tasks:
+                task.cancel()
+
+    async def _validate_proxy(self, session: aiohttp.ClientSession, proxy: str):
+        """Check proxy against PROXY_TEST_URL and record its round-trip time."""
+        start = time.monotonic()
         try:
-            resp = requests.get(
-                settings.PROXY_TEST_URL,
-                proxies={'http': f'http://{proxy}', 'https': f'http://{proxy}'},
-                timeout=settings.PROXY_TEST_TIMEOUT
-            )
-            return resp.status_code == 200
-        except:
-            return False
+            async with session.get(settings.PROXY_TEST_URL, proxy=f'http://{proxy}') as resp:
+                await resp.read()
+                ok = resp.status == 200
+        except Exception:
+            ok = False
+
+        if ok:
+            self._activate(proxy, time.monotonic() - start)
+        else:
+            self._deactivate(proxy)
+
+    @staticmethod
+    def _weight(info: Dict) -> float:
+        successes, failures = info['success_count'], info['fail_count']
+        success_rate = (successes + 1) / (successes + failures + 2)  # Laplace smoothing
+        return success_rate / max(info['latency'], 0.05)
+
+    def _schedule(self, address: str, info: Dict, start: float):
+        """(Re)insert address into the heap. Caller holds the lock."""
+        entry = [start + 1.0 / self._weight(info), next(self._seq), address]
+        info['heap_entry'] = entry
+        heapq.heappush(self._heap, entry)
+
+    def _unschedule(self, info: Dict):
+        """Lazily drop a heap entry. Caller holds the lock."""
+        entry = info.pop('heap_entry', None)
+        if entry:
+            entry[2] = None
+
+    def _activate(self, proxy: str, latency: float):
+        with self.lock:
+            if proxy in self.evicted:
+                return
+            self.quarantine.pop(proxy, None)
+            info = self.stats.get(proxy)
+            if info is None:
+                info = self.stats[proxy] = {
+                    'proxy': proxy,
+                    'last_verified': datetime.now(),
+                    'success_count': 0,
+                    'fail_count': 0,
+                    'fail_streak': 0,
+                    'latency': latency
+                }
+            else:
+                self._unschedule(info)
+                info['last_verified'] = datetime.now()
+                info['fail_streak'] = 0
+                info['latency'] = latency
+            self.proxies[proxy] = info
+            self._schedule(proxy, info, self._pass)
+
+    def _deactivate(self, proxy: str):
+        """Drop a proxy that failed validation; its failures count towards eviction."""
+        with self.lock:
+            info = self.proxies.pop(proxy, None)
+            if info is not None:
+                self._unschedule(info)
+                logger.info(f"Proxy {proxy} failed revalidation")
+            info = info or self.stats.get(proxy)
+            if info is not None:
+                info['fail_count'] += 1
+                if self._should_evict(info):
+                    self._evict(proxy)
+
+    @staticmethod
+    def _should_evict(info: Dict) -> bool:
+        return info['fail_count'] >= settings.PROXY_EVICT_FAILS and info['fail_count'] > info['success_count']
+
+    def _evict(self, proxy: str):
+        """Drop proxy for the rest of the run. Caller holds the lock."""
+        logger.info(f"Evicting proxy {proxy}")
+        self.evicted.add(proxy)
+        self.quarantine.pop(proxy, None)
+        self.stats.pop(proxy, None)
+
+    def _release_quarantine(self):
+        """Send proxies whose quarantine expired back for revalidation. Caller holds the lock."""
+        now = time.monotonic()
+        released = [p for p, until in self.quarantine.items() if until <= now]
+        for proxy in released:
+            del self.quarantine[proxy]
+        self.add_candidates(released)
+        self._next_release = min(self.quarantine.values(), default=float('inf'))
 
     def get_proxy(self) -> Optional[str]:
         with self.lock:
-            if not self.proxies:
-                return None
-            # Simple round-robin
-            proxy = self.proxies.pop(0)
-            self.proxies.append(proxy)
-            return proxy['proxy']
+            if time.monotonic() >= self._next_release:
+                self._release_quarantine()
+            while self._heap:
+                entry = self._heap[0]
+                address = entry[2]
+                if address is None:
+                    heapq.heappop(self._heap)
+                    continue
+                info = self.proxies[address]
+                self._pass = entry[0]
+                heapq.heappop(self._heap)
+                self._schedule(address, info, self._pass)
+                return address
+            return None
+
+    def report(self, proxy: str, success: bool, latency: float = None):
+        """Record the outcome of a request made through proxy."""
+        with self.lock:
+            info = self.proxies.get(proxy)
+            if info is None:
+                return
+            if success:
+                info['success_count'] += 1
+                info['fail_streak'] = 0
+                if latency is not None:
+                    alpha = settings.PROXY_LATENCY_EWMA
+                    info['latency'] = alpha * latency + (1 - alpha) * info['latency']
+            else:
+                info['fail_count'] += 1
+                info['fail_streak'] += 1
+
+            if info['fail_streak'] >= settings.PROXY_QUARANTINE_STREAK:
+                self._unschedule(info)
+                del self.proxies[proxy]
+                if self._should_evict(info):
+                    self._evict(proxy)
+                else:
+                    logger.info(f"Quarantining proxy {proxy}")
+                    until = time.monotonic() + settings.PROXY_QUARANTINE_TIME
+                    self.quarantine[proxy] = until
+                    self._next_release = min(self._next_release, until)
+            # New weights take effect at the proxy's next pick; no reheap needed
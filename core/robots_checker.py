@@ -1,35 +1,152 @@
 from urllib.robotparser import RobotFileParser
 from urllib.parse import urlparse
+from collections import OrderedDict
+from typing import Callable, Optional, Dict
+import atexit
+import json
+import os
+import threading
+import time
 import requests
 from utils.logger import get_logger
 from config import settings
 
 logger = get_logger(__name__)
 
-class RobotsChecker:
-    def __init__(self):
-        self.cache = {}
+class RobotsCache:
+    """
+    LRU cache of parsed robots.txt files with per-entry expiry.
+    Only one thread fetches a given host at a time; others wait for it.
+    A None parser means robots.txt could not be fetched (allow all).
+    """
 
-    def _get_parser(self, base_url: str) -> RobotFileParser:
-        """Retrieve or create a RobotFileParser for the domain."""
-        if base_url in self.cache:
-            return self.cache[base_url]
+    def __init__(self, max_size: int = None, ttl: float = None, error_ttl: float = None,
+                 persist_file: str = None):
+        self.max_size = max_size or settings.ROBOTS_CACHE_SIZE
+        self.ttl = ttl or settings.ROBOTS_CACHE_TTL
+        self.error_ttl = error_ttl or settings.ROBOTS_ERROR_TTL
+        self.persist_file = persist_file
+        self.entries: OrderedDict = OrderedDict()  # base_url -> {'expires', 'text', 'parser'}
+        self.lock = threading.Lock()
+        self._inflight: Dict[str, threading.Event] = {}
+        if persist_file:
+            self._load()
 
+    @staticmethod
+    def _make_parser(base_url: str, text: Optional[str]) -> Optional[RobotFileParser]:
+        if text is None:
+            return None
         parser = RobotFileParser()
+        parser.set_url(f"{base_url}/robots.txt")
+        parser.parse(text.splitlines())
+        return parser
+
+    def _store(self, base_url: str, text: Optional[str], expires: float):
+        """Insert an entry and evict the least recently used. Caller holds the lock."""
+        self.entries[base_url] = {
+            'expires': expires,
+            'text': text,
+            'parser': self._make_parser(base_url, text)
+        }
+        self.entries.move_to_end(base_url)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def get(self, base_url: str, fetch: Callable[[str], Optional[str]]) -> Optional[RobotFileParser]:
+        """
+        Return the parser for base_url, calling fetch(base_url) on a miss.
+        fetch returns the robots.txt text, or None if it is unavailable.
+        """
+        while True:
+            with self.lock:
+                entry = self.entries.get(base_url)
+                if entry and entry['expires'] > time.time():
+                    self.entries.move_to_end(base_url)
+                    return entry['parser']
+                event = self._inflight.get(base_url)
+                if event is None:
+                    event = self._inflight[base_url] = threading.Event()
+                    break
+            event.wait()
+
+        text = None
+        try:
+            text = fetch(base_url)
+        finally:
+            ttl = self.ttl if text is not None else self.error_ttl
+            with self.lock:
+                self._store(base_url, text, time.time() + ttl)
+                parser = self.entries[base_url]['parser']
+                del self._inflight[base_url]
+            event.set()
+        return parser
+
+    def _load(self):
+        if not os.path.exists(self.persist_file):
+            return
+        try:
+            with open(self.persist_file, 'r') as f:
+                records = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable robots cache {self.persist_file}: {e}")
+            return
+        now = time.time()
+        with self.lock:
+            for base_url, record in records.items():
+                if record['expires'] > now:
+                    self._store(base_url, record['text'], record['expires'])
+
+    def save(self):
+        """Write unexpired entries to persist_file."""
+        if not self.persist_file:
+            return
+        now = time.time()
+        with self.lock:
+            records = {
+                base_url: {'expires': entry['expires'], 'text': entry['text']}
+                for base_url, entry in self.entries.items() if entry['expires'] > now
+            }
+        tmp_file = f"{self.persist_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(records, f)
+        os.replace(tmp_file, self.persist_file)
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+def get_shared_cache() -> RobotsCache:
+    """Return the process-wide robots.txt cache."""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = RobotsCache(persist_file=settings.ROBOTS_CACHE_FILE)
+            if settings.ROBOTS_CACHE_FILE:
+                atexit.register(_shared_cache.save)
+        return _shared_cache
+
+class RobotsChecker:
+    def __init__(self, fetcher: Callable[[str], requests.Response] = None, cache: RobotsCache = None):
+        # fetcher(url) -> Response; lets robots.txt travel the same route as the crawl
+        self.fetcher = fetcher or (lambda url: requests.get(url, timeout=settings.REQUEST_TIMEOUT))
+        self.cache = cache or get_shared_cache()
+
+    def _fetch_robots(self, base_url: str) -> Optional[str]:
+        """Return robots.txt text ('' if there is none), or None if it can't be retrieved."""
         robots_url = f"{base_url}/robots.txt"
-        parser.set_url(robots_url)
         try:
-            resp = requests.get(robots_url, timeout=settings.REQUEST_TIMEOUT)
-            if resp.status_code in (200, 404):
-                parser.parse(resp.text.splitlines())
-            else:
-                parser = None
+            resp = self.fetcher(robots_url)
+            if resp.status_code == 200:
+                return resp.text
+            if resp.status_code == 404:
+                return ''
+            return None
         except Exception as e:
             logger.warning(f"Failed to fetch robots.txt from {robots_url}: {e}")
-            parser = None
+            return None
 
-        self.cache[base_url] = parser
-        return parser
+    def _get_parser(self, base_url: str) -> Optional[RobotFileParser]:
+        """Retrieve or create a RobotFileParser for the domain."""
+        return self.cache.get(base_url, self._fetch_robots)
 
     def check(self, url: str, user_agent: str = '*') -> bool:
         """Return True if allowed, False if disallowed or no parser."""
@@ -0,0 +1,164 @@
+import asyncio
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional, Dict
+from urllib.parse import urlparse
+
+from config import settings
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+BACKOFF_STATUSES = {429, 503}
+
+class RetryableResponse(Exception):
+    """A response worth retrying (429/5xx); carries the server's Retry-After, if any."""
+
+    def __init__(self, url: str, status: int, retry_after: float = None):
+        super().__init__(f"HTTP {status} for {url}")
+        self.url = url
+        self.status = status
+        self.retry_after = retry_after
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Return seconds to wait from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class AutoThrottle:
+    """
+    Per-host politeness layer.
+    Each host has a delay between request starts and a concurrency limit.
+    The delay tracks latency / target_concurrency, as in Scrapy's
+    AutoThrottle, but never drops below min_delay (CRAWL_DELAY by default,
+    like Scrapy's DOWNLOAD_DELAY). The limit grows by one after a run of
+    clean responses and halves on 429/503. Retry-After pushes back the
+    host's next slot.
+    """
+
+    def __init__(self, start_delay: float = None, min_delay: float = None, max_delay: float = None,
+                 target_concurrency: float = None, max_concurrency: int = None):
+        self.min_delay = settings.AUTOTHROTTLE_MIN_DELAY if min_delay is None else min_delay
+        self.start_delay = max(self.min_delay, settings.CRAWL_DELAY if start_delay is None else start_delay)
+        self.max_delay = max_delay or settings.AUTOTHROTTLE_MAX_DELAY
+        self.target_concurrency = target_concurrency or settings.AUTOTHROTTLE_TARGET_CONCURRENCY
+        self.max_concurrency = max_concurrency or settings.MAX_CONCURRENT_PER_HOST
+        self.hosts: Dict[str, Dict] = {}
+        self.lock = threading.Lock()
+        self.cond = threading.Condition(self.lock)
+
+    def _host(self, url: str) -> Dict:
+        """Return the state for url's host. Caller holds the lock."""
+        host = urlparse(url).netloc
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = {
+                'delay': self.start_delay,
+                'next_slot': 0.0,
+                'concurrency': 1,
+                'active': 0,
+                'clean_streak': 0
+            }
+        return state
+
+    def _claim(self, url: str) -> Optional[float]:
+        """Claim a slot for url's host. Caller holds the lock."""
+        state = self._host(url)
+        if state['active'] >= state['concurrency']:
+            return None
+        now = time.monotonic()
+        start = max(now, state['next_slot'])
+        state['next_slot'] = start + state['delay']
+        state['active'] += 1
+        return start - now
+
+    def try_acquire(self, url: str) -> Optional[float]:
+        """
+        Claim a request slot for url's host without blocking.
+        Returns the seconds to sleep before sending, or None if the host is
+        at its concurrency limit.
+        """
+        with self.lock:
+            return self._claim(url)
+
+    def acquire(self, url: str):
+        """Block until a request to url may be sent."""
+        with self.cond:
+            wait = self._claim(url)
+            while wait is None:
+                self.cond.wait(timeout=1.0)
+                wait = self._claim(url)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, url: str):
+        """Asyncio counterpart of acquire()."""
+        while True:
+            wait = self.try_acquire(url)
+            if wait is not None:
+                break
+            await asyncio.sleep(0.05)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def release(self, url: str, latency: float = None, status: int = None, retry_after: float = None):
+        """Return the slot taken by acquire() and adapt to how the request went."""
+        with self.cond:
+            state = self._host(url)
+            state['active'] = max(0, state['active'] - 1)
+
+            if status in BACKOFF_STATUSES:
+                state['delay'] = min(self.max_delay, max(state['delay'], self.min_delay, 0.5) * 2)
+                state['concurrency'] = max(1, state['concurrency'] // 2)
+                state['clean_streak'] = 0
+                if retry_after:
+                    state['next_slot'] = max(state['next_slot'], time.monotonic() + retry_after)
+                logger.info(f"Backing off {urlparse(url).netloc}: delay {state['delay']:.2f}s, "
+                            f"concurrency {state['concurrency']}")
+            elif latency is not None:
+                target = latency / self.target_concurrency
+                new_delay = (state['delay'] + target) / 2
+                if status is not None and status >= 400:
+                    new_delay = max(new_delay, state['delay'])  # errors never speed us up
+                else:
+                    state['clean_streak'] += 1
+                    if state['clean_streak'] >= state['concurrency'] * 4:
+                        state['concurrency'] = min(self.max_concurrency, state['concurrency'] + 1)
+                        state['clean_streak'] = 0
+                state['delay'] = min(self.max_delay, max(self.min_delay, new_delay))
+            self.cond.notify_all()
+
+    def export_state(self) -> Dict[str, Dict]:
+        """Return the learned per-host delay and concurrency, JSON-serialisable."""
+        with self.lock:
+            return {host: {'delay': state['delay'], 'concurrency': state['concurrency']}
+                    for host, state in self.hosts.items()}
+
+    def load_state(self, hosts: Dict[str, Dict]):
+        """Restore state from export_state(), e.g. when resuming a crawl."""
+        with self.cond:
+            for host, saved in hosts.items():
+                state = self._host(f"//{host}")
+                state['delay'] = min(self.max_delay, max(self.min_delay, saved['delay']))
+                state['concurrency'] = max(1, min(self.max_concurrency, saved['concurrency']))
+
+_throttle = None
+_throttle_lock = threading.Lock()
+
+def get_throttle() -> AutoThrottle:
+    """Return the process-wide throttle shared by all crawlers."""
+    global _throttle
+    with _throttle_lock:
+        if _throttle is None:
+            _throttle = AutoThrottle()
+        return _throttle
@@ -1,34 +1,76 @@
 import stem.process
-from stem.control import Controller
-from stem import Signal
+from stem.control import Controller, EventType
+from stem import Signal, CircStatus
 import requests
 import socks
 import socket
+import itertools
+import secrets
+import shutil
+import tempfile
+import threading
 import time
+from functools import partial
+from config import settings
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
 class TorManager:
-    def __init__(self, socks_port=9050, control_port=9051, password=None):
+    def __init__(self, socks_port=9050, control_port=9051, password=None,
+                 instances=None, isolate_streams=None, circuits_per_instance=None):
         self.socks_port = socks_port
         self.control_port = control_port
         self.password = password
-        self.tor_process = None
+        # Circuit pool: several Tor processes and/or SOCKS-auth stream isolation
+        self.instances = instances or settings.TOR_INSTANCES
+        self.isolate_streams = settings.TOR_ISOLATE_STREAMS if isolate_streams is None else isolate_streams
+        self.circuits_per_instance = circuits_per_instance or settings.TOR_CIRCUITS_PER_INSTANCE
+        self.tor_processes = []
+        self.data_dirs = []  # per-instance state directories we created
         self.session = None
+        self.sessions = []
+        self._session_cycle = None
+        self._session_lock = threading.Lock()
+        # Persistent control connections and pending NEWNYM bookkeeping
+        self._controllers = {}
+        self._control_lock = threading.RLock()
+        self._newnym_timers = {}
+        self._awaiting_circuit = {}
+        self._newnym_sent = {}      # index -> time the last NEWNYM was acknowledged
+        self._fresh_circuits = {}   # index -> ids of circuits launched after that NEWNYM
+
+    @property
+    def pool_mode(self) -> bool:
+        """True when traffic is spread over several circuits."""
+        return self.instances > 1 or self.isolate_streams
+
+    def _ports(self, index):
+        """Return (socks_port, control_port) for the index-th Tor instance."""
+        offset = index * settings.TOR_PORT_STRIDE
+        return self.socks_port + offset, self.control_port + offset
 
     def start_tor(self):
-        """Launch a Tor process."""
-        logger.info("Starting Tor...")
-        self.tor_process = stem.process.launch_tor_with_config(
-            config={
-                'SocksPort': str(self.socks_port),
-                'ControlPort': str(self.control_port),
+        """Launch the Tor process(es)."""
+        logger.info(f"Starting Tor ({self.instances} instance(s))...")
+        for index in range(self.instances):
+            socks_port, control_port = self._ports(index)
+            config = {
+                'SocksPort': f'{socks_port} IsolateSOCKSAuth',
+                'ControlPort': str(control_port),
                 'CookieAuthentication': '1' if not self.password else '0',
-                'HashedControlPassword': self._hash_password(self.password) if self.password else None
-            },
-            init_msg_handler=self._print_bootstrap_lines
-        )
+            }
+            if self.password:
+                config['HashedControlPassword'] = self._hash_password(self.password)
+            if self.instances > 1:
+                # Each Tor process needs its own state directory
+                data_dir = tempfile.mkdtemp(prefix=f'netspider-tor-{index}-')
+                self.data_dirs.append(data_dir)
+                config['DataDirectory'] = data_dir
+            self.tor_processes.append(stem.process.launch_tor_with_config(
+                config=config,
+                init_msg_handler=self._print_bootstrap_lines
+            ))
         logger.info("Tor started successfully.")
 
     def _print_bootstrap_lines(self, line):
@@ -39,19 +81,127 @@ class TorManager:
         from stem.util import conf
         return conf.get_config().get('HashedControlPassword', None)  # Simplified; real hashing omitted
 
-    def renew_identity(self):
-        """Request a new Tor circuit (new IP)."""
-        with Controller.from_port(port=self.control_port) as controller:
-            if self.password:
-                controller.authenticate(password=self.password)
-            else:
-                controller.authenticate()
-            controller.signal(Signal.NEWNYM)
-            logger.info("Tor identity renewed.")
-            time.sleep(5)  # Allow circuit to establish
+    def _get_controller(self, index=0):
+        """Return the authenticated control connection for an instance, opening it once."""
+        with self._control_lock:
+            controller = self._controllers.get(index)
+            if controller is None or not controller.is_alive():
+                _, control_port = self._ports(index)
+                controller = Controller.from_port(port=control_port)
+                if self.password:
+                    controller.authenticate(password=self.password)
+                else:
+                    controller.authenticate()
+                controller.add_event_listener(partial(self._on_circuit_event, index), EventType.CIRC)
+                self._controllers[index] = controller
+            return controller
+
+    def _on_circuit_event(self, index, event):
+        """
+        Called from stem's event thread; resolves renewals once a fresh circuit
+        is built. Only circuits launched after the NEWNYM was acknowledged
+        count: ones already being built when it was sent finish with the old
+        identity's state.
+        """
+        with self._control_lock:
+            sent_at = self._newnym_sent.get(index)
+            if sent_at is None or index in self._newnym_timers:
+                return  # NEWNYM for this instance has not been sent yet
+            if event.status == CircStatus.LAUNCHED:
+                arrived_at = getattr(event, 'arrived_at', None)
+                if arrived_at is None or arrived_at >= sent_at:
+                    self._fresh_circuits.setdefault(index, set()).add(event.id)
+                return
+            if event.status != CircStatus.BUILT or event.id not in self._fresh_circuits.get(index, ()):
+                return
+            callbacks = self._awaiting_circuit.pop(index, [])
+        for callback in callbacks:
+            callback()
+
+    def _send_newnym(self, index):
+        with self._control_lock:
+            self._newnym_timers.pop(index, None)
+            try:
+                self._get_controller(index).signal(Signal.NEWNYM)
+            except Exception as e:
+                logger.error(f"NEWNYM failed on Tor instance {index}: {e}")
+                return
+            # Events are handled under this lock, so none is judged against the old time
+            self._newnym_sent[index] = time.time()
+            self._fresh_circuits[index] = set()
+        logger.info(f"Tor identity renewed (instance {index}).")
+
+    def renew_identity(self, wait=False, timeout=None):
+        """
+        Request new Tor circuits (new IP) without blocking the caller.
+        Returns a threading.Event that is set once every instance has built
+        a fresh circuit. Requests already in flight keep their old circuits.
+        Tor rate-limits NEWNYM, so a signal sent too early is deferred
+        rather than dropped. With wait=True the call blocks for at most
+        timeout seconds (TOR_RENEW_TIMEOUT by default).
+        """
+        ready = threading.Event()
+        remaining = [self.instances]
+        counter_lock = threading.Lock()
+
+        def circuit_built():
+            with counter_lock:
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    ready.set()
+
+        for index in range(self.instances):
+            with self._control_lock:
+                self._awaiting_circuit.setdefault(index, []).append(circuit_built)
+                if index in self._newnym_timers:
+                    continue  # coalesce with the NEWNYM already scheduled
+                delay = self._get_controller(index).get_newnym_wait()
+                if delay > 0:
+                    timer = threading.Timer(delay, self._send_newnym, args=(index,))
+                    timer.daemon = True
+                    self._newnym_timers[index] = timer
+                    timer.start()
+                    continue
+                # Sent under the lock, so no circuit event slips in between registering and sending
+                self._send_newnym(index)
+
+        if self.isolate_streams:
+            # Fresh SOCKS credentials move new requests onto new circuits immediately
+            with self._session_lock:
+                self.sessions = self._build_circuit_sessions()
+                self._session_cycle = itertools.cycle(self.sessions)
+
+        if wait and not ready.wait(timeout or settings.TOR_RENEW_TIMEOUT):
+            logger.warning("Timed out waiting for fresh Tor circuits.")
+        return ready
+
+    def _build_circuit_sessions(self):
+        """One Session per circuit, each with its own connection pool."""
+        sessions = []
+        token = secrets.token_hex(4)
+        slots = self.circuits_per_instance if self.isolate_streams else 1
+        for index in range(self.instances):
+            socks_port, _ = self._ports(index)
+            for slot in range(slots):
+                # Tor isolates streams whose SOCKS credentials differ
+                proxy = f'socks5h://circuit{slot}-{token}:x@127.0.0.1:{socks_port}'
+                session = requests.Session()
+                session.proxies = {'http': proxy, 'https': proxy}
+                sessions.append(session)
+        return sessions
 
     def get_tor_session(self):
-        """Return a requests Session configured to use Tor."""
+        """
+        Return a requests Session configured to use Tor.
+        In pool mode each call hands out the next circuit's session in turn.
+        """
+        if self.pool_mode:
+            with self._session_lock:
+                if not self.sessions:
+                    self.sessions = self._build_circuit_sessions()
+                    self._session_cycle = itertools.cycle(self.sessions)
+                return next(self._session_cycle)
+
         if not self.session:
             self.session = requests.Session()
             self.session.proxies = {
@@ -64,8 +214,26 @@ class TorManager:
         return self.session
 
     def stop_tor(self):
-        """Terminate the Tor process."""
-        if self.tor_process:
-            self.tor_process.kill()
-            self.tor_process = None
+        """Terminate the Tor process(es)."""
+        with self._control_lock:
+            for timer in self._newnym_timers.values():
+                timer.cancel()
+            self._newnym_timers = {}
+            self._awaiting_circuit = {}
+            self._newnym_sent = {}
+            self._fresh_circuits = {}
+            for controller in self._controllers.values():
+                controller.close()
+            self._controllers = {}
+        if self.tor_processes:
+            for process in self.tor_processes:
+                process.kill()
+                process.wait()  # Tor must be gone before its state directory is removed
+            self.tor_processes = []
             logger.info("Tor stopped.")
+        for data_dir in self.data_dirs:
+            shutil.rmtree(data_dir, ignore_errors=True)
+        self.data_dirs = []
+        for session in self.sessions:
+            session.close()
+        self.sessions = []
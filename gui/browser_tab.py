@@ -1,4 +1,5 @@
 import customtkinter as ctk
+import os
 import threading
 from tkinter import messagebox
 from utils.logger import get_logger
@@ -10,6 +11,7 @@ class BrowserTab(ctk.CTkFrame):
         super().__init__(parent)
         self.main = main_window
         self._build()
+        self.main.media_scheduler.subscribe(self._on_media_event)
 
     def _build(self):
         # Address bar
@@ -96,16 +98,20 @@ class BrowserTab(ctk.CTkFrame):
             self.result_text.delete("1.0", "end")
             self.result_text.insert("1.0", result.get("text", ""))
 
-            # Download media
-            if result.get("images"):
-                self.status_var.set(f"Downloading {len(result['images'])} images...")
-                downloader = self.main.downloader if hasattr(self.main, 'downloader') else None
-                # Not implemented fully; placeholder
-                logger.info(f"Images: {result['images']}")
-
-            if result.get("videos"):
-                self.status_var.set(f"Downloading {len(result['videos'])} videos...")
-                logger.info(f"Videos: {result['videos']}")
+            # Download media in the background, over the same route as the page
+            images, videos = result.get("images") or [], result.get("videos") or []
+            proxies = crawler.media_proxies() if images or videos else None
+            if proxies is None and (crawler.tor_manager or crawler.proxy_pool) and (images or videos):
+                # A direct download would reveal our address to the site we just crawled anonymously
+                logger.warning(f"No proxy available; not downloading media from {url}")
+                self.status_var.set(f"Crawl completed. {len(images)} images, {len(videos)} videos "
+                                    f"not downloaded: no proxy available.")
+                return
+            self.main.media_scheduler.submit_many(images, 'image', proxies)
+            self.main.media_scheduler.submit_many(videos, 'video', proxies)
+            if images or videos:
+                self.status_var.set(f"Crawl completed. Downloading {len(images)} images, {len(videos)} videos...")
+                return
 
             self.status_var.set("Crawl completed.")
         except Exception as e:
@@ -114,3 +120,16 @@ class BrowserTab(ctk.CTkFrame):
         finally:
             self.progress.stop()
             self.go_button.configure(state="normal")
+
+    def _on_media_event(self, event):
+        # Called from download threads; Tk widgets must be touched on the main loop
+        self.after(0, self._show_media_event, event)
+
+    def _show_media_event(self, event):
+        name = os.path.basename(event['url'].split('?')[0]) or event['url']
+        if event['state'] == 'progress' and event['total']:
+            self.status_var.set(f"Downloading {name}: {100 * event['downloaded'] // event['total']}%")
+        elif event['state'] == 'finished':
+            self.status_var.set(f"Downloaded {name}")
+        elif event['state'] == 'failed':
+            self.status_var.set(f"Download failed: {name}")
@@ -9,7 +9,9 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from gui.main_window import MainWindow
+from utils.metrics import start_exporters
 
 if __name__ == "__main__":
+    start_exporters()
     app = MainWindow()
     app.mainloop()
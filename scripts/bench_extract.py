@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Compare the lxml single-pass extractor with the BeautifulSoup path.
+
+    python scripts/bench_extract.py [page.html ...]
+
+Without arguments a synthetic media-heavy page is used.
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.extractor import extract, extract_bs4
+
+def synthetic_page(blocks: int = 2000) -> str:
+    parts = ['<html><head><title>Benchmark</title><style>p {color: red}</style></head><body>']
+    for i in range(blocks):
+        parts.append(
+            f'<div class="item"><h2>Item {i}</h2><p>Some <b>bold</b> text for item {i}.</p>'
+            f'<img src="/img/{i}.jpg"><a href="/page/{i}#top">more</a>'
+            f'<video src="/v/{i}.mp4"><source src="/v/{i}.webm"></video>'
+            f'<script>var x{i} = {i};</script><!-- comment {i} --></div>'
+        )
+    parts.append('</body></html>')
+    return ''.join(parts)
+
+def bench(func, html: str, base_url: str, rounds: int):
+    func(html, base_url)  # warm up
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(html, base_url)
+    elapsed = (time.perf_counter() - start) / rounds
+
+    tracemalloc.start()
+    func(html, base_url)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+def main():
+    if len(sys.argv) > 1:
+        pages = []
+        for path in sys.argv[1:]:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                pages.append((path, f.read()))
+    else:
+        pages = [('synthetic', synthetic_page())]
+
+    base_url = 'http://example.com/'
+    for name, html in pages:
+        fast, slow = extract(html, base_url), extract_bs4(html, base_url)
+        same = all(
+            sorted(fast[key]) == sorted(slow[key]) if isinstance(fast[key], list) else fast[key] == slow[key]
+            for key in fast
+        )
+        print(f"{name}: {len(html) / 1024:.0f} KiB, outputs identical: {same}")
+        for label, func in (('lxml single-pass', extract), ('BeautifulSoup', extract_bs4)):
+            elapsed, peak = bench(func, html, base_url, rounds=10)
+            print(f"  {label:<17} {elapsed * 1000:8.1f} ms/page  peak {peak / 1024 / 1024:6.1f} MiB")
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 from .database import Database
 from .file_manager import FileManager
 from .exporters import Exporter
+from .result_sink import ResultSink
 
-__all__ = ['Database', 'FileManager', 'Exporter']
+__all__ = ['Database', 'FileManager', 'Exporter', 'ResultSink']
@@ -1,19 +1,110 @@
 import sqlite3
 import json
+import atexit
+import hashlib
+import threading
+import time
+import zlib
 from datetime import datetime
+from queue import Queue, Empty
 from typing import Optional, List, Dict
 from config import settings
+from storage.near_duplicate import SimHashIndex, simhash, to_signed, to_unsigned
 from utils.logger import get_logger
+from utils.metrics import STAGE_SECONDS, DB_ROWS
 
 logger = get_logger(__name__)
 
+try:
+    import zstandard
+    _zstd_compressor = zstandard.ZstdCompressor(level=settings.CONTENT_ZSTD_LEVEL)
+    _zstd_decompressor = zstandard.ZstdDecompressor()
+except ImportError:
+    zstandard = None
+
+_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',    # durable at checkpoints; no fsync per commit in WAL mode
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-65536',     # 64 MiB page cache
+    'PRAGMA mmap_size=268435456',   # 256 MiB memory-mapped reads
+)
+
+_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status)',
+    'CREATE INDEX IF NOT EXISTS idx_tasks_url ON tasks (url)',
+    'CREATE INDEX IF NOT EXISTS idx_contents_url ON contents (url)',
+    'CREATE INDEX IF NOT EXISTS idx_contents_task ON contents (task_id)',
+    'CREATE INDEX IF NOT EXISTS idx_media_url ON media (url)',
+    'CREATE INDEX IF NOT EXISTS idx_media_files_sha256 ON media_files (sha256)',
+    'CREATE INDEX IF NOT EXISTS idx_media_files_path ON media_files (local_path)',
+)
+
+_CONTENT_COLUMNS = 'id, task_id, url, title, text, html, text_hash, html_hash, extracted_at, near_dup_of'
+_INSERT_BLOB = 'INSERT OR IGNORE INTO blobs (hash, codec, size, data) VALUES (?, ?, ?, ?)'
+
+def _compress(data: bytes):
+    """Return (codec, payload) using zstd when it is installed, zlib otherwise."""
+    if zstandard is not None:
+        return 'zstd', _zstd_compressor.compress(data)
+    return 'zlib', zlib.compress(data, settings.CONTENT_ZLIB_LEVEL)
+
+def _decompress(codec: str, payload: bytes) -> bytes:
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('zstandard is required to read this blob')
+        return _zstd_decompressor.decompress(payload)
+    if codec == 'zlib':
+        return zlib.decompress(payload)
+    return payload
+
 class Database:
-    def __init__(self, db_url: str = settings.DATABASE_URL):
+    """
+    SQLite storage for tasks, page contents and media.
+    Each thread reuses one connection. Status updates and content/media
+    rows are queued and written by a background thread, which groups them
+    into executemany() transactions. Call flush() to wait for queued
+    writes, and close() to flush and release the connections (this also
+    runs at exit).
+    """
+
+    def __init__(self, db_url: str = settings.DATABASE_URL, batch_size: int = None,
+                 flush_interval: float = None):
         self.db_url = db_url.replace('sqlite:///', '')  # strip prefix
+        self.batch_size = batch_size or settings.DB_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.DB_FLUSH_INTERVAL
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
         self._init_db()
+        self._near_dups = None
+        self._near_dups_lock = threading.Lock()
+
+        self._writes = Queue(maxsize=settings.DB_WRITE_QUEUE_SIZE)
+        self._closed = False
+        self._failed_writes: Dict[int, int] = {}  # thread id -> its rows dropped since its last flush(); writer only
+        self._writer = threading.Thread(target=self._writer_loop, name='db-writer', daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_url, timeout=30, check_same_thread=False)
+        for pragma in _PRAGMAS:
+            conn.execute(pragma)
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
+
+    def _conn(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
 
     def _init_db(self):
-        with sqlite3.connect(self.db_url) as conn:
+        conn = self._conn()
+        with conn:
             c = conn.cursor()
             c.execute('''
                 CREATE TABLE IF NOT EXISTS tasks (
@@ -51,38 +142,294 @@ class Database:
                     FOREIGN KEY (task_id) REFERENCES tasks (id)
                 )
             ''')
-            conn.commit()
+            # Page bodies, compressed and stored once per distinct content
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS blobs (
+                    hash TEXT PRIMARY KEY,
+                    codec TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    data BLOB NOT NULL
+                ) WITHOUT ROWID
+            ''')
+            # One row per media URL: where it is stored, its content hash and cache validators
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS media_files (
+                    url TEXT PRIMARY KEY,
+                    sha256 TEXT NOT NULL,
+                    local_path TEXT NOT NULL,
+                    size INTEGER,
+                    etag TEXT,
+                    last_modified TEXT,
+                    downloaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            columns = {row[1] for row in c.execute('PRAGMA table_info(contents)')}
+            for column, column_type in (('text_hash', 'TEXT'), ('html_hash', 'TEXT'),
+                                        ('simhash', 'INTEGER'), ('near_dup_of', 'TEXT')):
+                if column not in columns:
+                    c.execute(f'ALTER TABLE contents ADD COLUMN {column} {column_type}')
+            if 'sha256' not in {row[1] for row in c.execute('PRAGMA table_info(media)')}:
+                c.execute('ALTER TABLE media ADD COLUMN sha256 TEXT')
+            for index in _INDEXES:
+                c.execute(index)
+
+    # Background writer
+
+    def _enqueue(self, sql: str, params: tuple):
+        if self._closed:
+            raise RuntimeError('Database is closed')
+        self._writes.put((sql, params, threading.get_ident()))  # blocks when the writer falls behind
+
+    def _writer_loop(self):
+        conn = self._connect()
+        while True:
+            try:
+                item = self._writes.get(timeout=self.flush_interval)
+            except Empty:
+                continue
+            batch, waiters, stop = [], [], False
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                if stop or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._writes.get(timeout=max(0, deadline - time.monotonic()))
+                except Empty:
+                    break
+            for owner in self._write_batch(conn, batch):
+                self._failed_writes[owner] = self._failed_writes.get(owner, 0) + 1
+            for waiter in waiters:
+                waiter.failed = self._failed_writes.pop(waiter.owner, 0)
+                waiter.set()
+            if stop:
+                break
+        conn.close()
+
+    @staticmethod
+    def _write_batch(conn: sqlite3.Connection, batch: List[tuple]) -> List[int]:
+        """
+        Write queued (sql, params, thread id) rows in one transaction, one
+        executemany() per run of identical SQL. If the transaction fails,
+        the rows are retried one by one so a single bad row cannot take its
+        neighbours down with it. Returns the thread ids of the rows that
+        could not be written, one per row.
+        """
+        if not batch:
+            return []
+        # Blob inserts are idempotent and order-free, so write them all up front
+        blobs = [item for item in batch if item[0] is _INSERT_BLOB]
+        if blobs:
+            batch = [item for item in batch if item[0] is not _INSERT_BLOB]
+        began = time.perf_counter()
+        try:
+            with conn:
+                if blobs:
+                    conn.executemany(_INSERT_BLOB, [params for _, params, _ in blobs])
+                start = 0
+                while start < len(batch):
+                    sql = batch[start][0]
+                    end = start
+                    while end < len(batch) and batch[end][0] == sql:
+                        end += 1
+                    conn.executemany(sql, [params for _, params, _ in batch[start:end]])
+                    start = end
+        except sqlite3.Error as e:
+            logger.warning(f"Batched write of {len(batch) + len(blobs)} rows failed ({e}); retrying row by row")
+            failed = []
+            for sql, params, owner in blobs + batch:
+                try:
+                    with conn:
+                        conn.execute(sql, params)
+                except sqlite3.Error as row_error:
+                    logger.error(f"Dropped write ({' '.join(sql.split()[:3])}): {row_error}")
+                    failed.append(owner)
+            DB_ROWS.inc(len(batch) + len(blobs) - len(failed))
+            return failed
+        STAGE_SECONDS.observe(time.perf_counter() - began, stage='db_write', engine='sqlite')
+        DB_ROWS.inc(len(batch) + len(blobs))
+        return []
+
+    def flush(self) -> int:
+        """
+        Block until everything queued so far has been written. Returns how
+        many rows queued by the calling thread could not be written since
+        its previous flush(); other threads' failures are theirs to collect.
+        """
+        if self._closed:
+            return 0
+        done = threading.Event()
+        done.owner = threading.get_ident()
+        self._writes.put(done)
+        done.wait()
+        return done.failed
+
+    def close(self):
+        """Flush queued writes and close all connections."""
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        self._writes.put(None)
+        self._writer.join()
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+    # Tasks
 
     def add_task(self, url: str, priority: int = 5) -> int:
-        with sqlite3.connect(self.db_url) as conn:
-            c = conn.cursor()
-            c.execute('INSERT INTO tasks (url, priority) VALUES (?, ?)', (url, priority))
+        conn = self._conn()
+        with conn:
+            c = conn.execute('INSERT INTO tasks (url, priority) VALUES (?, ?)', (url, priority))
             return c.lastrowid
 
+    def add_tasks(self, urls: List[str], priority: int = 5) -> List[int]:
+        """Insert many tasks in one transaction and return their ids."""
+        conn = self._conn()
+        with conn:
+            return [
+                conn.execute('INSERT INTO tasks (url, priority) VALUES (?, ?)', (url, priority)).lastrowid
+                for url in urls
+            ]
+
     def update_task_status(self, task_id: int, status: str, error: str = None):
-        with sqlite3.connect(self.db_url) as conn:
-            c = conn.cursor()
-            if status == 'completed':
-                c.execute('UPDATE tasks SET status=?, completed_at=CURRENT_TIMESTAMP WHERE id=?',
+        if status == 'completed':
+            self._enqueue('UPDATE tasks SET status=?, completed_at=CURRENT_TIMESTAMP WHERE id=?',
                           (status, task_id))
-            else:
-                c.execute('UPDATE tasks SET status=?, error=? WHERE id=?', (status, error, task_id))
-            conn.commit()
+        else:
+            self._enqueue('UPDATE tasks SET status=?, error=? WHERE id=?', (status, error, task_id))
 
-    def save_content(self, task_id: int, url: str, title: str, text: str, html: str):
-        with sqlite3.connect(self.db_url) as conn:
-            c = conn.cursor()
-            c.execute('''
-                INSERT INTO contents (task_id, url, title, text, html)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (task_id, url, title, text, html))
-            conn.commit()
+    # Contents and media
 
-    def save_media(self, task_id: int, url: str, local_path: str, file_type: str, size: int):
-        with sqlite3.connect(self.db_url) as conn:
-            c = conn.cursor()
-            c.execute('''
-                INSERT INTO media (task_id, url, local_path, file_type, size)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (task_id, url, local_path, file_type, size))
-            conn.commit()
+    def _store_blob(self, value: Optional[str]) -> Optional[str]:
+        """Queue a compressed copy of value keyed by its SHA-256 and return the hash."""
+        if value is None:
+            return None
+        data = value.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        codec, payload = _compress(data)
+        self._enqueue(_INSERT_BLOB, (digest, codec, len(data), payload))
+        return digest
+
+    def _load_blob(self, digest: Optional[str]) -> Optional[str]:
+        if digest is None:
+            return None
+        row = self._conn().execute('SELECT codec, data FROM blobs WHERE hash=?', (digest,)).fetchone()
+        if row is None:
+            return None
+        return _decompress(row[0], row[1]).decode('utf-8')
+
+    def _near_dup_index(self) -> SimHashIndex:
+        """Build the SimHash index from stored contents on first use."""
+        with self._near_dups_lock:
+            if self._near_dups is None:
+                index = SimHashIndex(settings.NEAR_DUP_DISTANCE)
+                rows = self._conn().execute(
+                    'SELECT url, simhash FROM contents WHERE simhash IS NOT NULL AND near_dup_of IS NULL'
+                )
+                for url, fingerprint in rows:
+                    index.add(to_unsigned(fingerprint), url)
+                self._near_dups = index
+            return self._near_dups
+
+    def save_content(self, task_id: int, url: str, title: str, text: str, html: str,
+                     fingerprint: int = None) -> Optional[str]:
+        """
+        Store a crawled page. Returns the URL of an earlier page whose text is
+        a near-duplicate of this one, or None. With NEAR_DUP_MODE 'skip' such
+        pages are not stored; with 'flag' they are stored with near_dup_of set.
+        fingerprint is the text's simhash() when the caller already has it
+        (extract() computes it off the calling thread).
+        """
+        near_dup_of = None
+        if settings.NEAR_DUP_MODE == 'off' or not text:
+            fingerprint = None
+        else:
+            if fingerprint is None:
+                fingerprint = simhash(text)
+            near_dup_of = self._near_dup_index().check_and_add(fingerprint, url)
+            if near_dup_of and settings.NEAR_DUP_MODE == 'skip':
+                logger.info(f"Skipping {url}: near-duplicate of {near_dup_of}")
+                return near_dup_of
+
+        text_hash = self._store_blob(text)
+        html_hash = self._store_blob(html)
+        self._enqueue('''
+            INSERT INTO contents (task_id, url, title, text_hash, html_hash, simhash, near_dup_of)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (task_id, url, title, text_hash, html_hash,
+              to_signed(fingerprint) if fingerprint is not None else None, near_dup_of))
+        return near_dup_of
+
+    def _content_row(self, row) -> Dict:
+        content_id, task_id, url, title, text, html, text_hash, html_hash, extracted_at, near_dup_of = row
+        return {
+            'id': content_id,
+            'task_id': task_id,
+            'url': url,
+            'title': title,
+            # Rows written before blob storage keep their bodies inline
+            'text': self._load_blob(text_hash) if text_hash else text,
+            'html': self._load_blob(html_hash) if html_hash else html,
+            'extracted_at': extracted_at,
+            'near_dup_of': near_dup_of
+        }
+
+    def get_content(self, content_id: int) -> Optional[Dict]:
+        """Return a contents row with its text and html decompressed."""
+        row = self._conn().execute(
+            f'SELECT {_CONTENT_COLUMNS} FROM contents WHERE id=?', (content_id,)
+        ).fetchone()
+        return self._content_row(row) if row else None
+
+    def get_contents_by_url(self, url: str) -> List[Dict]:
+        """Return every stored fetch of url, oldest first."""
+        rows = self._conn().execute(
+            f'SELECT {_CONTENT_COLUMNS} FROM contents WHERE url=? ORDER BY id', (url,)
+        ).fetchall()
+        return [self._content_row(row) for row in rows]
+
+    def save_media(self, task_id: int, url: str, local_path: str, file_type: str, size: int,
+                   sha256: str = None):
+        self._enqueue('''
+            INSERT INTO media (task_id, url, local_path, file_type, size, sha256)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (task_id, url, local_path, file_type, size, sha256))
+
+    # Media index
+
+    def get_media_file(self, url: str) -> Optional[Dict]:
+        """Return the indexed download of url, or None."""
+        row = self._conn().execute(
+            'SELECT url, sha256, local_path, size, etag, last_modified FROM media_files WHERE url=?', (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('url', 'sha256', 'local_path', 'size', 'etag', 'last_modified'), row))
+
+    def find_media_by_hash(self, sha256: str) -> List[str]:
+        """Return the local paths of indexed files with this content hash."""
+        rows = self._conn().execute('SELECT local_path FROM media_files WHERE sha256=?', (sha256,))
+        return [row[0] for row in rows]
+
+    def media_url_for_path(self, local_path: str) -> Optional[str]:
+        row = self._conn().execute('SELECT url FROM media_files WHERE local_path=?', (local_path,)).fetchone()
+        return row[0] if row else None
+
+    def record_media_file(self, url: str, sha256: str, local_path: str, size: int,
+                          etag: str = None, last_modified: str = None):
+        """Index a finished download. Written immediately so concurrent downloads see it."""
+        conn = self._conn()
+        with conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO media_files (url, sha256, local_path, size, etag, last_modified)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (url, sha256, local_path, size, etag, last_modified))
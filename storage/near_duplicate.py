@@ -0,0 +1,98 @@
+import hashlib
+import re
+import threading
+from collections import defaultdict
+from typing import Optional, List, Tuple, Dict
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+# _BIT_TABLES[k] maps a byte to 1 if its bit k is set, else 0 (for bytes.translate)
+_BIT_TABLES = [bytes((byte >> bit) & 1 for byte in range(256)) for bit in range(8)]
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """64-bit SimHash of text over word shingles."""
+    words = _WORD.findall(text.lower())
+    if len(words) < shingle_size:
+        shingles = [' '.join(words)]
+    else:
+        shingles = [' '.join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+
+    blake2b = hashlib.blake2b
+    digests = b''.join([blake2b(s.encode('utf-8'), digest_size=8).digest() for s in shingles])
+    # Bit i is set when most shingle hashes have it set. Bits are counted
+    # per digest byte position with translate()/count(), which run in C.
+    half = len(shingles) / 2
+    fingerprint = 0
+    for position in range(8):
+        column = digests[position::8]
+        shift = (7 - position) * 8  # digests are read big-endian
+        for bit, table in enumerate(_BIT_TABLES):
+            if column.translate(table).count(1) > half:
+                fingerprint |= 1 << (shift + bit)
+    return fingerprint
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+def to_signed(value: int) -> int:
+    """Map an unsigned 64-bit fingerprint onto SQLite's signed INTEGER range."""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+def to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+class SimHashIndex:
+    """
+    Finds stored fingerprints within max_distance bits of a query.
+    Each fingerprint is split into max_distance + 1 bands. Two fingerprints
+    that differ in at most max_distance bits must agree exactly on at least
+    one band (pigeonhole), so a query is a few dict lookups plus a popcount
+    per candidate.
+    """
+
+    def __init__(self, max_distance: int = 3):
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        self.band_bits = 64 // self.bands
+        self.band_mask = (1 << self.band_bits) - 1
+        self.tables: List[Dict[int, List[Tuple[int, str]]]] = [defaultdict(list) for _ in range(self.bands)]
+        self.lock = threading.Lock()
+        self.size = 0
+
+    def _keys(self, fingerprint: int):
+        for band in range(self.bands):
+            yield band, (fingerprint >> (band * self.band_bits)) & self.band_mask
+
+    def _find(self, fingerprint: int, exclude: Optional[str]) -> Optional[str]:
+        """Caller holds the lock."""
+        for band, value in self._keys(fingerprint):
+            for candidate, key in self.tables[band].get(value, ()):
+                if key != exclude and hamming_distance(candidate, fingerprint) <= self.max_distance:
+                    return key
+        return None
+
+    def _add(self, fingerprint: int, key: str):
+        """Caller holds the lock."""
+        for band, value in self._keys(fingerprint):
+            self.tables[band][value].append((fingerprint, key))
+        self.size += 1
+
+    def add(self, fingerprint: int, key: str):
+        with self.lock:
+            self._add(fingerprint, key)
+
+    def query(self, fingerprint: int, exclude: str = None) -> Optional[str]:
+        """Return the key of a stored near-duplicate, ignoring entries equal to exclude."""
+        with self.lock:
+            return self._find(fingerprint, exclude)
+
+    def check_and_add(self, fingerprint: int, key: str) -> Optional[str]:
+        """
+        Return the key of an existing near-duplicate stored under another
+        key, or index fingerprint under key and return None.
+        """
+        with self.lock:
+            match = self._find(fingerprint, key)
+            # A re-crawl of the same unchanged page is not indexed again
+            if match is None and self._find(fingerprint, None) != key:
+                self._add(fingerprint, key)
+            return match
@@ -0,0 +1,143 @@
+import atexit
+import threading
+import time
+from queue import Queue, Empty
+from typing import Any, Callable, Dict, List
+from config import settings
+from storage.database import Database
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class ResultSink:
+    """
+    Streams scheduler worker results into a Database.
+    Workers hand over task transitions (started, finished, failed); a writer
+    thread applies them in batches and then flushes the database, after
+    which each item's on_persisted callback runs (schedulers ack the task
+    there). If an item cannot be stored, or the database drops rows of the
+    batch, on_not_persisted runs instead (schedulers nack or release the
+    task). At most max_pending items are buffered: beyond that the
+    producing worker blocks, which in turn stops it taking new tasks.
+    Tasks carry their tasks-table id as task['task_id']; results for tasks
+    without one get a new row.
+    """
+
+    def __init__(self, db: Database, max_pending: int = None, batch_size: int = None,
+                 flush_interval: float = None):
+        self.db = db
+        self.batch_size = batch_size or settings.RESULT_SINK_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.RESULT_SINK_FLUSH_INTERVAL
+        self.items = Queue(maxsize=max_pending or settings.RESULT_SINK_MAX_PENDING)
+        self.closed = False
+        self.writer = threading.Thread(target=self._writer_loop, name='result-sink', daemon=True)
+        self.writer.start()
+        atexit.register(self.close)
+
+    def started(self, task: Dict[str, Any]):
+        if task.get('task_id') is not None:
+            self._put(('started', task, None, (None, None)))
+
+    def finished(self, task: Dict[str, Any], result: Any, on_persisted: Callable[[], None] = None,
+                 on_not_persisted: Callable[[], None] = None):
+        """Record a crawl result: a page dict, a status string such as 'robots_blocked', or None."""
+        self._put(('finished', task, result, (on_persisted, on_not_persisted)))
+
+    def failed(self, task: Dict[str, Any], error: str, on_persisted: Callable[[], None] = None,
+               on_not_persisted: Callable[[], None] = None):
+        self._put(('failed', task, error, (on_persisted, on_not_persisted)))
+
+    def _put(self, item: tuple):
+        if self.closed:
+            raise RuntimeError('ResultSink is closed')
+        self.items.put(item)  # blocks while the sink is full
+
+    def _writer_loop(self):
+        while True:
+            try:
+                item = self.items.get(timeout=self.flush_interval)
+            except Empty:
+                continue
+            batch, waiters, stop = [], [], False
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is None:
+                    stop = True
+                    break
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self.items.get(timeout=max(0, deadline - time.monotonic()))
+                except Empty:
+                    break
+            self._write_batch(batch)
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                break
+
+    def _write_batch(self, batch: List[tuple]):
+        applied, callbacks = [], []
+        for kind, task, payload, (on_persisted, on_not_persisted) in batch:
+            try:
+                self._apply(kind, task, payload)
+            except Exception as e:
+                logger.error(f"Failed to store {kind} result for {task.get('url')}: {e}")
+                callbacks.append(on_not_persisted)
+                continue
+            applied.append((on_persisted, on_not_persisted))
+        dropped = self.db.flush()
+        if dropped:
+            # Dropped rows cannot be traced to their items; treat the whole batch as unsaved
+            logger.error(f"{dropped} rows of a result batch were not stored; "
+                         f"reporting {len(applied)} results as not persisted")
+        callbacks.extend(on_not_persisted if dropped else on_persisted for on_persisted, on_not_persisted in applied)
+        for callback in callbacks:
+            if callback is None:
+                continue
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Result sink callback failed: {e}")
+
+    def _apply(self, kind: str, task: Dict[str, Any], payload: Any):
+        url = task['url']
+        task_id = task.get('task_id')
+        if task_id is None:
+            task_id = task['task_id'] = self.db.add_task(url, task.get('priority', 5))
+        if kind == 'started':
+            self.db.update_task_status(task_id, 'running')
+        elif kind == 'failed':
+            self.db.update_task_status(task_id, 'failed', payload)
+        elif payload is None:
+            self.db.update_task_status(task_id, 'failed', 'fetch failed')
+        elif isinstance(payload, str):
+            self.db.update_task_status(task_id, payload)  # e.g. robots_blocked
+        else:
+            self.db.save_content(task_id, url, payload.get('title'), payload.get('text'), payload.get('html'),
+                                 payload.get('simhash'))
+            # Media found on the page; workers do not download it, so there is no local file yet
+            for file_type, key in (('image', 'images'), ('video', 'videos')):
+                for media_url in payload.get(key) or []:
+                    self.db.save_media(task_id, media_url, None, file_type, None)
+            self.db.update_task_status(task_id, 'completed')
+
+    def flush(self):
+        """Block until everything handed over so far is stored and its callbacks have run."""
+        if self.closed:
+            return
+        done = threading.Event()
+        self.items.put(done)
+        done.wait()
+
+    def close(self):
+        """Write everything buffered, then stop the writer."""
+        if self.closed:
+            return
+        self.closed = True
+        self.items.put(None)
+        self.writer.join()
@@ -0,0 +1,107 @@
+import hashlib
+import os
+import tempfile
+import unittest
+
+from storage.database import Database
+
+class TempDirTestCase(unittest.TestCase):
+    """Gives each test a scratch directory that is removed afterwards."""
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.tmp, name)
+
+class DatabaseTestCase(TempDirTestCase):
+    """TempDirTestCase with a fresh SQLite Database in the scratch directory."""
+
+    def setUp(self):
+        super().setUp()
+        self.db = Database(f"sqlite:///{self.path('spider.db')}")
+        self.addCleanup(self.db.close)
+
+class FakeResponse:
+    """Just enough of requests.Response for the downloader."""
+
+    def __init__(self, status_code: int, headers: dict = None, body: bytes = b'', fail_after: int = None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.body = body
+        self.fail_after = fail_after  # drop the connection after this many bytes
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise IOError(f"HTTP {self.status_code}")
+
+    def iter_content(self, chunk_size: int = 1):
+        body = self.body if self.fail_after is None else self.body[:self.fail_after]
+        for offset in range(0, len(body), chunk_size):
+            yield body[offset:offset + chunk_size]
+        if self.fail_after is not None:
+            raise IOError('connection reset')
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class FakeSite:
+    """
+    Serves files ({url: bytes}) in place of a requests.Session, with ETags,
+    conditional requests and, when ranges is set, Range requests.
+    """
+
+    def __init__(self, files: dict, ranges: bool = True, head_status: int = 200):
+        self.files = files
+        self.ranges = ranges
+        self.head_status = head_status
+        self.requests = []      # (method, url, headers, proxies)
+        self.fail_ranges = {}   # range start -> requests for it that drop mid-way
+
+    @staticmethod
+    def etag(body: bytes) -> str:
+        return '"%s"' % hashlib.sha1(body).hexdigest()
+
+    def _headers(self, body: bytes) -> dict:
+        headers = {'content-length': str(len(body)), 'etag': self.etag(body)}
+        if self.ranges:
+            headers['accept-ranges'] = 'bytes'
+        return headers
+
+    def head(self, url, headers=None, proxies=None, **kwargs):
+        self.requests.append(('HEAD', url, headers or {}, proxies))
+        if self.head_status != 200:
+            return FakeResponse(self.head_status)
+        return self._respond(url, headers or {})
+
+    def get(self, url, headers=None, proxies=None, **kwargs):
+        headers = headers or {}
+        self.requests.append(('GET', url, headers, proxies))
+        response = self._respond(url, headers)
+        byte_range = headers.get('Range')
+        if byte_range and self.ranges and response.status_code == 200:
+            start, end = (int(x) for x in byte_range[len('bytes='):].split('-'))
+            body = response.body[start:end + 1]
+            failures = self.fail_ranges.get(start, 0)
+            if failures:
+                self.fail_ranges[start] = failures - 1
+            return FakeResponse(206, dict(response.headers, **{'content-length': str(len(body))}), body,
+                                fail_after=len(body) // 2 if failures else None)
+        return response
+
+    def _respond(self, url, headers):
+        body = self.files.get(url)
+        if body is None:
+            return FakeResponse(404)
+        if headers.get('If-None-Match') == self.etag(body):
+            return FakeResponse(304, {'etag': self.etag(body)})
+        return FakeResponse(200, self._headers(body), body)
@@ -0,0 +1,15 @@
+import unittest
+
+from core.browser_pool import PlaywrightPool
+
+class PlaywrightPoolTest(unittest.TestCase):
+    def test_render_after_shutdown_raises(self):
+        pool = PlaywrightPool(size=2)  # browsers only launch on the first render
+        pool.shutdown()
+        self.assertTrue(all(not worker.is_alive() for worker in pool.workers))
+        with self.assertRaises(RuntimeError):
+            pool.render('http://h/', timeout=1)
+        pool.shutdown()  # a second shutdown (atexit) is a no-op
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import time
+import unittest
+from concurrent.futures import Future
+from unittest import mock
+
+from config import settings
+from core.crawl_job import CrawlJob
+from core.throttle import AutoThrottle
+from tests.helpers import DatabaseTestCase
+
+SITE = {
+    'http://h/': ['http://h/a/', 'http://h/b/'],
+    'http://h/a/': [f'http://h/a/{i}' for i in range(5)],
+    'http://h/b/': [f'http://h/b/{i}' for i in range(5)],
+    'http://h/a/0': ['http://h/a/0/deep'],
+}
+ALL_PAGES = set(SITE) | {url for links in SITE.values() for url in links}
+
+class FakeCrawler:
+    """Serves SITE instantly; can stop a job after a number of fetches."""
+
+    def __init__(self, stop_after: int = None):
+        self.throttle = AutoThrottle(start_delay=0, min_delay=0)
+        self.fetched = []
+        self.stop_after = stop_after
+        self.job = None
+
+    def crawl_deferred(self, url, force=False, dynamic=None):
+        self.fetched.append(url)
+        if self.stop_after and len(self.fetched) == self.stop_after:
+            self.job.stop()
+        time.sleep(0.01)  # keep a few pages in flight
+        future = Future()
+        future.set_result({'title': url, 'text': f'page at {url}', 'links': SITE.get(url, [])})
+        return future
+
+class CrawlJobTest(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(settings, 'FRONTIER_DIR', self.tmp)  # temporary frontiers
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_crawls_the_whole_site(self):
+        crawler = FakeCrawler()
+        job = CrawlJob(crawler, self.db, ['http://h/'], max_depth=5, workers=3)
+        job.run()
+        self.assertEqual(set(crawler.fetched), ALL_PAGES)
+        self.assertEqual(job.pages_crawled, len(ALL_PAGES))
+
+    def test_separate_jobs_do_not_share_seen_urls(self):
+        for _ in range(2):
+            crawler = FakeCrawler()
+            job = CrawlJob(crawler, self.db, ['http://h/'], max_depth=0)
+            job.run()
+            self.assertEqual(crawler.fetched, ['http://h/'])
+            self.assertTrue(job.frontier.closed)
+
+    def test_frontier_filter_is_sized_from_max_pages(self):
+        job = CrawlJob(FakeCrawler(), self.db, ['http://h/'], max_pages=10)
+        self.assertEqual(job.frontier.bloom.capacity, 10 * settings.FRONTIER_URLS_PER_PAGE)
+        job.frontier.close()
+
+    def test_resume_after_stop_crawls_what_was_left(self):
+        checkpoint = self.path('job.json')
+        first = FakeCrawler(stop_after=3)
+        job = CrawlJob(first, self.db, ['http://h/'], max_depth=5, workers=2, checkpoint_file=checkpoint)
+        first.job = job
+        job.run()
+        job.frontier.close()
+
+        second = FakeCrawler()
+        resumed = CrawlJob(second, self.db, ['http://h/'], max_depth=5, workers=2, checkpoint_file=checkpoint)
+        resumed.run()
+        resumed.frontier.close()
+        self.assertEqual(set(first.fetched) | set(second.fetched), ALL_PAGES)
+        self.assertFalse(set(first.fetched) & set(second.fetched))
+        self.assertEqual(resumed.pages_crawled, len(ALL_PAGES))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from config import settings
+from core.crawler_engine import DynamicCrawler
+from core.http_cache import HTTPCache
+from core.throttle import AutoThrottle
+from tests.helpers import TempDirTestCase
+
+class FakeTorManager:
+    """Hands out a different circuit's session on every call, like the Tor pool."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def get_tor_session(self):
+        self.calls += 1
+        proxies = {'http': f'socks5h://c{self.calls}@127.0.0.1:9050',
+                   'https': f'socks5h://c{self.calls}@127.0.0.1:9050'}
+        response = SimpleNamespace(status_code=200, headers={}, text='<html></html>',
+                                   raise_for_status=lambda: None)
+        return SimpleNamespace(proxies=proxies, get=lambda url, **kwargs: response)
+
+class MediaRouteTest(unittest.TestCase):
+    def setUp(self):
+        for name, value in (('PARSE_PROCESSES', 0), ('HTTP_CACHE_ENABLED', False)):
+            patcher = mock.patch.object(settings, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def crawler(self, **kwargs):
+        return DynamicCrawler(engine='requests', throttle=AutoThrottle(start_delay=0, min_delay=0), **kwargs)
+
+    def test_media_reuse_the_pages_tor_session(self):
+        crawler = self.crawler(tor_manager=FakeTorManager())
+        crawler._fetch_once('http://h/')
+        crawler.tor_manager.get_tor_session()  # another crawl moves the pool on
+        self.assertEqual(crawler.media_proxies()['https'], 'socks5h://c1@127.0.0.1:9050')
+
+    def test_media_reuse_the_pages_pool_proxy(self):
+        pool = mock.Mock()
+        pool.get_proxy.side_effect = ['a:1', 'b:1']
+        crawler = self.crawler(proxy_pool=pool)
+        crawler.session = mock.Mock()
+        crawler.session.get.return_value = SimpleNamespace(status_code=200, headers={}, text='',
+                                                           raise_for_status=lambda: None)
+        crawler._fetch_once('http://h/')
+        self.assertEqual(crawler.media_proxies(), {'http': 'http://a:1', 'https': 'http://a:1'})
+
+        # Routes are per thread, so concurrent crawls don't swap them
+        other = []
+        thread = threading.Thread(target=lambda: other.append(crawler.media_proxies()))
+        thread.start()
+        thread.join(5)
+        self.assertEqual(other, [{'http': 'http://b:1', 'https': 'http://b:1'}])
+
+class RevalidationTest(TempDirTestCase):
+    def test_304_reuses_the_body_and_keeps_the_new_etag(self):
+        cache = HTTPCache(self.path('cache.db'))
+        self.addCleanup(cache.close)
+        cache.store('http://h/', '<html>cached</html>', {'ETag': '"1"'})
+        with mock.patch.object(settings, 'PARSE_PROCESSES', 0):
+            crawler = DynamicCrawler(engine='requests', throttle=AutoThrottle(start_delay=0, min_delay=0),
+                                     http_cache=cache)
+        crawler.session = mock.Mock()
+        crawler.session.get.return_value = SimpleNamespace(status_code=304, headers={'ETag': '"2"'})
+        self.assertEqual(crawler._fetch_once('http://h/'), '<html>cached</html>')
+        self.assertEqual(crawler.session.get.call_args.kwargs['headers']['If-None-Match'], '"1"')
+        self.assertEqual(cache.get('http://h/')['etag'], '"2"')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import threading
+import unittest
+from unittest import mock
+
+from config import settings
+from storage.database import Database
+from storage.near_duplicate import simhash
+from tests.helpers import DatabaseTestCase
+from utils.metrics import STAGE_SECONDS
+
+TEXT = ' '.join(f'word{i}' for i in range(300))
+
+class DatabaseWriterTest(DatabaseTestCase):
+    def status(self, task_id):
+        return self.db._conn().execute('SELECT status FROM tasks WHERE id=?', (task_id,)).fetchone()[0]
+
+    def test_queued_writes_land_after_flush(self):
+        task_id = self.db.add_task('http://h/', 5)
+        self.db.update_task_status(task_id, 'completed')
+        self.assertEqual(self.db.flush(), 0)
+        self.assertEqual(self.status(task_id), 'completed')
+
+    def test_bad_row_does_not_drop_its_batch(self):
+        task_id = self.db.add_task('http://h/', 5)
+        self.db.update_task_status(task_id, 'running')
+        self.db.flush()
+        self.db._enqueue('INSERT INTO tasks (id, url) VALUES (?, ?)', (task_id, 'http://h/clash'))
+        self.db.update_task_status(task_id, 'completed')
+        self.assertEqual(self.db.flush(), 1)
+        self.assertEqual(self.status(task_id), 'completed')
+        self.assertEqual(self.db.flush(), 0)
+
+    def test_dropped_rows_are_reported_to_the_thread_that_queued_them(self):
+        task_id = self.db.add_task('http://h/', 5)
+        flushed = []
+
+        def clash():
+            self.db._enqueue('INSERT INTO tasks (id, url) VALUES (?, ?)', (task_id, 'http://h/clash'))
+            flushed.append(self.db.flush())
+
+        self.db.update_task_status(task_id, 'completed')
+        thread = threading.Thread(target=clash)
+        thread.start()
+        thread.join()
+        self.assertEqual(flushed, [1])
+        self.assertEqual(self.db.flush(), 0)
+
+    def test_write_timing_is_a_duration(self):
+        key = (('engine', 'sqlite'), ('stage', 'db_write'))
+        before = dict(STAGE_SECONDS.series.get(key, {'sum': 0.0, 'count': 0}))
+        task_id = self.db.add_task('http://h/', 5)
+        for _ in range(20):
+            self.db.update_task_status(task_id, 'running')
+        self.db.flush()
+        after = STAGE_SECONDS.series[key]
+        self.assertGreater(after['count'], before['count'])
+        self.assertLess(after['sum'] - before['sum'], 5.0)
+
+class NearDuplicateTest(DatabaseTestCase):
+    def contents(self, db=None):
+        db = db or self.db
+        db.flush()
+        return db._conn().execute('SELECT url, near_dup_of FROM contents ORDER BY id').fetchall()
+
+    def test_near_duplicates_are_flagged(self):
+        first = self.db.add_task('http://h/a', 5)
+        second = self.db.add_task('http://h/b', 5)
+        self.assertIsNone(self.db.save_content(first, 'http://h/a', 'A', TEXT, '<p>a</p>'))
+        self.assertEqual(self.db.save_content(second, 'http://h/b', 'B', TEXT + ' tail', None), 'http://h/a')
+        self.assertEqual(self.contents(), [('http://h/a', None), ('http://h/b', 'http://h/a')])
+
+    def test_skip_mode_does_not_store_near_duplicates(self):
+        with mock.patch.object(settings, 'NEAR_DUP_MODE', 'skip'):
+            self.db.save_content(1, 'http://h/a', 'A', TEXT, None)
+            self.assertEqual(self.db.save_content(2, 'http://h/b', 'B', TEXT, None), 'http://h/a')
+        self.assertEqual(self.contents(), [('http://h/a', None)])
+
+    def test_recrawl_of_the_same_url_is_not_a_duplicate(self):
+        self.db.save_content(1, 'http://h/a', 'A', TEXT, None)
+        self.assertIsNone(self.db.save_content(2, 'http://h/a', 'A', TEXT, None))
+
+    def test_index_is_rebuilt_from_stored_fingerprints(self):
+        self.db.save_content(1, 'http://h/a', 'A', TEXT, None, simhash(TEXT))
+        self.db.flush()
+        reopened = Database(f"sqlite:///{self.path('spider.db')}")
+        self.addCleanup(reopened.close)
+        self.assertEqual(reopened.save_content(2, 'http://h/b', 'B', TEXT, None), 'http://h/a')
+
+if __name__ == '__main__':
+    unittest.main()
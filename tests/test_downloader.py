@@ -0,0 +1,135 @@
+import os
+import unittest
+from unittest import mock
+
+from config import settings
+from core.downloader import ResumableDownloader, merge_ranges, missing_ranges
+from storage.database import Database
+from tests.helpers import FakeSite, TempDirTestCase
+
+BODY = bytes(range(256)) * 64  # 16 KiB
+
+class RangeTest(unittest.TestCase):
+    def test_merge_ranges(self):
+        self.assertEqual(merge_ranges([]), [])
+        self.assertEqual(merge_ranges([(10, 20), (0, 5), (5, 10)]), [[0, 20]])
+        self.assertEqual(merge_ranges([(0, 5), (6, 8), (7, 12)]), [[0, 5], [6, 12]])
+        self.assertEqual(merge_ranges([(0, 10), (2, 3)]), [[0, 10]])
+
+    def test_missing_ranges(self):
+        self.assertEqual(missing_ranges([], 100), [(0, 100)])
+        self.assertEqual(missing_ranges([[0, 100]], 100), [])
+        self.assertEqual(missing_ranges([[10, 20], [50, 60]], 100), [(0, 10), (20, 50), (60, 100)])
+        self.assertEqual(missing_ranges([[0, 40]], 40), [])
+
+class DownloaderTestCase(TempDirTestCase):
+    """A ResumableDownloader whose sessions talk to a FakeSite, with small chunks."""
+
+    def setUp(self):
+        super().setUp()
+        for name, value in (('DOWNLOAD_MIN_CHUNK', 1024), ('DOWNLOAD_MAX_CHUNK', 4096)):
+            patcher = mock.patch.object(settings, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.site = FakeSite({'http://h/file.bin': BODY})
+        self.downloader = self.make_downloader()
+
+    def make_downloader(self, **kwargs):
+        downloader = ResumableDownloader(download_dir=self.tmp, max_workers=3, **kwargs)
+        downloader._session = lambda url: self.site
+        return downloader
+
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+class ResumableDownloaderTest(DownloaderTestCase):
+    def test_ranged_download(self):
+        progress = []
+        path = self.downloader.download('http://h/file.bin', progress=lambda n, total: progress.append(n))
+        self.assertEqual(self.read(path), BODY)
+        self.assertEqual(sum(progress), len(BODY))
+        self.assertGreater(sum(1 for method, *_ in self.site.requests if method == 'GET'), 1)
+        self.assertFalse(os.path.exists(f"{path}.ckpt"))
+
+    def test_retried_ranges_are_counted_once(self):
+        self.site.fail_ranges = {0: 2}
+        progress = []
+        path = self.downloader.download('http://h/file.bin', progress=lambda n, total: progress.append(n))
+        self.assertEqual(self.read(path), BODY)
+        self.assertEqual(sum(progress), len(BODY))
+
+    def test_server_refusing_head_gets_a_single_get(self):
+        for status in (403, 405):
+            self.site = FakeSite({'http://h/file.bin': BODY}, head_status=status)
+            path = self.downloader.download('http://h/file.bin', filename=f'{status}.bin')
+            self.assertEqual(self.read(path), BODY)
+            self.assertEqual([method for method, *_ in self.site.requests], ['HEAD', 'GET'])
+
+    def test_server_without_ranges_gets_a_single_get(self):
+        self.site.ranges = False
+        path = self.downloader.download('http://h/file.bin')
+        self.assertEqual(self.read(path), BODY)
+        self.assertEqual([method for method, *_ in self.site.requests], ['HEAD', 'GET'])
+
+    def test_resumes_from_checkpoint(self):
+        self.site.fail_ranges = {0: settings.MAX_RETRIES + 1}  # the first range never completes
+        self.assertIsNone(self.downloader.download('http://h/file.bin'))
+        fetched = sum(1 for method, *_ in self.site.requests if method == 'GET')
+        self.site.requests = []
+        path = self.downloader.download('http://h/file.bin')
+        self.assertEqual(self.read(path), BODY)
+        resumed = [headers['Range'] for method, _, headers, _ in self.site.requests if method == 'GET']
+        self.assertLess(len(resumed), fetched)
+        self.assertTrue(resumed[0].startswith('bytes=0-'))  # only the range that never completed
+
+    def test_missing_file(self):
+        self.assertIsNone(self.downloader.download('http://h/missing.bin'))
+
+    def test_every_request_takes_the_given_route(self):
+        route = {'https': 'socks5h://127.0.0.1:9050'}
+        self.downloader.download('http://h/file.bin', proxies=route)
+        self.assertEqual({str(proxies) for *_, proxies in self.site.requests}, {str(route)})
+
+class MediaIndexTest(DownloaderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.db = Database(f"sqlite:///{self.path('spider.db')}")
+        self.addCleanup(self.db.close)
+        self.downloader = self.make_downloader(db=self.db)
+
+    def test_same_content_is_hard_linked(self):
+        self.site.files['http://mirror/copy.bin'] = BODY
+        first = self.downloader.download('http://h/file.bin')
+        second = self.downloader.download('http://mirror/copy.bin', filename='copy.bin')
+        self.assertNotEqual(first, second)
+        self.assertTrue(os.path.samefile(first, second))
+        self.assertEqual(os.stat(first).st_nlink, 2)
+        self.assertEqual(sorted(self.db.find_media_by_hash(self.db.get_media_file('http://h/file.bin')['sha256'])),
+                         sorted([first, second]))
+
+    def test_known_url_is_revalidated(self):
+        path = self.downloader.download('http://h/file.bin')
+        self.site.requests = []
+        self.assertEqual(self.downloader.download('http://h/file.bin'), path)
+        self.assertEqual([(method, headers.get('If-None-Match')) for method, _, headers, _ in self.site.requests],
+                         [('HEAD', FakeSite.etag(BODY))])
+
+    def test_changed_file_does_not_overwrite_its_duplicates(self):
+        self.site.files['http://mirror/copy.bin'] = BODY
+        first = self.downloader.download('http://h/file.bin')
+        second = self.downloader.download('http://mirror/copy.bin', filename='copy.bin')
+        self.site.files['http://mirror/copy.bin'] = BODY[::-1]
+        self.assertEqual(self.downloader.download('http://mirror/copy.bin', filename='copy.bin'), second)
+        self.assertEqual(self.read(second), BODY[::-1])
+        self.assertEqual(self.read(first), BODY)
+
+    def test_same_name_from_another_url_gets_its_own_file(self):
+        self.site.files['http://other/file.bin'] = BODY[::-1]
+        first = self.downloader.download('http://h/file.bin')
+        second = self.downloader.download('http://other/file.bin')
+        self.assertNotEqual(first, second)
+        self.assertEqual((self.read(first), self.read(second)), (BODY, BODY[::-1]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+
+from core.extractor import extract, extract_bs4
+
+PAGE = '''<!DOCTYPE html>
+<html>
+<head><title> Sample page </title><style>body { color: red }</style></head>
+<body>
+  <h1>Heading</h1>
+  <p>First paragraph with <a href="/next#frag">a link</a> and <b>bold</b> text.</p>
+  <script>var ignored = 1;</script>
+  <img src="img/a.png"><img src="/img/b.jpg"><img>
+  <video src="clip.mp4"><source src="clip.webm"></video>
+  <a href="mailto:someone@example.com">mail</a>
+  <a href="https://other.example/page">elsewhere</a>
+  <a href="/next">duplicate</a>
+</body>
+</html>'''
+
+class ExtractTest(unittest.TestCase):
+    def test_matches_bs4_reference(self):
+        fast = extract(PAGE, 'http://h/dir/')
+        reference = extract_bs4(PAGE, 'http://h/dir/')
+        self.assertEqual(fast['title'], reference['title'])
+        self.assertEqual(fast['text'], reference['text'])
+        self.assertEqual(fast['links'], reference['links'])
+        self.assertEqual(sorted(fast['images']), sorted(reference['images']))
+        self.assertEqual(sorted(fast['videos']), sorted(reference['videos']))
+        self.assertEqual(fast['simhash'], reference['simhash'])
+
+    def test_links_are_absolute_http_without_fragments(self):
+        result = extract(PAGE, 'http://h/dir/')
+        self.assertEqual(result['links'], ['http://h/next', 'https://other.example/page'])
+        self.assertEqual(sorted(result['images']), ['http://h/dir/img/a.png', 'http://h/img/b.jpg'])
+        self.assertNotIn('ignored', result['text'])
+
+    def test_empty_document(self):
+        result = extract('', 'http://h/')
+        self.assertEqual(result['text'], '')
+        self.assertEqual(result['links'], [])
+        self.assertIsNone(result['simhash'])
+
+if __name__ == '__main__':
+    unittest.main()
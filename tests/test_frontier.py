@@ -0,0 +1,110 @@
+import os
+import unittest
+from unittest import mock
+
+from config import settings
+from core.frontier import URLFrontier
+from tests.helpers import TempDirTestCase
+
+class URLFrontierTest(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.db_path = self.path('frontier.db')
+
+    def drain(self, frontier):
+        items = []
+        while True:
+            item = frontier.pop()
+            if item is None:
+                return items
+            items.append(item)
+
+    def test_spills_to_disk_and_pages_back(self):
+        frontier = URLFrontier(path=self.db_path, memory_limit=2, max_depth=None)
+        urls = [f'http://h/{i}' for i in range(7)]
+        self.assertEqual(frontier.add_many(urls), 7)
+        self.assertEqual(frontier.in_memory, 2)
+        self.assertEqual(len(frontier), 7)
+        self.assertEqual(sorted(url for url, _ in self.drain(frontier)), sorted(urls))
+        self.assertEqual(len(frontier), 0)
+        frontier.close()
+
+    def test_seen_urls_are_not_queued_again(self):
+        frontier = URLFrontier(path=self.db_path)
+        self.assertTrue(frontier.add('http://h/'))
+        self.drain(frontier)
+        self.assertFalse(frontier.add('http://h/'))
+        frontier.close()
+
+    def test_priority_and_host_rotation(self):
+        frontier = URLFrontier(path=self.db_path, max_depth=None)
+        frontier.add('http://a/low', priority=1)
+        frontier.add('http://a/high', priority=9)
+        frontier.add('http://b/only', priority=1)
+        order = [url for url, _ in self.drain(frontier)]
+        self.assertEqual(order, ['http://a/high', 'http://b/only', 'http://a/low'])
+        frontier.close()
+
+    def test_checkpoint_restores_queue_and_in_flight(self):
+        frontier = URLFrontier(path=self.db_path, memory_limit=3, autocommit=False)
+        frontier.add_many([f'http://h/{i}' for i in range(5)])
+        url, depth = frontier.pop()
+        frontier.checkpoint([(url, depth, 5)])
+        frontier.add('http://h/after-checkpoint')  # never committed
+        frontier.close()
+
+        resumed = URLFrontier(path=self.db_path, memory_limit=3, autocommit=False)
+        urls = {url for url, _ in self.drain(resumed)}
+        self.assertEqual(urls, {f'http://h/{i}' for i in range(5)})
+        self.assertFalse(resumed.add('http://h/0'))
+        self.assertTrue(resumed.add('http://h/after-checkpoint'))
+        resumed.close()
+
+    def test_fresh_frontier_forgets_seen_urls(self):
+        frontier = URLFrontier(path=self.db_path)
+        frontier.add('http://h/')
+        frontier.close()
+        frontier = URLFrontier(path=self.db_path, fresh=True)
+        self.assertEqual(len(frontier), 0)
+        self.assertTrue(frontier.add('http://h/'))
+        frontier.close()
+
+    def test_temporary_frontier_is_removed_on_close(self):
+        with mock.patch.object(settings, 'FRONTIER_DIR', self.tmp):
+            frontier = URLFrontier()
+        self.assertEqual(os.path.dirname(frontier.path), self.tmp)
+        self.assertTrue(os.path.exists(frontier.path))
+        frontier.add('http://h/')
+        frontier.close()
+        self.assertFalse(os.path.exists(frontier.path))
+
+class SeenFilterTest(TempDirTestCase):
+    def test_filter_is_sized_from_the_expected_crawl(self):
+        frontier = URLFrontier(path=self.path('small.db'), expected_urls=500)
+        self.assertEqual(frontier.bloom.capacity, 500)
+        frontier.close()
+        with mock.patch.object(settings, 'FRONTIER_BLOOM_CAPACITY', 1000):
+            frontier = URLFrontier(path=self.path('large.db'), expected_urls=10 ** 9)
+        self.assertEqual(frontier.bloom.capacity, 1000)
+        frontier.close()
+
+    def test_filter_grows_up_to_the_cap(self):
+        with mock.patch.object(settings, 'FRONTIER_BLOOM_CAPACITY', 400):
+            frontier = URLFrontier(path=self.path('frontier.db'), expected_urls=100, max_depth=None)
+            urls = [f'http://h/{i}' for i in range(1000)]
+            self.assertEqual(frontier.add_many(urls), 1000)
+            self.assertEqual(frontier.bloom.capacity, 400)
+            self.assertEqual(frontier.add_many(urls), 0)  # past the cap the disk index still dedups
+        frontier.close()
+
+    def test_reopened_filter_fits_what_was_seen(self):
+        frontier = URLFrontier(path=self.path('frontier.db'), expected_urls=10, max_depth=None)
+        frontier.add_many([f'http://h/{i}' for i in range(50)])
+        frontier.close()
+        resumed = URLFrontier(path=self.path('frontier.db'), expected_urls=10)
+        self.assertGreaterEqual(resumed.bloom.capacity, 100)
+        self.assertFalse(resumed.add('http://h/7'))
+        resumed.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import sqlite3
+import unittest
+from unittest import mock
+
+from config import settings
+from core.http_cache import HTTPCache
+from tests.helpers import TempDirTestCase
+
+def page(n: int) -> str:
+    return os.urandom(1000).hex() + str(n)  # barely compressible, so entries are about the same size
+
+class HTTPCacheTest(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache = HTTPCache(self.path('cache.db'))
+        self.addCleanup(self.cache.close)
+
+    def access_times(self):
+        with sqlite3.connect(self.path('cache.db')) as conn:
+            return dict(conn.execute('SELECT url, last_access FROM entries'))
+
+    def test_only_responses_with_validators_are_stored(self):
+        self.cache.store('http://h/a', 'body', {'ETag': '"1"', 'Date': 'Mon, 01 Jan 2024 00:00:00 GMT'})
+        self.cache.store('http://h/b', 'body', {})
+        self.assertEqual(self.cache.get('http://h/a'),
+                         {'etag': '"1"', 'last_modified': None, 'date': 'Mon, 01 Jan 2024 00:00:00 GMT',
+                          'body': 'body'})
+        self.assertIsNone(self.cache.get('http://h/b'))
+
+    def test_304_stores_the_new_validators(self):
+        self.cache.store('http://h/a', 'body', {'ETag': '"1"', 'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT'})
+        self.cache.refresh('http://h/a', {'ETag': '"2"', 'Date': 'Tue, 02 Jan 2024 00:00:00 GMT'})
+        entry = self.cache.get('http://h/a')
+        self.assertEqual((entry['etag'], entry['date'], entry['body']),
+                         ('"2"', 'Tue, 02 Jan 2024 00:00:00 GMT', 'body'))
+        self.assertEqual(HTTPCache.conditional_headers(entry),
+                         {'If-None-Match': '"2"', 'If-Modified-Since': 'Mon, 01 Jan 2024 00:00:00 GMT'})
+
+    def test_hits_write_access_times_in_batches(self):
+        self.cache.store('http://h/a', 'body', {'ETag': '"1"'})
+        stored = self.access_times()['http://h/a']
+        with mock.patch.object(settings, 'HTTP_CACHE_ACCESS_BATCH', 3):
+            self.cache.get('http://h/a')
+            self.cache.store('http://h/b', 'body', {'ETag': '"1"'})
+            self.cache.get('http://h/b')
+            self.assertEqual(self.access_times()['http://h/a'], stored)
+            self.cache.get('http://h/c')  # misses are not counted
+            self.cache.store('http://h/c', 'body', {'ETag': '"1"'})
+            self.cache.get('http://h/c')
+        self.assertGreater(self.access_times()['http://h/a'], stored)
+
+    def test_pending_hits_are_written_on_close(self):
+        self.cache.store('http://h/a', 'body', {'ETag': '"1"'})
+        stored = self.access_times()['http://h/a']
+        self.cache.get('http://h/a')
+        self.cache.close()
+        self.assertGreater(self.access_times()['http://h/a'], stored)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        self.cache.store('http://h/0', page(0), {'ETag': '"1"'})
+        self.cache.max_bytes = int(self.cache.total * 3.5)
+        for n in (1, 2):
+            self.cache.store(f'http://h/{n}', page(n), {'ETag': '"1"'})
+        self.cache.get('http://h/0')  # a hit that is not written yet still counts
+        self.cache.store('http://h/3', page(3), {'ETag': '"1"'})
+        self.assertEqual(sorted(self.access_times()), ['http://h/0', 'http://h/2', 'http://h/3'])
+        self.assertLessEqual(self.cache.total, self.cache.max_bytes * 0.9)
+
+        reopened = HTTPCache(self.path('cache.db'))
+        self.addCleanup(reopened.close)
+        self.assertEqual(reopened.total, self.cache.total)
+
+if __name__ == '__main__':
+    unittest.main()
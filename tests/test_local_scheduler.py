@@ -0,0 +1,148 @@
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+
+from config import settings
+from core.local_scheduler import LocalScheduler, _claim, _connect, _heartbeat
+from storage.database import Database
+from storage.result_sink import ResultSink
+from tests.helpers import TempDirTestCase
+
+def crawl_func(url, **kwargs):
+    """Module-level so spawned worker processes can unpickle it."""
+    if url.endswith('/broken'):
+        raise ValueError('cannot crawl')
+    if url.endswith('/crash') and not os.path.exists(kwargs['marker']):
+        open(kwargs['marker'], 'w').close()
+        os._exit(1)  # the worker process dies mid-task, once
+    return {'title': url, 'text': f'page at {url}', 'links': []}
+
+class LocalSchedulerTestCase(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.scheduler = LocalScheduler(path=self.path('queue.db'))
+        self.scheduler.connect()
+        self.addCleanup(self.scheduler.close)
+        self.conn = _connect(self.scheduler.path)
+        self.addCleanup(self.conn.close)
+
+    def states(self):
+        return self.conn.execute('SELECT state, lease_owner, attempts FROM queue ORDER BY id').fetchall()
+
+    def run_until(self, done, concurrency=1):
+        """Run the scheduler's workers until done(conn) is true, or a minute has passed."""
+        def watch():
+            conn = _connect(self.scheduler.path)
+            deadline = time.monotonic() + 60
+            try:
+                while time.monotonic() < deadline and not done(conn):
+                    time.sleep(0.05)
+            finally:
+                conn.close()
+                self.scheduler._stop.set()
+
+        watcher = threading.Thread(target=watch)
+        watcher.start()
+        with mock.patch.object(settings, 'LOCAL_POLL_INTERVAL', 0.05):
+            self.scheduler.start_worker('test', crawl_func, concurrency=concurrency)
+        watcher.join()
+
+class LeaseTest(LocalSchedulerTestCase):
+    def test_claims_by_priority(self):
+        self.scheduler.add_task('http://h/low', priority=1)
+        self.scheduler.add_task('http://h/high', priority=9)
+        row = _claim(self.conn, self.scheduler.queue_name, 'w1')
+        self.assertIn('http://h/high', row[1])
+        self.assertEqual(self.states(), [('ready', None, 0), ('leased', 'w1', 1)])
+
+    def test_expired_lease_is_handed_out_again(self):
+        self.scheduler.add_task('http://h/')
+        self.assertIsNotNone(_claim(self.conn, self.scheduler.queue_name, 'w1'))
+        self.assertIsNone(_claim(self.conn, self.scheduler.queue_name, 'w2'))  # lease still held
+        self.conn.execute('UPDATE queue SET lease_expires=?', (time.time() - 1,))
+        self.assertIsNotNone(_claim(self.conn, self.scheduler.queue_name, 'w2'))
+        self.assertEqual(self.states(), [('leased', 'w2', 2)])
+
+    def test_task_is_dead_lettered_after_max_attempts(self):
+        self.scheduler.add_task('http://h/')
+        with mock.patch.object(settings, 'LOCAL_MAX_ATTEMPTS', 2):
+            for owner in ('w1', 'w2'):
+                self.assertIsNotNone(_claim(self.conn, self.scheduler.queue_name, owner))
+                self.conn.execute("UPDATE queue SET state='ready', lease_owner=NULL")
+            self.assertIsNone(_claim(self.conn, self.scheduler.queue_name, 'w3'))
+        self.assertEqual(self.states(), [('dead', None, 2)])
+
+    def test_lease_is_renewed_during_a_long_crawl(self):
+        self.scheduler.add_task('http://h/slow')
+        with mock.patch.object(settings, 'LOCAL_LEASE_TIME', 0.3), \
+                mock.patch.object(settings, 'LOCAL_LEASE_RENEW_INTERVAL', 0.05):
+            row_id, _ = _claim(self.conn, self.scheduler.queue_name, 'w1')
+            done = threading.Event()
+            heartbeat = threading.Thread(target=_heartbeat, args=(self.scheduler.path, (row_id, 'w1'), done))
+            heartbeat.start()
+            time.sleep(1)  # over three lease times
+            self.assertIsNone(_claim(self.conn, self.scheduler.queue_name, 'w2'))
+            done.set()
+            heartbeat.join()
+            time.sleep(0.4)
+            self.assertIsNotNone(_claim(self.conn, self.scheduler.queue_name, 'w2'))
+
+class WorkerTest(LocalSchedulerTestCase):
+    def test_a_dead_worker_is_replaced_and_its_task_released(self):
+        marker = self.path('crashed')
+        self.scheduler.add_tasks(['http://h/crash', 'http://h/a', 'http://h/b'], marker=marker)
+        self.run_until(lambda conn: conn.execute('SELECT COUNT(*) FROM queue').fetchone()[0] == 0)
+        self.assertTrue(os.path.exists(marker))
+        self.assertEqual(self.states(), [])
+        self.assertEqual(self.scheduler.processes, [])
+
+    def test_stored_results_keep_their_leases(self):
+        class SlowSink:
+            """Never settles, like a sink stuck behind a slow database."""
+
+            def started(self, task):
+                pass
+
+            def finished(self, task, result, on_persisted=None, on_not_persisted=None):
+                pass
+
+            def flush(self):
+                pass
+
+        self.scheduler.result_sink = SlowSink()
+        self.scheduler.add_task('http://h/')
+        renewed_after = time.time() + 2 * settings.LOCAL_LEASE_TIME
+        with mock.patch.object(settings, 'LOCAL_LEASE_TIME', 3 * settings.LOCAL_LEASE_TIME), \
+                mock.patch.object(settings, 'LOCAL_LEASE_RENEW_INTERVAL', 0.05):
+            self.run_until(lambda conn: conn.execute('SELECT COALESCE(lease_expires, 0) FROM queue').fetchone()[0]
+                           > renewed_after)
+        self.assertEqual([state for state, *_ in self.states()], ['leased'])
+        self.assertGreater(self.conn.execute('SELECT lease_expires FROM queue').fetchone()[0], renewed_after)
+
+    def test_task_is_acked_only_after_its_result_is_stored(self):
+        db = Database(f"sqlite:///{self.path('spider.db')}")
+        self.addCleanup(db.close)
+        sink = ResultSink(db, flush_interval=0.05)
+        self.addCleanup(sink.close)
+        self.scheduler.result_sink = sink
+        good_id = db.add_task('http://h/good', 5)
+        broken_id = db.add_task('http://h/broken', 5)
+        self.scheduler.add_tasks(['http://h/good', 'http://h/broken'], task_ids=[good_id, broken_id])
+
+        def settled(conn):
+            rows = conn.execute('SELECT attempts FROM queue').fetchall()
+            return len(rows) == 1 and rows[0][0] >= 2  # good task acked, broken one retried
+
+        self.run_until(settled)
+        sink.flush()
+        remaining = self.conn.execute('SELECT body, state FROM queue').fetchall()
+        self.assertEqual(len(remaining), 1)
+        self.assertIn('http://h/broken', remaining[0][0])
+        self.assertIn(remaining[0][1], ('ready', 'dead'))  # released after each failure, never acked
+        status = dict(db._conn().execute('SELECT url, status FROM tasks').fetchall())
+        self.assertEqual(status, {'http://h/good': 'completed', 'http://h/broken': 'failed'})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import threading
+import time
+import unittest
+
+from core.media_scheduler import MediaScheduler, TokenBucket
+
+class FakeDownloader:
+    """Records downloads; each one waits for `gate` before it finishes."""
+
+    def __init__(self, size: int = 0):
+        self.size = size
+        self.gate = threading.Event()
+        self.lock = threading.Lock()
+        self.started = []
+        self.running = self.peak = 0
+
+    def download(self, url, filename=None, progress=None, proxies=None):
+        with self.lock:
+            self.started.append((url, proxies))
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        self.gate.wait(5)
+        if progress and self.size:
+            progress(self.size, self.size)
+        with self.lock:
+            self.running -= 1
+        return f'/media/{url.rsplit("/", 1)[-1]}'
+
+class MediaSchedulerTest(unittest.TestCase):
+    def scheduler(self, downloader, **kwargs):
+        scheduler = MediaScheduler(downloader, bandwidth=0, **kwargs)
+        self.addCleanup(scheduler.shutdown, wait=False)
+        self.addCleanup(downloader.gate.set)
+        return scheduler
+
+    def test_per_host_cap(self):
+        downloader = FakeDownloader()
+        scheduler = self.scheduler(downloader, workers=4, per_host=2)
+        futures = [scheduler.submit(f'http://a/{i}.jpg') for i in range(4)]
+        futures.append(scheduler.submit('http://b/0.jpg'))
+        time.sleep(0.2)
+        self.assertEqual(sorted(url for url, _ in downloader.started),
+                         ['http://a/0.jpg', 'http://a/1.jpg', 'http://b/0.jpg'])
+        downloader.gate.set()
+        self.assertEqual([f.result(5) for f in futures][-1], '/media/0.jpg')
+        self.assertEqual(len(downloader.started), 5)
+
+    def test_images_and_small_files_go_first(self):
+        downloader = FakeDownloader()
+        scheduler = self.scheduler(downloader, workers=1, per_host=1)
+        scheduler.submit('http://h/first.jpg')  # occupies the only worker
+        time.sleep(0.1)
+        futures = [scheduler.submit('http://h/movie.mp4', 'video'),
+                   scheduler.submit('http://h/big.jpg', size_hint=5000),
+                   scheduler.submit('http://h/small.jpg', size_hint=10)]
+        downloader.gate.set()
+        for future in futures:
+            future.result(5)
+        self.assertEqual([url for url, _ in downloader.started],
+                         ['http://h/first.jpg', 'http://h/small.jpg', 'http://h/big.jpg', 'http://h/movie.mp4'])
+
+    def test_jobs_keep_their_route_and_report_events(self):
+        downloader = FakeDownloader(size=100)
+        downloader.gate.set()
+        scheduler = self.scheduler(downloader, workers=2)
+        events = []
+        scheduler.subscribe(events.append)
+        route = {'https': 'socks5h://u:p@127.0.0.1:9050'}
+        for future in scheduler.submit_many(['http://h/1.jpg', 'http://h/2.jpg'], 'image', route):
+            future.result(5)
+        self.assertEqual({proxies['https'] for _, proxies in downloader.started}, {route['https']})
+        finished = [e for e in events if e['state'] == 'finished']
+        self.assertEqual(len(finished), 2)
+        self.assertEqual({(e['downloaded'], e['total']) for e in finished}, {(100, 100)})
+
+    def test_submit_after_shutdown_raises(self):
+        scheduler = self.scheduler(FakeDownloader())
+        scheduler.shutdown(wait=False)
+        with self.assertRaises(RuntimeError):
+            scheduler.submit('http://h/1.jpg')
+
+class TokenBucketTest(unittest.TestCase):
+    def test_aggregate_rate_across_threads(self):
+        bucket = TokenBucket(rate=20000, burst=2000)
+
+        def write():
+            for _ in range(5):
+                bucket.consume(1000)
+
+        start = time.monotonic()
+        threads = [threading.Thread(target=write) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        # 20000 bytes, less the 2000 byte burst, at 20000 bytes/sec
+        self.assertAlmostEqual(time.monotonic() - start, 0.9, delta=0.25)
+
+if __name__ == '__main__':
+    unittest.main()
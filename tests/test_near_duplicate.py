@@ -0,0 +1,53 @@
+import hashlib
+import random
+import unittest
+
+from storage.near_duplicate import SimHashIndex, simhash, hamming_distance, to_signed, to_unsigned
+
+def reference_simhash(text: str, shingle_size: int = 3) -> int:
+    """Straightforward bit-string SimHash; stored fingerprints must keep matching it."""
+    words = text.lower().split()
+    if len(words) < shingle_size:
+        shingles = [' '.join(words)]
+    else:
+        shingles = [' '.join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+    rows = [format(int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'big'), '064b')
+            for s in shingles]
+    half = len(rows) / 2
+    return int(''.join('1' if column.count('1') > half else '0' for column in map(''.join, zip(*rows))), 2)
+
+class SimHashTest(unittest.TestCase):
+    def test_matches_reference(self):
+        rng = random.Random(7)
+        for _ in range(50):
+            text = ' '.join(rng.choice(['alpha', 'beta', 'gamma', 'delta', 'x']) for _ in range(rng.randint(0, 80)))
+            self.assertEqual(simhash(text), reference_simhash(text), text)
+
+    def test_small_edit_stays_close(self):
+        words = [f'word{i}' for i in range(400)]
+        edited = list(words)
+        edited[200] = 'changed'
+        self.assertLessEqual(hamming_distance(simhash(' '.join(words)), simhash(' '.join(edited))), 3)
+
+    def test_signed_round_trip(self):
+        for value in (0, 1, (1 << 63) - 1, 1 << 63, (1 << 64) - 1):
+            self.assertEqual(to_unsigned(to_signed(value)), value)
+            self.assertTrue(-(1 << 63) <= to_signed(value) < (1 << 63))
+
+class SimHashIndexTest(unittest.TestCase):
+    def test_finds_near_duplicates_only(self):
+        index = SimHashIndex(max_distance=3)
+        base = 0x0123456789ABCDEF
+        self.assertIsNone(index.check_and_add(base, 'http://h/a'))
+        self.assertEqual(index.check_and_add(base ^ 0b101, 'http://h/b'), 'http://h/a')
+        self.assertIsNone(index.query(base ^ 0xF0F0, exclude=None))
+        self.assertIsNone(index.query(base, exclude='http://h/a'))
+
+    def test_recrawl_of_same_page_is_not_a_duplicate(self):
+        index = SimHashIndex(max_distance=3)
+        index.check_and_add(42, 'http://h/a')
+        self.assertIsNone(index.check_and_add(42, 'http://h/a'))
+        self.assertEqual(index.size, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import os
+import signal
+import time
+import unittest
+from concurrent.futures.process import BrokenProcessPool
+
+from core.extractor import extract
+from core.parse_pool import ParsePool
+
+PAGE = '<html><head><title>T</title></head><body><p>text</p><a href="/next">next</a></body></html>'
+
+class ParsePoolTest(unittest.TestCase):
+    def setUp(self):
+        self.pool = ParsePool(processes=1, batch_size=3, max_backlog=4, flush_interval=0.05)
+        self.addCleanup(self.pool.shutdown)
+
+    def test_results_match_in_process_extraction(self):
+        futures = [self.pool.submit(PAGE, f'http://h/{i}/') for i in range(4)]  # one full batch, one partial
+        for i, future in enumerate(futures):
+            self.assertEqual(future.result(timeout=60), extract(PAGE, f'http://h/{i}/'))
+
+    def test_recovers_after_a_worker_dies(self):
+        self.assertEqual(self.pool.parse(PAGE, 'http://h/')['title'], 'T')
+        for pid in list(self.pool.executor._processes):
+            os.kill(pid, signal.SIGKILL)
+        time.sleep(0.5)
+
+        # Pages caught by the dead pool fail; their backlog permits must come back,
+        # or submitting more than max_backlog pages would block here
+        outcomes = []
+        for i in range(8):
+            try:
+                outcomes.append(self.pool.submit(PAGE, f'http://h/{i}').result(timeout=60)['title'])
+            except BrokenProcessPool:
+                outcomes.append('broken')
+        self.assertEqual(outcomes[-1], 'T')
+        self.assertEqual(self.pool.parse(PAGE, 'http://h/again')['title'], 'T')
+
+    def test_submit_after_shutdown_raises(self):
+        self.pool.shutdown()
+        with self.assertRaises(RuntimeError):
+            self.pool.submit(PAGE, 'http://h/')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import json
+import time
+import unittest
+from collections import Counter
+from unittest import mock
+
+from config import settings
+from core.proxy_pool import ProxyPool
+from tests.helpers import TempDirTestCase
+
+class ProxyPoolTestCase(TempDirTestCase):
+    """A ProxyPool without its fetcher, validator and store writer threads."""
+
+    def setUp(self):
+        super().setUp()
+        for name in ('_start_fetchers', '_start_validators', '_start_store_writer'):
+            patcher = mock.patch.object(ProxyPool, name)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(settings, 'PROXY_STORE_FILE', self.path('proxies.json'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pool = self.make_pool()
+
+    def make_pool(self):
+        pool = ProxyPool()
+        self.addCleanup(pool.stop)
+        return pool
+
+    def queued(self):
+        items = []
+        while not self.pool.pending.empty():
+            items.append(self.pool.pending.get_nowait())
+        return items
+
+class ProxySelectionTest(ProxyPoolTestCase):
+    def test_picks_in_proportion_to_weight(self):
+        self.pool._activate('fast:1', 0.1)
+        self.pool._activate('slow:1', 1.0)
+        picks = Counter(self.pool.get_proxy() for _ in range(220))
+        self.assertEqual(picks['fast:1'], 200)
+        self.assertEqual(picks['slow:1'], 20)
+
+    def test_reports_move_the_weight(self):
+        self.pool._activate('a:1', 0.5)
+        self.pool._activate('b:1', 0.5)
+        for _ in range(20):
+            self.pool.report('a:1', True, 0.1)
+            self.pool.report('b:1', False)
+            self.pool.report('b:1', True, 0.5)  # keep b out of quarantine
+        picks = Counter(self.pool.get_proxy() for _ in range(100))
+        self.assertGreater(picks['a:1'], 4 * picks['b:1'])
+
+    def test_empty_pool(self):
+        self.assertIsNone(self.pool.get_proxy())
+
+class QuarantineTest(ProxyPoolTestCase):
+    def test_failure_streak_benches_then_revalidates(self):
+        self.pool._activate('a:1', 0.2)
+        self.pool._activate('b:1', 0.2)
+        self.pool.report('a:1', True)
+        for _ in range(settings.PROXY_QUARANTINE_STREAK):
+            self.pool.report('b:1', False)
+        self.assertIn('b:1', self.pool.quarantine)
+        self.assertEqual({self.pool.get_proxy() for _ in range(10)}, {'a:1'})
+        self.assertEqual(self.queued(), [])
+
+        self.pool.quarantine['b:1'] = self.pool._next_release = 0  # expire the quarantine
+        self.pool.get_proxy()
+        self.assertEqual(self.queued(), ['b:1'])
+        self.pool._activate('b:1', 0.2)
+        self.assertEqual(self.pool.proxies['b:1']['fail_count'], settings.PROXY_QUARANTINE_STREAK)
+        self.assertEqual(self.pool.proxies['b:1']['fail_streak'], 0)
+
+    def test_repeat_offender_is_evicted_for_good(self):
+        self.pool._activate('bad:1', 0.2)
+        with mock.patch.object(settings, 'PROXY_EVICT_FAILS', 3):
+            for _ in range(3):
+                self.pool.report('bad:1', False)
+        self.assertIn('bad:1', self.pool.evicted)
+        self.assertNotIn('bad:1', self.pool.quarantine)
+        self.pool.add_candidates(['bad:1', 'new:1'])
+        self.assertEqual(self.queued(), ['new:1'])
+        self.pool._activate('bad:1', 0.1)
+        self.assertIsNone(self.pool.get_proxy())
+
+    def test_failed_revalidations_count_towards_eviction(self):
+        with mock.patch.object(settings, 'PROXY_EVICT_FAILS', 2):
+            self.pool._activate('a:1', 0.2)
+            self.pool._deactivate('a:1')
+            self.assertNotIn('a:1', self.pool.evicted)
+            self.pool._deactivate('a:1')
+        self.assertIn('a:1', self.pool.evicted)
+
+class ProxyStoreTest(ProxyPoolTestCase):
+    def test_stop_saves_latest_scores_for_a_warm_start(self):
+        self.pool._activate('a:1', 0.3)
+        self.pool.report('a:1', True, 0.3)
+        self.pool.report('a:1', False)
+        self.pool.stop()
+
+        warm = self.make_pool()
+        self.assertEqual(set(warm.proxies), {'a:1'})
+        self.assertEqual((warm.proxies['a:1']['success_count'], warm.proxies['a:1']['fail_count']), (1, 1))
+        self.assertEqual(self.queued(), [])  # the first pool's queue
+        self.assertEqual(warm.pending.get_nowait(), 'a:1')  # rechecked in the background
+
+    def test_bad_records_are_skipped(self):
+        now = time.time()
+        good = {'proxy': 'good:1', 'last_verified': now, 'success_count': 2, 'fail_count': 0, 'latency': 0.2}
+        records = [
+            good,
+            {'proxy': 'missing:1', 'last_verified': now},
+            dict(good, proxy='typed:1', success_count=None),
+            dict(good, proxy='stale:1', last_verified=now - settings.PROXY_STORE_TTL - 60),
+            'not a record',
+        ]
+        with open(self.path('proxies.json'), 'w') as f:
+            json.dump(records, f)
+        self.assertEqual(set(self.make_pool().proxies), {'good:1'})
+
+    def test_unreadable_store_is_ignored(self):
+        for content in ('{not json', '{"proxy": "a:1"}'):
+            with open(self.path('proxies.json'), 'w') as f:
+                f.write(content)
+            self.assertEqual(self.make_pool().proxies, {})
+
+if __name__ == '__main__':
+    unittest.main()
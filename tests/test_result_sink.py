@@ -0,0 +1,59 @@
+import threading
+import unittest
+
+from storage.result_sink import ResultSink
+from tests.helpers import DatabaseTestCase
+
+class ResultSinkTest(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.sink = ResultSink(self.db, batch_size=10, flush_interval=0.05)
+        self.addCleanup(self.sink.close)
+
+    def test_page_and_media_rows_are_stored_before_the_ack(self):
+        acked = []
+
+        def on_persisted():
+            row = self.db._conn().execute('SELECT status FROM tasks WHERE url=?', ('http://h/',)).fetchone()
+            acked.append(row[0])
+
+        page = {'title': 'T', 'text': 'some page text', 'images': ['http://h/a.png'], 'videos': ['http://h/v.mp4']}
+        self.sink.finished({'url': 'http://h/'}, page, on_persisted=on_persisted)
+        self.sink.flush()
+        self.assertEqual(acked, ['completed'])
+        media = self.db._conn().execute('SELECT url, file_type FROM media ORDER BY url').fetchall()
+        self.assertEqual(media, [('http://h/a.png', 'image'), ('http://h/v.mp4', 'video')])
+
+    def test_unstorable_result_is_reported(self):
+        outcome = []
+        self.sink.finished({'url': 'http://h/'}, {'text': 123},
+                           on_persisted=lambda: outcome.append('persisted'),
+                           on_not_persisted=lambda: outcome.append('not persisted'))
+        self.sink.flush()
+        self.assertEqual(outcome, ['not persisted'])
+
+    def test_status_results(self):
+        self.sink.finished({'url': 'http://h/blocked'}, 'robots_blocked')
+        self.sink.finished({'url': 'http://h/none'}, None)
+        self.sink.failed({'url': 'http://h/error'}, 'boom')
+        self.sink.flush()
+        rows = dict(self.db._conn().execute('SELECT url, status FROM tasks').fetchall())
+        self.assertEqual(rows, {'http://h/blocked': 'robots_blocked', 'http://h/none': 'failed',
+                                'http://h/error': 'failed'})
+
+    def test_rows_dropped_for_another_caller_do_not_fail_the_batch(self):
+        task_id = self.db.add_task('http://h/taken', 5)
+        # Another thread queues a row that cannot be written and has not flushed yet
+        other = threading.Thread(target=self.db._enqueue,
+                                 args=('INSERT INTO tasks (id, url) VALUES (?, ?)', (task_id, 'http://h/clash')))
+        other.start()
+        other.join()
+        outcome = []
+        self.sink.finished({'url': 'http://h/'}, {'title': 'T', 'text': 'text'},
+                           on_persisted=lambda: outcome.append('persisted'),
+                           on_not_persisted=lambda: outcome.append('not persisted'))
+        self.sink.flush()
+        self.assertEqual(outcome, ['persisted'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from core.robots_checker import RobotsCache, RobotsChecker
+from tests.helpers import TempDirTestCase
+
+ROBOTS = 'User-agent: *\nDisallow: /private/\n'
+
+class RobotsCacheTest(TempDirTestCase):
+    def test_concurrent_misses_fetch_once(self):
+        cache = RobotsCache()
+        calls = []
+        release = threading.Event()
+
+        def fetch(base_url):
+            calls.append(base_url)
+            release.wait(5)
+            return ROBOTS
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get('http://h', fetch))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)  # let every thread reach the cache
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(calls, ['http://h'])
+        self.assertEqual(len(results), 8)
+        self.assertEqual(len({id(parser) for parser in results}), 1)
+
+    def test_waiters_are_released_when_the_fetch_raises(self):
+        cache = RobotsCache()
+        started = threading.Event()
+
+        def fetch(base_url):
+            started.set()
+            time.sleep(0.1)
+            raise OSError('unreachable')
+
+        errors = []
+
+        def first():
+            try:
+                cache.get('http://h', fetch)
+            except OSError as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=first)
+        thread.start()
+        started.wait(5)
+        self.assertIsNone(cache.get('http://h', fetch))  # waits for the failed fetch, then allows all
+        thread.join(5)
+        self.assertEqual(len(errors), 1)
+
+    def test_entries_expire_after_their_ttl(self):
+        cache = RobotsCache(ttl=60, error_ttl=5)
+        fetch = mock.Mock(side_effect=[ROBOTS, None, ROBOTS])
+        now = time.time()
+        with mock.patch('core.robots_checker.time.time', return_value=now):
+            cache.get('http://h', fetch)
+            cache.get('http://h', fetch)
+        self.assertEqual(fetch.call_count, 1)
+        with mock.patch('core.robots_checker.time.time', return_value=now + 61):
+            self.assertIsNone(cache.get('http://h', fetch))  # failed refetch
+        with mock.patch('core.robots_checker.time.time', return_value=now + 64):
+            self.assertIsNone(cache.get('http://h', fetch))  # failures are cached for error_ttl
+        with mock.patch('core.robots_checker.time.time', return_value=now + 67):
+            self.assertIsNotNone(cache.get('http://h', fetch))
+        self.assertEqual(fetch.call_count, 3)
+
+    def test_least_recently_used_host_is_evicted(self):
+        cache = RobotsCache(max_size=2)
+        fetch = mock.Mock(return_value='')
+        for host in ('http://a', 'http://b', 'http://a', 'http://c', 'http://a'):
+            cache.get(host, fetch)
+        self.assertEqual(list(cache.entries), ['http://c', 'http://a'])
+        self.assertEqual(fetch.call_count, 3)
+
+    def test_unexpired_entries_survive_a_restart(self):
+        cache = RobotsCache(persist_file=self.path('robots.json'))
+        cache.get('http://h', lambda base_url: ROBOTS)
+        cache.save()
+        restored = RobotsCache(persist_file=self.path('robots.json'))
+        parser = restored.get('http://h', mock.Mock(side_effect=AssertionError('refetched')))
+        self.assertFalse(parser.can_fetch('*', 'http://h/private/x'))
+
+class RobotsCheckerTest(unittest.TestCase):
+    def checker(self, status, text=''):
+        fetcher = mock.Mock(return_value=SimpleNamespace(status_code=status, text=text))
+        return RobotsChecker(fetcher=fetcher, cache=RobotsCache()), fetcher
+
+    def test_rules_are_fetched_over_the_given_route(self):
+        checker, fetcher = self.checker(200, ROBOTS)
+        self.assertTrue(checker.check('http://h/public'))
+        self.assertFalse(checker.check('http://h/private/page'))
+        fetcher.assert_called_once_with('http://h/robots.txt')
+
+    def test_missing_or_unreachable_robots_allows_all(self):
+        for status in (404, 503):
+            checker, _ = self.checker(status)
+            self.assertTrue(checker.check('http://h/private/page'))
+
+if __name__ == '__main__':
+    unittest.main()
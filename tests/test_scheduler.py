@@ -0,0 +1,113 @@
+import json
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from config import settings
+from core.scheduler import DistributedScheduler
+
+def crawl_func(url, **kwargs):
+    if url.endswith('/broken'):
+        raise ValueError('cannot crawl')
+    return {'title': url}
+
+class FakeSink:
+    """Stands in for ResultSink; persists results unless the task says otherwise."""
+
+    def __init__(self):
+        self.calls = []
+
+    def started(self, task):
+        self.calls.append(('started', task['url']))
+
+    def failed(self, task, error):
+        self.calls.append(('failed', task['url']))
+
+    def finished(self, task, result, on_persisted=None, on_not_persisted=None):
+        if task['kwargs'].get('sink_closed'):
+            raise RuntimeError('ResultSink is closed')
+        self.calls.append(('finished', task['url']))
+        if task['kwargs'].get('unstorable'):
+            on_not_persisted()
+        else:
+            on_persisted()
+
+class PublishTest(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = DistributedScheduler()
+        self.scheduler.connection = mock.Mock()
+        self.tx = self.scheduler.connection.channel.return_value
+        patcher = mock.patch.object(settings, 'RABBITMQ_PUBLISH_BATCH', 2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def published(self):
+        return [json.loads(call.kwargs['body']) for call in self.tx.basic_publish.call_args_list]
+
+    def test_tasks_are_committed_in_batches(self):
+        urls = [f'http://h/{i}' for i in range(5)]
+        self.scheduler.add_tasks(urls, priority=3, task_ids=list(range(10, 15)), depth=1)
+        self.scheduler.add_tasks(['http://h/5'])
+        self.tx.tx_select.assert_called_once_with()
+        self.assertEqual(self.tx.tx_commit.call_count, 4)
+        tasks = self.published()
+        self.assertEqual([(t['url'], t['task_id']) for t in tasks[:5]], list(zip(urls, range(10, 15))))
+        self.assertEqual((tasks[0]['priority'], tasks[0]['kwargs']), (3, {'depth': 1}))
+        self.assertEqual(tasks[5]['task_id'], None)
+
+    def test_a_failed_batch_is_rolled_back(self):
+        self.tx.basic_publish.side_effect = [None, None, None, IOError('connection lost')]
+        with self.assertRaises(IOError):
+            self.scheduler.add_tasks([f'http://h/{i}' for i in range(5)])
+        self.tx.tx_commit.assert_called_once_with()
+        self.tx.tx_rollback.assert_called_once_with()
+
+class WorkerTest(unittest.TestCase):
+    def run_worker(self, urls, sink=None, kwargs=None, channel_open=True):
+        """Deliver urls to a worker, wait until they are processed; return the consumer channel."""
+        scheduler = DistributedScheduler(result_sink=sink)
+        scheduler.connection = mock.Mock()
+        scheduler.connection.add_callback_threadsafe.side_effect = lambda callback: callback()
+        channel = scheduler.channel = mock.Mock(is_open=channel_open)
+
+        def consume():
+            callback = channel.basic_consume.call_args.kwargs['on_message_callback']
+            for tag, url in enumerate(urls, 1):
+                task = {'url': url, 'kwargs': (kwargs or {}).get(url, {})}
+                callback(channel, SimpleNamespace(delivery_tag=tag), None, json.dumps(task))
+            scheduler.executor.shutdown(wait=True)
+
+        channel.start_consuming.side_effect = consume
+        scheduler.start_worker('w1', crawl_func, concurrency=2)
+        channel.basic_qos.assert_called_once_with(prefetch_count=2)
+        return channel
+
+    @staticmethod
+    def settled(channel):
+        acks = sorted(call.kwargs['delivery_tag'] for call in channel.basic_ack.call_args_list)
+        nacks = sorted((call.kwargs['delivery_tag'], call.kwargs['requeue'])
+                       for call in channel.basic_nack.call_args_list)
+        return acks, nacks
+
+    def test_crawled_tasks_are_acked_and_failures_requeued(self):
+        channel = self.run_worker(['http://h/a', 'http://h/broken', 'http://h/b'])
+        self.assertEqual(self.settled(channel), ([1, 3], [(2, True)]))
+
+    def test_with_a_sink_acks_wait_for_the_result_to_be_stored(self):
+        sink = FakeSink()
+        channel = self.run_worker(['http://h/a', 'http://h/broken', 'http://h/bad'], sink,
+                                  kwargs={'http://h/bad': {'unstorable': True}})
+        self.assertEqual(self.settled(channel), ([1], [(2, True), (3, False)]))
+        self.assertIn(('failed', 'http://h/broken'), sink.calls)
+        self.assertEqual(sorted(url for call, url in sink.calls if call == 'finished'), ['http://h/a', 'http://h/bad'])
+
+    def test_a_result_the_sink_refuses_is_requeued(self):
+        channel = self.run_worker(['http://h/a', 'http://h/b'], FakeSink(), kwargs={'http://h/b': {'sink_closed': True}})
+        self.assertEqual(self.settled(channel), ([1], [(2, True)]))
+
+    def test_nothing_is_settled_on_a_closed_channel(self):
+        channel = self.run_worker(['http://h/a', 'http://h/broken'], channel_open=False)
+        self.assertEqual(self.settled(channel), ([], []))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import time
+import unittest
+from email.utils import formatdate
+
+from config import settings
+from core.throttle import AutoThrottle, parse_retry_after
+
+class ParseRetryAfterTest(unittest.TestCase):
+    def test_seconds_and_dates(self):
+        self.assertEqual(parse_retry_after('120'), 120.0)
+        self.assertEqual(parse_retry_after('-5'), 0.0)
+        self.assertAlmostEqual(parse_retry_after(formatdate(time.time() + 30, usegmt=True)), 30, delta=2)
+        self.assertEqual(parse_retry_after(formatdate(time.time() - 30, usegmt=True)), 0.0)
+
+    def test_missing_or_garbage(self):
+        for value in (None, '', 'soon'):
+            self.assertIsNone(parse_retry_after(value))
+
+class AutoThrottleTest(unittest.TestCase):
+    def test_delay_never_drops_below_crawl_delay_by_default(self):
+        throttle = AutoThrottle()
+        for _ in range(20):
+            throttle.try_acquire('http://h/')
+            throttle.release('http://h/', latency=0.01, status=200)
+        self.assertEqual(throttle.hosts['h']['delay'], settings.CRAWL_DELAY)
+
+    def test_delay_tracks_latency_over_target_concurrency(self):
+        throttle = AutoThrottle(start_delay=4, min_delay=0, target_concurrency=2)
+        for _ in range(20):
+            throttle.try_acquire('http://h/')
+            throttle.release('http://h/', latency=1.0, status=200)
+        self.assertAlmostEqual(throttle.hosts['h']['delay'], 0.5, places=3)
+
+    def test_errors_never_speed_up(self):
+        throttle = AutoThrottle(start_delay=2, min_delay=0)
+        throttle.try_acquire('http://h/')
+        throttle.release('http://h/', latency=0.01, status=404)
+        self.assertEqual(throttle.hosts['h']['delay'], 2)
+
+    def test_requests_are_spaced_by_the_delay(self):
+        throttle = AutoThrottle(start_delay=0.5, min_delay=0, max_concurrency=3)
+        throttle._host('http://h/')['concurrency'] = 3
+        waits = [throttle.try_acquire('http://h/') for _ in range(3)]
+        self.assertAlmostEqual(waits[0], 0, delta=0.05)
+        self.assertAlmostEqual(waits[1], 0.5, delta=0.05)
+        self.assertAlmostEqual(waits[2], 1.0, delta=0.05)
+        self.assertIsNone(throttle.try_acquire('http://h/'))
+        self.assertIsNotNone(throttle.try_acquire('http://other/'))  # hosts are independent
+
+    def test_concurrency_grows_after_clean_responses(self):
+        throttle = AutoThrottle(start_delay=0, min_delay=0, max_concurrency=2)
+        self.assertIsNotNone(throttle.try_acquire('http://h/'))
+        self.assertIsNone(throttle.try_acquire('http://h/'))
+        throttle.release('http://h/', latency=0.01, status=200)
+        for _ in range(3):
+            throttle.try_acquire('http://h/')
+            throttle.release('http://h/', latency=0.01, status=200)
+        self.assertEqual(throttle.hosts['h']['concurrency'], 2)
+        self.assertIsNotNone(throttle.try_acquire('http://h/'))
+        self.assertIsNotNone(throttle.try_acquire('http://h/'))
+
+    def test_backs_off_on_429_and_honours_retry_after(self):
+        throttle = AutoThrottle(start_delay=1, min_delay=0)
+        throttle._host('http://h/')['concurrency'] = 4
+        throttle.try_acquire('http://h/')
+        throttle.release('http://h/', latency=0.1, status=429, retry_after=30)
+        state = throttle.hosts['h']
+        self.assertEqual((state['delay'], state['concurrency']), (2, 2))
+        self.assertGreater(throttle.try_acquire('http://h/'), 29)
+
+    def test_state_round_trip_is_clamped(self):
+        throttle = AutoThrottle(min_delay=1, max_delay=10, max_concurrency=4)
+        throttle.load_state({'a': {'delay': 0.1, 'concurrency': 9}, 'b': {'delay': 99, 'concurrency': 0}})
+        self.assertEqual(throttle.export_state(), {'a': {'delay': 1, 'concurrency': 4},
+                                                   'b': {'delay': 10, 'concurrency': 1}})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from stem import CircStatus
+
+from config import settings
+from core.tor_manager import TorManager
+
+def circuit_event(status, circuit_id, arrived_at=None):
+    return SimpleNamespace(status=status, id=circuit_id, arrived_at=arrived_at or time.time())
+
+class TorProcessTest(unittest.TestCase):
+    @mock.patch('stem.process.launch_tor_with_config')
+    def test_instance_data_directories_are_removed_on_stop(self, launch):
+        tor = TorManager(instances=3)
+        tor.start_tor()
+        data_dirs = [call.kwargs['config']['DataDirectory'] for call in launch.call_args_list]
+        self.assertEqual(len(set(data_dirs)), 3)
+        self.assertTrue(all(os.path.isdir(path) for path in data_dirs))
+        tor.stop_tor()
+        self.assertEqual(launch.return_value.kill.call_count, 3)
+        self.assertFalse(any(os.path.exists(path) for path in data_dirs))
+        self.assertEqual(tor.data_dirs, [])
+
+class RenewIdentityTest(unittest.TestCase):
+    def setUp(self):
+        self.controller = mock.Mock()
+        self.controller.get_newnym_wait.return_value = 0
+        patcher = mock.patch('core.tor_manager.Controller.from_port', return_value=self.controller)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tor = TorManager()
+
+    def test_only_circuits_launched_after_newnym_count(self):
+        before = time.time() - 1
+        ready = self.tor.renew_identity()
+        self.controller.signal.assert_called_once()
+        self.tor._on_circuit_event(0, circuit_event(CircStatus.BUILT, '1'))  # building before NEWNYM
+        self.tor._on_circuit_event(0, circuit_event(CircStatus.LAUNCHED, '2', arrived_at=before))
+        self.tor._on_circuit_event(0, circuit_event(CircStatus.BUILT, '2'))
+        self.assertFalse(ready.is_set())
+        self.tor._on_circuit_event(0, circuit_event(CircStatus.LAUNCHED, '3'))
+        self.tor._on_circuit_event(0, circuit_event(CircStatus.BUILT, '3'))
+        self.assertTrue(ready.is_set())
+
+    def test_wait_is_bounded_by_default(self):
+        with mock.patch.object(settings, 'TOR_RENEW_TIMEOUT', 0.05):
+            started = time.monotonic()
+            ready = self.tor.renew_identity(wait=True)
+        self.assertFalse(ready.is_set())
+        self.assertLess(time.monotonic() - started, 5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,5 +2,6 @@ from .user_agent import get_random_ua
 from .logger import get_logger
 from .validator import is_valid_url
 from .fingerprint import randomize_fingerprint
+from .metrics import get_metrics, start_exporters, timer
 
-__all__ = ['get_random_ua', 'get_logger', 'is_valid_url', 'randomize_fingerprint']
+__all__ = ['get_random_ua', 'get_logger', 'is_valid_url', 'randomize_fingerprint', 'get_metrics', 'start_exporters', 'timer']
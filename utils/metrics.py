@@ -0,0 +1,260 @@
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple, Optional, Any, List
+from urllib.parse import urlparse
+from config import settings
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Seconds, from a cached robots.txt lookup up to a slow browser render
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ''
+    escaped = (v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self.values: Dict[LabelKey, float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def _prometheus(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self.lock:
+            for key, value in self.values.items():
+                lines.append(f'{self.name}{_format_labels(key)} {value}')
+        return lines
+
+    def _json(self) -> List[Dict]:
+        with self.lock:
+            return [{'labels': dict(key), 'value': value} for key, value in self.values.items()]
+
+class Histogram:
+    """Cumulative-bucket histogram, as Prometheus expects."""
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.series: Dict[LabelKey, Dict] = {}  # key -> {'counts', 'sum', 'count'}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            series['counts'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with-block, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _prometheus(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            for key, series in self.series.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), series['counts']):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(float(bound))
+                    lines.append(f'{self.name}_bucket{_format_labels(key, (("le", le),))} {cumulative}')
+                lines.append(f'{self.name}_sum{_format_labels(key)} {series["sum"]}')
+                lines.append(f'{self.name}_count{_format_labels(key)} {series["count"]}')
+        return lines
+
+    def _json(self) -> List[Dict]:
+        with self.lock:
+            return [{
+                'labels': dict(key),
+                'count': series['count'],
+                'sum': series['sum'],
+                'mean': series['sum'] / series['count'] if series['count'] else None,
+                'buckets': dict(zip([str(b) for b in self.buckets] + ['+Inf'], series['counts']))
+            } for key, series in self.series.items()]
+
+class MetricsRegistry:
+    """
+    Process-wide set of counters and histograms. Exposed as Prometheus text
+    or JSON over a local HTTP server (serve()) and/or written to a file every
+    few seconds (write_periodically()).
+    """
+
+    def __init__(self):
+        self.metrics: Dict[str, Any] = {}
+        self.lock = threading.Lock()
+        self.server: Optional[ThreadingHTTPServer] = None
+        self._writer_stop = threading.Event()
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = Counter(name, help_text)
+            return metric
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = Histogram(name, help_text, buckets)
+            return metric
+
+    def render_prometheus(self) -> str:
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric._prometheus())
+        return '\n'.join(lines) + '\n'
+
+    def render_json(self) -> str:
+        with self.lock:
+            metrics = list(self.metrics.items())
+        return json.dumps({
+            'timestamp': time.time(),
+            'metrics': {name: {'type': type(metric).__name__.lower(), 'help': metric.help,
+                               'series': metric._json()}
+                        for name, metric in metrics}
+        })
+
+    def serve(self, port: int = None, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+        """Serve /metrics (Prometheus text) and /metrics.json on a background thread."""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith('/metrics.json'):
+                    body, content_type = registry.render_json(), 'application/json'
+                elif self.path.startswith('/metrics'):
+                    body, content_type = registry.render_prometheus(), 'text/plain; version=0.0.4'
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass  # scrapes would flood the crawl log
+
+        self.server = ThreadingHTTPServer((host, port or settings.METRICS_PORT), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name='metrics-http', daemon=True).start()
+        logger.info(f"Metrics served on http://{host}:{self.server.server_address[1]}/metrics")
+        return self.server
+
+    def write_file(self, path: str):
+        """Write the metrics atomically; JSON for *.json paths, Prometheus text otherwise."""
+        body = self.render_json() if path.endswith('.json') else self.render_prometheus()
+        tmp_file = f"{path}.tmp"
+        with open(tmp_file, 'w') as f:
+            f.write(body)
+        os.replace(tmp_file, path)
+
+    def write_periodically(self, path: str = None, interval: float = None):
+        path = path or settings.METRICS_FILE
+        interval = interval or settings.METRICS_WRITE_INTERVAL
+
+        def loop():
+            while not self._writer_stop.wait(interval):
+                try:
+                    self.write_file(path)
+                except OSError as e:
+                    logger.error(f"Failed to write metrics to {path}: {e}")
+
+        threading.Thread(target=loop, name='metrics-writer', daemon=True).start()
+        atexit.register(self.write_file, path)
+
+    def stop(self):
+        self._writer_stop.set()
+        if self.server:
+            self.server.shutdown()
+            self.server = None
+
+_registry = MetricsRegistry()
+_exporters_started = False
+_exporters_lock = threading.Lock()
+
+def get_metrics() -> MetricsRegistry:
+    """Return the process-wide metrics registry."""
+    return _registry
+
+def start_exporters():
+    """Start the HTTP endpoint (METRICS_PORT) and file writer (METRICS_FILE) once per process."""
+    global _exporters_started
+    with _exporters_lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+        if settings.METRICS_PORT:
+            try:
+                _registry.serve()
+            except OSError as e:
+                logger.warning(f"Metrics endpoint not started: {e}")
+        if settings.METRICS_FILE:
+            _registry.write_periodically()
+
+# Shared instruments
+STAGE_SECONDS = _registry.histogram(
+    'spider_stage_seconds', 'Time spent per crawl stage (robots, dns, connect, fetch, render, parse, db_write)'
+)
+REQUESTS_TOTAL = _registry.counter(
+    'spider_requests_total', 'HTTP fetches by engine, route (direct, proxy or Tor circuit) and status'
+)
+DB_ROWS = _registry.counter('spider_db_rows_written_total', 'Rows committed by the batched database writer')
+DOWNLOAD_BYTES = _registry.counter('spider_download_bytes_total', 'Media bytes downloaded')
+DOWNLOAD_RATE = _registry.histogram(
+    'spider_download_bytes_per_second', 'Per-file media download throughput',
+    buckets=(16e3, 64e3, 256e3, 1e6, 4e6, 16e6, 64e6, 256e6)
+)
+
+def route_label(proxy_url: Optional[str]) -> str:
+    """Label a request's route: 'direct', 'proxy:host:port' or 'tor:port/circuitN'; credentials are dropped."""
+    if not proxy_url:
+        return 'direct'
+    parsed = urlparse(proxy_url if '://' in proxy_url else f'http://{proxy_url}')
+    if parsed.scheme.startswith('socks'):
+        route = f"tor:{parsed.port}"
+        if parsed.username and parsed.username.startswith('circuit'):
+            route += '/' + parsed.username.split('-')[0]  # the rest is a per-run token
+        return route
+    return f"proxy:{parsed.hostname}:{parsed.port}"
+
+def timer(stage: str, **labels):
+    """Context manager timing one stage into spider_stage_seconds."""
+    return STAGE_SECONDS.time(stage=stage, **labels)